@@ -1,18 +1,82 @@
-from flask import Flask, request, jsonify
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import jwt
 import datetime
 import hashlib
+import hmac
+import base64
 import secrets
 import random
 import os
+import re
+import sys
+import subprocess
+import threading
+import functools
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
 from decimal import Decimal
 import json
-from io import BytesIO
+from collections import OrderedDict
+from collections.abc import Mapping
+from urllib.parse import urlencode
+from metrics import INSTRUMENTED_OPERATIONS, RequestInstrumentation, call_dynamodb, propagate
+from lambda_adapter import LambdaAdapter, CORS_HEADERS, event_method, event_path
+from search_index import RecipeSearchIndex
+from listing_index import RecipeListingIndex, SORT_FIELDS, parse_minutes, to_cents
+from shopping_list import ShoppingListIndex, normalise_ingredient
+from meal_plan import MealPlanIndex, plan_meals
+from recommendations import RecipeSimilarityIndex
+from rate_limit import RateLimiter, SlidingWindow, TokenBuckets, parse_costs
+from snapshots import DirectoryTarget, S3Target, SnapshotPublisher
+from recipe_model import CompactRecipe, ValuePool, compact_recipe, recipe_item
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ============= JSON =============
+
+def json_default(obj):
+    """Encode DynamoDB numbers directly: whole Decimals as int, the rest as float"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, CompactRecipe):
+        return obj.to_item()
+    return DefaultJSONProvider.default(obj)
+
+class DecimalJSONProvider(DefaultJSONProvider):
+    """JSON provider that writes boto3 items as-is, without first copying them into floats.
+
+    Uses orjson when it is installed and the stdlib encoder otherwise.
+    """
+
+    default = staticmethod(json_default)
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and 'indent' not in kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def dumps_bytes(self, obj):
+        """Compact UTF-8 encoded JSON for ``obj``"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=json_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=json_default, ensure_ascii=False, sort_keys=True,
+                          separators=(',', ':')).encode('utf-8')
 
 app = Flask(__name__)
+app.json = DecimalJSONProvider(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 # ============= CONFIGURATION =============
@@ -24,31 +88,249 @@ app.config['SECRET_KEY'] = SECRET_KEY
 REGION = os.environ.get('AWS_REGION_NAME', 'af-south-1')
 IS_LAMBDA = os.environ.get('AWS_EXECUTION_ENV') is not None
 
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
-
 # Table names from environment
 USERS_TABLE = os.environ.get('USERS_TABLE', 'greenplate-users-dev')
 RECIPES_TABLE = os.environ.get('RECIPES_TABLE', 'greenplate-recipes-dev')
 SAVED_RECIPES_TABLE = os.environ.get('SAVED_RECIPES_TABLE', 'greenplate-saved-recipes-dev')
 LIKED_RECIPES_TABLE = os.environ.get('LIKED_RECIPES_TABLE', 'greenplate-liked-recipes-dev')
+METADATA_TABLE = os.environ.get('METADATA_TABLE', 'greenplate-metadata-dev')
+RECIPE_STATS_TABLE = os.environ.get('RECIPE_STATS_TABLE', 'greenplate-recipe-stats-dev')
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE', 'greenplate-idempotency-dev')
+USER_EMAILS_TABLE = os.environ.get('USER_EMAILS_TABLE', 'greenplate-user-emails-dev')
+RATE_LIMIT_TABLE = os.environ.get('RATE_LIMIT_TABLE', 'greenplate-rate-limits-dev')
+
+# Seed SAMPLE_RECIPES during Lambda init (a no-op when they are already up to date)
+SEED_ON_COLD_START = os.environ.get('SEED_ON_COLD_START', 'true').lower() == 'true'
+SAMPLE_SEED_MARKER = 'sample_recipes_seed'
+
+# The boto3 resource and tables are created on first use rather than at import
+_dynamodb = None
+_dynamodb_lock = threading.Lock()
+
+def get_dynamodb():
+    """Return the shared boto3 DynamoDB resource, creating it on first call"""
+    global _dynamodb
+    if _dynamodb is None:
+        with _dynamodb_lock:
+            if _dynamodb is None:
+                _dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    return _dynamodb
+
+class LazyTable:
+    """Stands in for a boto3 Table and builds the real one the first time it is used.
+
+    Item, query and scan calls are routed through metrics.call_dynamodb so
+    their latency and consumed capacity are attributed to the current request.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._table = None
+
+    def __getattr__(self, attr):
+        if self._table is None:
+            self._table = get_dynamodb().Table(self.name)
+        value = getattr(self._table, attr)
+        if attr in INSTRUMENTED_OPERATIONS:
+            return functools.partial(call_dynamodb, self.name, attr, value)
+        return value
 
 # Get table references
-users_table = dynamodb.Table(USERS_TABLE)
-recipes_table = dynamodb.Table(RECIPES_TABLE)
-saved_recipes_table = dynamodb.Table(SAVED_RECIPES_TABLE)
-liked_recipes_table = dynamodb.Table(LIKED_RECIPES_TABLE)
+users_table = LazyTable(USERS_TABLE)
+recipes_table = LazyTable(RECIPES_TABLE)
+saved_recipes_table = LazyTable(SAVED_RECIPES_TABLE)
+liked_recipes_table = LazyTable(LIKED_RECIPES_TABLE)
+metadata_table = LazyTable(METADATA_TABLE)
+recipe_stats_table = LazyTable(RECIPE_STATS_TABLE)
+idempotency_table = LazyTable(IDEMPOTENCY_TABLE)
+user_emails_table = LazyTable(USER_EMAILS_TABLE)
+rate_limit_table = LazyTable(RATE_LIMIT_TABLE)
+
+ALL_TABLES = (users_table, recipes_table, saved_recipes_table, liked_recipes_table, metadata_table,
+              recipe_stats_table, idempotency_table, user_emails_table, rate_limit_table)
+
+def use_dynamodb(resource):
+    """Point every table at another DynamoDB resource, e.g. a local_dynamodb.LocalDynamoDB"""
+    global _dynamodb
+    with _dynamodb_lock:
+        _dynamodb = resource
+    for table in ALL_TABLES:
+        table._table = None
+
+def use_local_dynamodb(**options):
+    """Swap in an empty in-memory DynamoDB with every table and GSI the app uses"""
+    from local_dynamodb import LocalDynamoDB
+    resource = LocalDynamoDB(**options)
+    resource.create_table(USERS_TABLE, 'username', indexes={'EmailIndex': ('email', None)})
+    resource.create_table(RECIPES_TABLE, 'recipe_id', indexes={
+        'CostIndex': ('difficulty', 'total_cost'),
+        'TimeIndex': ('difficulty', 'time_minutes')
+    }, projections={'CostIndex': SUMMARY_FIELDS, 'TimeIndex': SUMMARY_FIELDS})
+    resource.create_table(SAVED_RECIPES_TABLE, 'username', 'recipe_id')
+    resource.create_table(LIKED_RECIPES_TABLE, 'username', 'recipe_id')
+    resource.create_table(METADATA_TABLE, 'meta_key')
+    resource.create_table(RECIPE_STATS_TABLE, 'recipe_id', 'period',
+                          indexes={'PeriodLikesIndex': ('period', 'like_count')})
+    resource.create_table(IDEMPOTENCY_TABLE, 'idempotency_key')
+    resource.create_table(USER_EMAILS_TABLE, 'email')
+    resource.create_table(RATE_LIMIT_TABLE, 'limit_key')
+    use_dynamodb(resource)
+    return resource
+
+# Responses at least this large are gzip/br compressed when the client accepts it
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+
+# Cache-Control per public read route; s-maxage is what CloudFront honours
+CACHE_POLICIES = {
+    'recipes': os.environ.get('CACHE_CONTROL_RECIPES', 'public, max-age=60, s-maxage=300, stale-while-revalidate=60'),
+    'recipe': os.environ.get('CACHE_CONTROL_RECIPE', 'public, max-age=300, s-maxage=3600, stale-while-revalidate=300'),
+    'search': os.environ.get('CACHE_CONTROL_SEARCH', 'public, max-age=30, s-maxage=120'),
+    'trending': os.environ.get('CACHE_CONTROL_TRENDING', 'public, max-age=60, s-maxage=60'),
+    'similar': os.environ.get('CACHE_CONTROL_SIMILAR', 'public, max-age=300, s-maxage=600')
+}
+
+# Request metrics are printed as CloudWatch Embedded Metric Format log lines
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'GreenPlate/API')
+EMF_METRICS = os.environ.get('EMF_METRICS', 'true' if IS_LAMBDA else 'false').lower() == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '1000'))
+
+# Page sizes for list endpoints called with ?limit= / ?cursor=
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '20'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '100'))
+# Seconds a ?cursor= token stays valid after it was issued (0: never expires)
+CURSOR_TTL = int(os.environ.get('CURSOR_TTL', str(24 * 3600)))
+
+# BatchGetItem/BatchWriteItem tuning for hydrating and bulk-editing saved/liked recipes
+BATCH_GET_MAX_KEYS = 100
+BATCH_WRITE_MAX_ITEMS = 25
+BULK_MAX_RECIPES = int(os.environ.get('BULK_MAX_RECIPES', '500'))
+BATCH_MAX_RETRIES = int(os.environ.get('BATCH_MAX_RETRIES', '5'))
+BATCH_BACKOFF_BASE = float(os.environ.get('BATCH_BACKOFF_BASE', '0.05'))
+HYDRATE_CONCURRENCY = int(os.environ.get('HYDRATE_CONCURRENCY', '4'))
+
+# Verified JWTs remembered per container, and how long a rejected token stays rejected
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '1024'))
+REJECTED_TOKEN_TTL = float(os.environ.get('REJECTED_TOKEN_TTL', '300'))
+
+# Recipe ids are leased from an atomic counter this many at a time per container
+RECIPE_ID_BLOCK_SIZE = int(os.environ.get('RECIPE_ID_BLOCK_SIZE', '20'))
+RECIPE_ID_COUNTER = 'recipe_id_counter'
+
+# Like/save counters: an all-time row per recipe plus daily buckets that expire after the retention period
+STATS_ALL_TIME = 'all'
+STATS_RETENTION_DAYS = int(os.environ.get('STATS_RETENTION_DAYS', '35'))
+TRENDING_MAX_WINDOW_DAYS = min(STATS_RETENTION_DAYS, int(os.environ.get('TRENDING_MAX_WINDOW_DAYS', '30')))
+TRENDING_DEFAULT_LIMIT = 10
+TRENDING_MAX_LIMIT = 50
+# Candidates read per daily bucket (as a multiple of the limit) when merging a window
+TRENDING_DAY_FANOUT = int(os.environ.get('TRENDING_DAY_FANOUT', '5'))
+TRENDING_CACHE_TTL = float(os.environ.get('TRENDING_CACHE_TTL', '30'))
+
+# Shopping lists merge up to this many recipes (three meals a day for a month)
+SHOPPING_LIST_MAX_RECIPES = int(os.environ.get('SHOPPING_LIST_MAX_RECIPES', '93'))
+SHOPPING_LIST_MAX_SERVINGS = 100
+CURRENCY = 'ZAR'
+
+# Meal plans: solver time budget in seconds (well inside the 30 s Lambda timeout) and request limits
+MEAL_PLAN_TIME_BUDGET = float(os.environ.get('MEAL_PLAN_TIME_BUDGET', '5'))
+MEAL_PLAN_MAX_MEALS = 21
+MEAL_PLAN_MAX_PEOPLE = 20
+MEAL_PLAN_MAX_BUDGET = 100000
+# All-time most-liked recipes that count as popular when scoring a plan
+MEAL_PLAN_POPULAR_LIMIT = int(os.environ.get('MEAL_PLAN_POPULAR_LIMIT', '1000'))
+
+# Similar recipes: neighbours kept per recipe (the most ?limit= can ask for), candidates scored when a
+# list is computed, and seconds each warm-up invocation spends precomputing lists (popular recipes first)
+SIMILAR_TOP_K = int(os.environ.get('SIMILAR_TOP_K', '20'))
+SIMILAR_MAX_CANDIDATES = int(os.environ.get('SIMILAR_MAX_CANDIDATES', '1000'))
+SIMILAR_PRECOMPUTE_SECONDS = float(os.environ.get('SIMILAR_PRECOMPUTE_SECONDS', '2'))
+SIMILAR_DEFAULT_LIMIT = 10
+# Seconds a client is asked to wait (Retry-After) when the similarity index is not built yet
+SIMILAR_RETRY_AFTER = 1
+# Recommendations blend the neighbours of a user's most recent likes, each worth RECOMMEND_DECAY times the next
+RECOMMEND_MAX_SEEDS = 20
+RECOMMEND_DECAY = 0.9
+RECOMMEND_MAX_LIMIT = 50
+
+# Rate limits. Each route has a cost (RATE_LIMIT_COSTS="endpoint=cost,..." overrides the defaults);
+# it is spent from token buckets per client IP and per user in each container, and routes costing at
+# least RATE_LIMIT_SHARED_MIN_COST also count against a sliding window shared through DynamoDB
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_IP_RATE = float(os.environ.get('RATE_LIMIT_IP_RATE', '5'))
+RATE_LIMIT_IP_BURST = float(os.environ.get('RATE_LIMIT_IP_BURST', '60'))
+RATE_LIMIT_USER_RATE = float(os.environ.get('RATE_LIMIT_USER_RATE', '10'))
+RATE_LIMIT_USER_BURST = float(os.environ.get('RATE_LIMIT_USER_BURST', '120'))
+RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', '60'))
+RATE_LIMIT_SHARED_IP = int(os.environ.get('RATE_LIMIT_SHARED_IP', '600'))
+RATE_LIMIT_SHARED_USER = int(os.environ.get('RATE_LIMIT_SHARED_USER', '1200'))
+RATE_LIMIT_SHARED_MIN_COST = float(os.environ.get('RATE_LIMIT_SHARED_MIN_COST', '5'))
+# Sent by CloudFront on API origin requests; only then are its viewer-address headers trusted for client IPs
+ORIGIN_VERIFY_SECRET = os.environ.get('ORIGIN_VERIFY_SECRET', '')
+ROUTE_COSTS = {
+    'root': 0, 'health_check': 0,
+    'get_recipes': 2, 'search_recipes': 2, 'shopping_list': 2, 'user_state': 2, 'user_recommendations': 2,
+    'login': 5, 'forgot_password': 5, 'bulk_update_recipes': 5,
+    'register': 10, 'generate_recipe': 10, 'meal_plan': 10
+}
+ROUTE_COSTS.update(parse_costs(os.environ.get('RATE_LIMIT_COSTS')))
+
+# Logins by an email with no user-emails item fall back to the EmailIndex GSI (accounts from before
+# that table existed); turn off once `python app.py backfill-user-emails` has run
+USER_EMAIL_INDEX_FALLBACK = os.environ.get('USER_EMAIL_INDEX_FALLBACK', 'true').lower() == 'true'
+
+# Responses to POSTs sent with an Idempotency-Key are replayed for this long
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', str(24 * 3600)))
+# A claimed key whose request never finished is freed after this long (at least the Lambda timeout)
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '30'))
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Larger responses are not stored (DynamoDB items are capped at 400 KB)
+IDEMPOTENCY_MAX_BODY = 350 * 1024
+
+# Difficulty is the partition key of the CostIndex/TimeIndex GSIs, so it is normalised to one of these
+RECIPE_DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+# Query parameters that turn GET /api/recipes into a filtered listing
+LISTING_PARAMS = ('min_cost', 'max_cost', 'max_minutes', 'difficulty', 'min_servings', 'sort')
+
+# What list endpoints return unless ?fields= asks for more: the attributes a recipe card shows plus
+# what listings filter on. The CostIndex/TimeIndex GSIs project exactly these (see terraform/main.tf).
+SUMMARY_FIELDS = ('recipe_id', 'name', 'emoji', 'time', 'time_minutes', 'difficulty', 'servings', 'total_cost')
+MAX_FIELDS = 20
+FIELD_NAME_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+# Pre-serialised JSON is kept for the full recipe and at most this many projected views
+RECIPE_JSON_MAX_VIEWS = 8
+
+# Seconds a warm container may serve the recipe catalog from memory (0 disables)
+RECIPE_CACHE_TTL = float(os.environ.get('RECIPE_CACHE_TTL', '60'))
+# Hold the cached catalog as CompactRecipe objects over pooled values (see recipe_model.py)
+RECIPE_CACHE_COMPACT = os.environ.get('RECIPE_CACHE_COMPACT', 'true').lower() == 'true'
+
+# Static catalog snapshots: published under SNAPSHOT_PREFIX in SNAPSHOT_BUCKET (served by CloudFront),
+# or to SNAPSHOT_DIR when set; files no longer current are deleted after SNAPSHOT_RETAIN_SECONDS
+SNAPSHOT_BUCKET = os.environ.get('SNAPSHOT_BUCKET', '')
+SNAPSHOT_PREFIX = os.environ.get('SNAPSHOT_PREFIX', 'snapshots')
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '')
+SNAPSHOT_RETAIN_SECONDS = int(os.environ.get('SNAPSHOT_RETAIN_SECONDS', str(24 * 3600)))
+SNAPSHOT_UPLOAD_WORKERS = int(os.environ.get('SNAPSHOT_UPLOAD_WORKERS', '32'))
+
+# DYNAMODB_BACKEND=local runs against the in-memory stand-in instead of AWS (after the config it reads)
+if os.environ.get('DYNAMODB_BACKEND', 'aws').lower() == 'local':
+    use_local_dynamodb()
+
+instrumentation = RequestInstrumentation(
+    app, METRICS_NAMESPACE,
+    enabled=EMF_METRICS,
+    profile_sample_rate=PROFILE_SAMPLE_RATE,
+    profile_slow_ms=PROFILE_SLOW_MS
+)
 
 # ============= HELPER FUNCTIONS =============
 
-def decimal_to_float(obj):
-    """Convert Decimal objects to float for JSON serialization"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: decimal_to_float(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [decimal_to_float(i) for i in obj]
-    return obj
+def is_conditional_failure(error):
+    """True if a boto3 error is a failed ConditionExpression"""
+    return isinstance(error, ClientError) and \
+        error.response['Error']['Code'] == 'ConditionalCheckFailedException'
 
 def hash_password(password):
     """Hash password using SHA256"""
@@ -62,13 +344,121 @@ def generate_token(username):
     }
     return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
 
+class VerifiedTokenCache:
+    """Bounded LRU of JWTs that already passed signature verification.
+
+    Entries are keyed by a SHA-256 digest of the token (the token itself is
+    never stored) and expire at the token's ``exp``. Tokens that failed
+    verification are remembered for REJECTED_TOKEN_TTL seconds so repeated
+    bad tokens are turned away without another decode. Revoked tokens are
+    refused by this container until they would have expired anyway.
+    """
+
+    def __init__(self, max_size, rejected_ttl):
+        self.max_size = max_size
+        self.rejected_ttl = rejected_ttl
+        self.lock = threading.Lock()
+        self.verified = OrderedDict()
+        self.rejected = OrderedDict()
+        self.revoked = {}
+        self.hits = 0
+        self.misses = 0
+        self.rejected_hits = 0
+        self.verifications = 0
+        self.verify_seconds = 0.0
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def lookup(self, key, now):
+        """Return (found, username) for a token digest"""
+        with self.lock:
+            entry = self.verified.get(key)
+            if entry is not None:
+                username, exp = entry
+                if exp > now:
+                    self.verified.move_to_end(key)
+                    self.hits += 1
+                    return True, username
+                del self.verified[key]
+            if key in self.revoked:
+                if self.revoked[key] > now:
+                    self.rejected_hits += 1
+                    return True, None
+                del self.revoked[key]
+            rejected_until = self.rejected.get(key)
+            if rejected_until is not None:
+                if rejected_until > time.monotonic():
+                    self.rejected_hits += 1
+                    return True, None
+                del self.rejected[key]
+            self.misses += 1
+            return False, None
+
+    def store(self, key, username, exp, elapsed):
+        with self.lock:
+            self.verifications += 1
+            self.verify_seconds += elapsed
+            if username is None:
+                self.rejected[key] = time.monotonic() + self.rejected_ttl
+                self.rejected.move_to_end(key)
+                while len(self.rejected) > self.max_size:
+                    self.rejected.popitem(last=False)
+                return
+            self.verified[key] = (username, exp)
+            self.verified.move_to_end(key)
+            while len(self.verified) > self.max_size:
+                self.verified.popitem(last=False)
+
+    def revoke(self, token, exp=None):
+        """Refuse a token in this container until ``exp`` (default: its own expiry)"""
+        key = self.digest(token)
+        with self.lock:
+            entry = self.verified.pop(key, None)
+            if exp is None:
+                exp = entry[1] if entry else time.time() + 7 * 24 * 3600
+            self.revoked[key] = exp
+
+    def revoke_user(self, username):
+        """Forget every cached token of a user so each is verified again"""
+        with self.lock:
+            for key in [k for k, (u, _) in self.verified.items() if u == username]:
+                del self.verified[key]
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses + self.rejected_hits
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'rejected_hits': self.rejected_hits,
+                'hit_rate': round((self.hits + self.rejected_hits) / total, 4) if total else 0.0,
+                'size': len(self.verified),
+                'rejected_size': len(self.rejected),
+                'revoked_size': len(self.revoked),
+                'verifications': self.verifications,
+                'avg_verify_ms': round(1000 * self.verify_seconds / self.verifications, 4)
+                if self.verifications else 0.0
+            }
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE, REJECTED_TOKEN_TTL)
+
 def verify_token(token):
-    """Verify JWT token"""
+    """Verify JWT token, reusing earlier verifications of the same token"""
+    key = token_cache.digest(token)
+    found, username = token_cache.lookup(key, time.time())
+    if found:
+        return username
+    
+    started = time.perf_counter()
     try:
         payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload['username']
-    except:
-        return None
+        username, exp = payload['username'], payload['exp']
+    except Exception:
+        username, exp = None, None
+    token_cache.store(key, username, exp, time.perf_counter() - started)
+    return username
 
 def auth_required(f):
     """Authentication decorator"""
@@ -83,10 +473,1170 @@ def auth_required(f):
         if not username:
             return jsonify({'message': 'Invalid token'}), 401
         
+        g.username = username
         return f(username, *args, **kwargs)
     decorator.__name__ = f.__name__
     return decorator
 
+# ============= RATE LIMITING =============
+
+def request_username():
+    """Username of a valid bearer token on the current request, or None"""
+    token = request.headers.get('Authorization')
+    return verify_token(token.replace('Bearer ', '')) if token else None
+
+rate_limiter = RateLimiter(
+    app, request_username,
+    TokenBuckets(RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST),
+    TokenBuckets(RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST),
+    shared=SlidingWindow(rate_limit_table, RATE_LIMIT_WINDOW),
+    costs=ROUTE_COSTS,
+    shared_min_cost=RATE_LIMIT_SHARED_MIN_COST,
+    shared_ip_limit=RATE_LIMIT_SHARED_IP,
+    shared_user_limit=RATE_LIMIT_SHARED_USER,
+    enabled=RATE_LIMIT_ENABLED,
+    proxy_secret=ORIGIN_VERIFY_SECRET
+)
+
+# ============= IDEMPOTENCY =============
+
+class IdempotencyStore:
+    """Responses to POST requests sent with an Idempotency-Key, kept in a TTL'd DynamoDB table.
+
+    The first request with a key claims it with a conditional put of a
+    pending record and stores its response when it finishes; a repeat gets
+    that response back without running the handler. A duplicate that
+    arrives while the first is still running waits for it, on an in-process
+    event when both landed on this container and otherwise by polling the
+    record. A claim whose request died is freed after ``lock_seconds``.
+    """
+
+    def __init__(self, table, ttl, lock_seconds, poll_interval):
+        self.table = table
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.replays = 0
+
+    def claim(self, key, fingerprint):
+        """True if this request now owns ``key``; False if another request already does"""
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={'idempotency_key': key, 'fingerprint': fingerprint, 'expires_at': now + self.lock_seconds},
+                ConditionExpression='attribute_not_exists(idempotency_key) OR expires_at < :now',
+                ExpressionAttributeValues={':now': now}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        with self.lock:
+            self.in_flight[key] = threading.Event()
+        return True
+
+    def _finish(self, key):
+        with self.lock:
+            event = self.in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def complete(self, key, fingerprint, response):
+        """Store the owner's response for replay and wake any waiting duplicates.
+
+        The put only lands on this request's own pending claim: if the claim
+        expired and another request already stored its response (or claimed
+        the key for a different body) that record is left as it is.
+        """
+        try:
+            self.table.put_item(
+                Item={
+                    'idempotency_key': key,
+                    'fingerprint': fingerprint,
+                    'response_status': response.status_code,
+                    'content_type': response.content_type,
+                    'body': response.get_data(),
+                    'expires_at': int(time.time()) + self.ttl
+                },
+                ConditionExpression='fingerprint = :fp AND attribute_not_exists(response_status)',
+                ExpressionAttributeValues={':fp': fingerprint}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        finally:
+            self._finish(key)
+
+    def release(self, key):
+        """Drop a claim without a stored response so the request can be retried"""
+        try:
+            self.table.delete_item(Key={'idempotency_key': key})
+        finally:
+            self._finish(key)
+
+    def wait(self, key):
+        """The record for ``key`` once its owner finishes; None if it was released.
+
+        Returns the still-pending record if the owner does not finish within
+        ``lock_seconds``.
+        """
+        deadline = time.monotonic() + self.lock_seconds
+        with self.lock:
+            event = self.in_flight.get(key)
+        if event is not None:
+            event.wait(self.lock_seconds)
+        while True:
+            item = self.table.get_item(Key={'idempotency_key': key}, ConsistentRead=True).get('Item')
+            if item is None or 'response_status' in item or time.monotonic() >= deadline:
+                return item
+            time.sleep(self.poll_interval)
+
+    def replay(self, item):
+        self.replays += 1
+        response = app.response_class(bytes(item['body']), status=int(item['response_status']),
+                                      content_type=item.get('content_type'))
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+idempotency = IdempotencyStore(idempotency_table, IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_POLL_INTERVAL)
+
+def idempotent(f):
+    """Run a POST handler at most once per Idempotency-Key header.
+
+    Keys are scoped to the path and the caller: the user on routes behind
+    ``auth_required`` (which must be applied outside this, so requests that
+    fail authentication never reach the store), else the Authorization
+    header. Reusing a key with a different body is refused with 422.
+    Responses of 500 and above are not stored, so those requests can be
+    retried.
+    """
+    @functools.wraps(f)
+    def decorator(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if request.method != 'POST' or not key:
+            return f(*args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({'message': f'Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'}), 400
+        
+        username = g.get('username')
+        caller = f'user:{username}' if username else request.headers.get('Authorization', '')
+        scope = '\n'.join((caller, request.path, key))
+        record_key = hashlib.sha256(scope.encode()).hexdigest()
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        try:
+            while not idempotency.claim(record_key, fingerprint):
+                item = idempotency.wait(record_key)
+                if item is None:
+                    continue
+                if item['fingerprint'] != fingerprint:
+                    return jsonify({'message': 'Idempotency-Key was already used for a different request'}), 422
+                if 'response_status' not in item:
+                    return jsonify({'message': 'A request with this Idempotency-Key is still in progress'}), 409
+                return idempotency.replay(item)
+        except ClientError as e:
+            # Without the table the request still runs, just without duplicate protection
+            print(f"Idempotency store error: {e}")
+            return f(*args, **kwargs)
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency.release(record_key)
+            raise
+        try:
+            if response.status_code >= 500 or response.is_streamed or len(response.get_data()) > IDEMPOTENCY_MAX_BODY:
+                idempotency.release(record_key)
+            else:
+                idempotency.complete(record_key, fingerprint, response)
+        except ClientError as e:
+            print(f"Idempotency store error: {e}")
+        return response
+    return decorator
+
+# ============= FIELD SELECTION =============
+
+def get_fields(default='summary'):
+    """Recipe attributes asked for with ?fields=, as a tuple; None means whole recipes. Raises ValueError.
+
+    Accepts "summary" (SUMMARY_FIELDS), "full", or a comma-separated list
+    of attribute names (recipe_id is always included).
+    """
+    value = request.args.get('fields', default).strip()
+    if value == 'full':
+        return None
+    if value == 'summary':
+        return SUMMARY_FIELDS
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names or len(names) > MAX_FIELDS or not all(FIELD_NAME_RE.match(name) for name in names):
+        raise ValueError(f'fields must be "summary", "full" or up to {MAX_FIELDS} comma-separated attribute names')
+    names = set(names) | {'recipe_id'}
+    return SUMMARY_FIELDS if names == set(SUMMARY_FIELDS) else tuple(sorted(names))
+
+def projection(fields):
+    """ProjectionExpression arguments reading only ``fields`` (none for whole items).
+
+    Every name goes through a placeholder: name, time and others are
+    DynamoDB reserved words.
+    """
+    if fields is None:
+        return {}
+    return {
+        'ProjectionExpression': ', '.join(f'#f_{name}' for name in fields),
+        'ExpressionAttributeNames': {f'#f_{name}': name for name in fields}
+    }
+
+def project(recipe, fields):
+    """The ``fields`` of a recipe (all of it when ``fields`` is None)"""
+    if fields is None:
+        return recipe_item(recipe)
+    return {name: recipe[name] for name in fields if name in recipe}
+
+def view_etag(etag, fields):
+    """ETag of one projected view of a resource whose whole-item ETag is ``etag``"""
+    if fields is None:
+        return etag
+    return hashlib.sha256(f'{etag}|{",".join(fields)}'.encode()).hexdigest()[:32]
+
+# ============= RECIPE CATALOG CACHE =============
+
+def read_all(operation, **kwargs):
+    """Run a scan or query to the end, following LastEvaluatedKey"""
+    items = []
+    while True:
+        response = operation(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+class RecipeCatalogCache:
+    """Process-local copy of the recipes table, shared by every request in a warm container.
+
+    Listeners (such as the search index) are objects with ``sync(recipes)``,
+    called after every reload, and ``add(recipe)``, called for single writes.
+    With ``compact`` the recipes are held as read-only CompactRecipe mappings
+    whose values are shared within each load, rather than as boto3's dicts.
+    Listeners keep only what they derive, so they are given the loaded items
+    themselves and skip decoding the compact form.
+    """
+
+    def __init__(self, loader, ttl, compact=False):
+        self.loader = loader
+        self.ttl = ttl
+        self.compact = compact
+        self.lock = threading.Lock()
+        self.recipes = None
+        self.by_id = {}
+        self.loaded_at = 0.0
+        self.listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self):
+        """Return the cached catalog, reloading it once the TTL has passed"""
+        with self.lock:
+            if self.recipes is not None and time.monotonic() - self.loaded_at < self.ttl:
+                self.hits += 1
+                return self.recipes
+            self.misses += 1
+            items = recipes = self.loader()
+            if self.compact:
+                pool = ValuePool()
+                recipes = [compact_recipe(r, pool) for r in items]
+            self.recipes = recipes
+            self.by_id = {int(r['recipe_id']): r for r in recipes}
+            self.loaded_at = time.monotonic()
+            for listener in self.listeners:
+                listener.sync(items)
+            return recipes
+
+    def peek(self):
+        """Return the cached catalog if it is loaded and fresh, else None; never loads it"""
+        with self.lock:
+            if self.recipes is not None and time.monotonic() - self.loaded_at < self.ttl:
+                return self.recipes
+            return None
+
+    def peek_by_id(self):
+        """Return the cached catalog keyed by recipe_id if it is loaded and fresh, else None; never loads it"""
+        with self.lock:
+            if self.recipes is not None and time.monotonic() - self.loaded_at < self.ttl:
+                return self.by_id
+            return None
+
+    def get_by_id(self):
+        """Return the cached catalog keyed by recipe_id"""
+        self.get()
+        return self.by_id
+
+    def upsert(self, recipe):
+        """Apply a single recipe write to the cached copy without a reload"""
+        with self.lock:
+            cached = compact_recipe(recipe, ValuePool()) if self.compact else recipe
+            if self.recipes is not None:
+                recipe_id = int(recipe['recipe_id'])
+                self.recipes = [r for r in self.recipes if int(r['recipe_id']) != recipe_id] + [cached]
+                self.by_id = dict(self.by_id)
+                self.by_id[recipe_id] = cached
+            for listener in self.listeners:
+                listener.add(recipe)
+
+    def invalidate(self):
+        """Drop the cached catalog so the next read goes to DynamoDB"""
+        with self.lock:
+            self.recipes = None
+            self.by_id = {}
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'size': len(self.recipes) if self.recipes is not None else 0,
+                'age_seconds': round(time.monotonic() - self.loaded_at, 3) if self.recipes is not None else None,
+                'ttl_seconds': self.ttl,
+                'compact': self.compact
+            }
+
+# ============= CATALOG VERSION / ETAGS =============
+
+def _canonical(obj):
+    """Recipe data with numbers spelled one way, whether they came from Python or DynamoDB"""
+    if isinstance(obj, Mapping):
+        return {k: _canonical(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_canonical(v) for v in obj]
+    if isinstance(obj, (int, Decimal)) and not isinstance(obj, bool):
+        return format(Decimal(obj).normalize(), 'f')
+    return obj
+
+def recipe_digest(recipe):
+    """Stable content hash of one recipe, identical in every container"""
+    payload = json.dumps(_canonical(recipe), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+class CatalogVersion:
+    """Order-independent fingerprint of the catalog, kept up to date as recipes change.
+
+    The version is the XOR of every recipe's digest, so one write updates it
+    in O(1) and two containers holding the same catalog agree on it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.digests = {}
+        self.value = 0
+
+    def sync(self, recipes):
+        digests = {int(r['recipe_id']): recipe_digest(r) for r in recipes}
+        value = 0
+        for digest in digests.values():
+            value ^= int(digest, 16)
+        with self.lock:
+            self.digests = digests
+            self.value = value
+
+    def add(self, recipe):
+        recipe_id = int(recipe['recipe_id'])
+        digest = recipe_digest(recipe)
+        with self.lock:
+            old = self.digests.get(recipe_id)
+            if old:
+                self.value ^= int(old, 16)
+            self.digests[recipe_id] = digest
+            self.value ^= int(digest, 16)
+
+    def etag(self, *parts):
+        """Strong ETag for a response derived from the whole catalog"""
+        key = '|'.join([f'{self.value:032x}'] + [str(p) for p in parts])
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def recipe_etag(self, recipe_id):
+        """ETag of a single recipe, or None if it is not in the cached catalog"""
+        return self.digests.get(int(recipe_id))
+
+def conditional_response(etag, policy, build):
+    """304 if the client already holds ``etag``, otherwise build the response and tag it"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_POLICIES[policy]
+    return response
+
+class RecipeJSONCache:
+    """Pre-serialised JSON for each cached recipe, keyed by recipe_id and content digest.
+
+    List responses are assembled by joining these fragments, so a recipe is
+    encoded once per version rather than once per request. Projected views
+    (``fields`` tuples such as SUMMARY_FIELDS) get their own fragments; the
+    least recently used view is dropped beyond RECIPE_JSON_MAX_VIEWS.
+    """
+
+    def __init__(self, version, max_views=RECIPE_JSON_MAX_VIEWS):
+        self.version = version
+        self.max_views = max_views
+        self.fragments = {}
+        self.views = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def sync(self, recipes):
+        current = {int(r['recipe_id']) for r in recipes}
+        self.fragments = {rid: f for rid, f in self.fragments.items() if rid in current}
+        for fields, fragments in list(self.views.items()):
+            self.views[fields] = {rid: f for rid, f in fragments.items() if rid in current}
+
+    def add(self, recipe):
+        recipe_id = int(recipe['recipe_id'])
+        self.fragments.pop(recipe_id, None)
+        for fragments in list(self.views.values()):
+            fragments.pop(recipe_id, None)
+
+    def _view(self, fields):
+        if fields is None:
+            return self.fragments
+        fragments = self.views.get(fields)
+        if fragments is None:
+            fragments = self.views[fields] = {}
+            while len(self.views) > self.max_views:
+                self.views.popitem(last=False)
+        else:
+            self.views.move_to_end(fields)
+        return fragments
+
+    def fragment(self, recipe, fields=None):
+        """Encoded JSON of one recipe from the cached catalog, projected to ``fields`` if given"""
+        recipe_id = int(recipe['recipe_id'])
+        digest = self.version.recipe_etag(recipe_id)
+        fragments = self._view(fields)
+        entry = fragments.get(recipe_id)
+        if entry is not None and entry[0] == digest:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        data = app.json.dumps_bytes(project(recipe, fields))
+        if digest is not None:
+            fragments[recipe_id] = (digest, data)
+        return data
+
+    def array(self, recipes, fields=None):
+        return b'[' + b','.join(self.fragment(r, fields) for r in recipes) + b']'
+
+def json_bytes_response(body):
+    """Response for JSON that is already encoded"""
+    return app.response_class(body + b'\n', mimetype='application/json')
+
+recipe_cache = RecipeCatalogCache(lambda: read_all(recipes_table.scan), RECIPE_CACHE_TTL, RECIPE_CACHE_COMPACT)
+search_index = RecipeSearchIndex()
+listing_index = RecipeListingIndex()
+shopping_lists = ShoppingListIndex()
+meal_plans = MealPlanIndex()
+similarity_index = RecipeSimilarityIndex(SIMILAR_TOP_K, SIMILAR_MAX_CANDIDATES)
+catalog_version = CatalogVersion()
+recipe_json = RecipeJSONCache(catalog_version)
+recipe_cache.listeners.extend([search_index, listing_index, shopping_lists, meal_plans, similarity_index,
+                               catalog_version, recipe_json])
+
+# ============= BATCH READS AND WRITES =============
+
+_batch_executor = None
+
+def get_batch_executor():
+    """Thread pool shared by concurrent DynamoDB batch calls, created on first use"""
+    global _batch_executor
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(max_workers=HYDRATE_CONCURRENCY)
+    return _batch_executor
+
+def backoff(attempt):
+    """Sleep with capped exponential backoff and jitter before a retry"""
+    time.sleep(min(1.0, BATCH_BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0))
+
+def batch_get(table_name, keys, **options):
+    """BatchGetItem for up to 100 keys, retrying UnprocessedKeys with backoff"""
+    items = []
+    request_items = {table_name: dict(options, Keys=keys)}
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        response = call_dynamodb(table_name, 'batch_get_item', get_dynamodb().batch_get_item,
+                                 RequestItems=request_items)
+        items.extend(response['Responses'].get(table_name, []))
+        request_items = response.get('UnprocessedKeys') or {}
+        if not request_items:
+            return items
+        backoff(attempt)
+    remaining = len(request_items[table_name]['Keys'])
+    raise RuntimeError(f'BatchGetItem left {remaining} keys unprocessed after {BATCH_MAX_RETRIES} retries')
+
+def batch_write(table_name, requests):
+    """BatchWriteItem for up to 25 put/delete requests, retrying UnprocessedItems with backoff"""
+    request_items = {table_name: requests}
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        response = call_dynamodb(table_name, 'batch_write_item', get_dynamodb().batch_write_item,
+                                 RequestItems=request_items)
+        request_items = response.get('UnprocessedItems') or {}
+        if not request_items:
+            return
+        backoff(attempt)
+    remaining = len(request_items[table_name])
+    raise RuntimeError(f'BatchWriteItem left {remaining} items unprocessed after {BATCH_MAX_RETRIES} retries')
+
+def hydrate_recipes(recipe_ids, concurrent=True, fields=None):
+    """Load recipes for a list of ids with BatchGetItem, keeping the caller's order.
+
+    Ids are de-duplicated and split into chunks of 100 keys; with
+    ``concurrent`` the chunks are fetched in parallel. Only ``fields`` are
+    read when given. Ids whose recipe no longer exists are dropped.
+    """
+    recipe_ids = list(dict.fromkeys(int(rid) for rid in recipe_ids))
+    chunks = [
+        [{'recipe_id': rid} for rid in recipe_ids[i:i + BATCH_GET_MAX_KEYS]]
+        for i in range(0, len(recipe_ids), BATCH_GET_MAX_KEYS)
+    ]
+    if concurrent and len(chunks) > 1:
+        fetch = propagate(lambda keys: batch_get(recipes_table.name, keys, **projection(fields)))
+        results = get_batch_executor().map(fetch, chunks)
+    else:
+        results = [batch_get(recipes_table.name, keys, **projection(fields)) for keys in chunks]
+    
+    found = {}
+    for items in results:
+        for item in items:
+            found[int(item['recipe_id'])] = item
+    return [found[rid] for rid in recipe_ids if rid in found]
+
+def hydrated(recipe_ids, fields=None):
+    """``{recipe_id: recipe}`` for the ids that still exist, read with ``hydrate_recipes``"""
+    return {int(r['recipe_id']): r for r in hydrate_recipes(recipe_ids, fields=fields)}
+
+# ============= RECIPE ID ALLOCATION =============
+
+class RecipeIdAllocator:
+    """Hands out recipe ids from blocks leased off an atomic counter item.
+
+    Each lease is one ``UpdateItem ADD`` on the counter in the metadata
+    table, so concurrent containers always get disjoint blocks and most
+    allocations need no network call. The counter is created once from the
+    current highest recipe_id if it does not exist yet.
+    """
+
+    def __init__(self, table, block_size):
+        self.table = table
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.last_id = 0
+
+    def _initialise_counter(self):
+        rows = read_all(recipes_table.scan, ProjectionExpression='recipe_id')
+        highest = max([int(r['recipe_id']) for r in rows], default=0)
+        try:
+            self.table.put_item(
+                Item={'meta_key': RECIPE_ID_COUNTER, 'next_id': highest},
+                ConditionExpression='attribute_not_exists(meta_key)'
+            )
+            print(f"Recipe id counter initialised at {highest}")
+        except ClientError as e:
+            if not is_conditional_failure(e):
+                raise
+
+    def _lease(self):
+        for _ in range(2):
+            try:
+                response = self.table.update_item(
+                    Key={'meta_key': RECIPE_ID_COUNTER},
+                    UpdateExpression='ADD next_id :block',
+                    ConditionExpression='attribute_exists(next_id)',
+                    ExpressionAttributeValues={':block': self.block_size},
+                    ReturnValues='UPDATED_NEW'
+                )
+            except ClientError as e:
+                if not is_conditional_failure(e):
+                    raise
+                self._initialise_counter()
+                continue
+            self.last_id = int(response['Attributes']['next_id'])
+            self.next_id = self.last_id - self.block_size + 1
+            return
+        raise RuntimeError('Could not lease a block of recipe ids')
+
+    def advance(self, highest):
+        """Make later leases start above ``highest``, after recipes were written with explicit ids"""
+        try:
+            self.table.update_item(
+                Key={'meta_key': RECIPE_ID_COUNTER},
+                UpdateExpression='SET next_id = :highest',
+                ConditionExpression='next_id < :highest',
+                ExpressionAttributeValues={':highest': highest}
+            )
+        except ClientError as e:
+            # Already higher, or not created yet (it will be initialised from the table)
+            if not is_conditional_failure(e):
+                raise
+
+    def allocate(self):
+        """Return the next unused recipe id"""
+        with self.lock:
+            if self.next_id > self.last_id:
+                self._lease()
+            recipe_id = self.next_id
+            self.next_id += 1
+            return recipe_id
+
+recipe_ids = RecipeIdAllocator(metadata_table, RECIPE_ID_BLOCK_SIZE)
+
+def prepare_recipe(recipe):
+    """Copy of a recipe with the fields filters and GSIs rely on derived from the free-form ones"""
+    recipe = dict(recipe)
+    minutes = parse_minutes(recipe.get('time'))
+    if minutes is not None:
+        recipe['time_minutes'] = minutes
+    if recipe.get('difficulty'):
+        recipe['difficulty'] = str(recipe['difficulty']).strip().title()
+    if recipe.get('ingredients'):
+        recipe['ingredients'] = [normalise_ingredient(i) for i in recipe['ingredients']]
+    return recipe
+
+def backfill_recipes():
+    """Add derived fields to recipes written before they existed (one-off migration)"""
+    updated = 0
+    for recipe in read_all(recipes_table.scan):
+        prepared = prepare_recipe(recipe)
+        if prepared != recipe:
+            recipes_table.put_item(Item=prepared)
+            updated += 1
+    recipe_cache.invalidate()
+    print(f"Backfilled {updated} recipes")
+    return updated
+
+def put_new_recipe(recipe, attempts=5):
+    """Write a recipe under a freshly allocated id; never overwrites an existing recipe"""
+    for _ in range(attempts):
+        recipe['recipe_id'] = recipe_ids.allocate()
+        try:
+            recipes_table.put_item(Item=recipe, ConditionExpression='attribute_not_exists(recipe_id)')
+            return recipe
+        except ClientError as e:
+            if not is_conditional_failure(e):
+                raise
+            print(f"Recipe id {recipe['recipe_id']} already taken, allocating another")
+    raise RuntimeError(f'No free recipe id after {attempts} attempts')
+
+# ============= LIKE / SAVE COUNTERS =============
+
+# Per-user recipe lists: table, timestamp attribute on each row, and the counter it drives
+USER_COLLECTIONS = {
+    'saved': (saved_recipes_table, 'saved_at', 'save_count'),
+    'liked': (liked_recipes_table, 'liked_at', 'like_count')
+}
+
+_serializer = TypeSerializer()
+
+def to_attribute_values(item):
+    """Low-level (client API) form of a plain item, for TransactWriteItems"""
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+def stats_rows(recipe_id, day):
+    """(key, expires_at) of every recipe-stats row a like/save on ``day`` counts towards"""
+    rows = [({'recipe_id': recipe_id, 'period': STATS_ALL_TIME}, None)]
+    today = datetime.datetime.utcnow().date()
+    if day is not None and (today - day).days < STATS_RETENTION_DAYS:
+        expires = datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(days=STATS_RETENTION_DAYS)
+        rows.append(({'recipe_id': recipe_id, 'period': f'day#{day.isoformat()}'},
+                     int(expires.replace(tzinfo=datetime.timezone.utc).timestamp())))
+    return rows
+
+def stamp_day(stamp):
+    """UTC date of a saved_at/liked_at timestamp, or None if it is missing"""
+    try:
+        return datetime.date.fromisoformat(str(stamp)[:10])
+    except ValueError:
+        return None
+
+def counter_updates(recipe_id, counter, delta, day):
+    """TransactWriteItems entries moving ``counter`` by ``delta`` in the all-time row and the day's bucket"""
+    updates = []
+    for key, expires in stats_rows(recipe_id, day):
+        update = {
+            'TableName': RECIPE_STATS_TABLE,
+            'Key': to_attribute_values(key),
+            'UpdateExpression': 'ADD #counter :delta',
+            'ExpressionAttributeNames': {'#counter': counter},
+            'ExpressionAttributeValues': to_attribute_values({':delta': delta})
+        }
+        if expires is not None:
+            update['UpdateExpression'] += ' SET expires_at = :expires'
+            update['ExpressionAttributeValues'].update(to_attribute_values({':expires': expires}))
+        updates.append({'Update': update})
+    return updates
+
+def counted_write(table_name, row_write, counters, checks=()):
+    """Write a saved/liked row and its counter updates atomically.
+
+    The row write carries a condition (not already saved / still saved), so
+    repeating a like or an unlike cancels the transaction and leaves the
+    counters alone. Returns True once written, False when the row condition
+    failed and None when one of ``checks`` (ConditionCheck entries) did.
+    """
+    try:
+        call_dynamodb(table_name, 'transact_write_items', get_dynamodb().meta.client.transact_write_items,
+                      TransactItems=[row_write, *checks, *counters])
+        return True
+    except ClientError as e:
+        reasons = e.response.get('CancellationReasons') or []
+        failed = [i for i, reason in enumerate(reasons) if reason.get('Code') == 'ConditionalCheckFailed']
+        if e.response['Error']['Code'] == 'TransactionCanceledException' and failed:
+            if failed[0] == 0:
+                return False
+            if failed[0] <= len(checks):
+                return None
+        raise
+
+def add_to_collection(collection, username, recipe_id):
+    """Save or like a recipe; True if the user had not already done so, None if the recipe does not exist"""
+    table, stamp_attr, counter = USER_COLLECTIONS[collection]
+    now = datetime.datetime.utcnow()
+    item = {'username': username, 'recipe_id': recipe_id, stamp_attr: now.isoformat()}
+    return counted_write(table.name, {'Put': {
+        'TableName': table.name,
+        'Item': to_attribute_values(item),
+        'ConditionExpression': 'attribute_not_exists(recipe_id)'
+    }}, counter_updates(recipe_id, counter, 1, now.date()), checks=[{'ConditionCheck': {
+        'TableName': recipes_table.name,
+        'Key': to_attribute_values({'recipe_id': recipe_id}),
+        'ConditionExpression': 'attribute_exists(recipe_id)'
+    }}])
+
+def remove_from_collection(collection, username, recipe_id, existing=None):
+    """Unsave or unlike a recipe; True if it was in the user's list.
+
+    ``existing`` is the user's row when the caller has already read it.
+    """
+    table, stamp_attr, counter = USER_COLLECTIONS[collection]
+    key = {'username': username, 'recipe_id': recipe_id}
+    if existing is None:
+        existing = table.get_item(Key=key).get('Item')
+    if not existing:
+        return False
+    # The daily bucket the like was counted in is the one that gives it back, so the row must still be that like
+    delete = {
+        'TableName': table.name,
+        'Key': to_attribute_values(key),
+        'ConditionExpression': 'attribute_exists(recipe_id)'
+    }
+    stamp = existing.get(stamp_attr)
+    if stamp is not None:
+        delete['ConditionExpression'] += ' AND #stamp = :stamp'
+        delete['ExpressionAttributeNames'] = {'#stamp': stamp_attr}
+        delete['ExpressionAttributeValues'] = to_attribute_values({':stamp': stamp})
+    return counted_write(table.name, {'Delete': delete}, counter_updates(recipe_id, counter, -1, stamp_day(stamp)))
+
+def rebuild_counters():
+    """Recompute all-time like/save counters from the saved and liked tables (one-off backfill)"""
+    totals = {}
+    for collection, (table, _, counter) in USER_COLLECTIONS.items():
+        for row in read_all(table.scan, ProjectionExpression='recipe_id'):
+            counts = totals.setdefault(int(row['recipe_id']), {'like_count': 0, 'save_count': 0})
+            counts[counter] += 1
+    # Recipes nobody saves or likes any more still have their old all-time row, which must go back to zero
+    for row in read_all(recipe_stats_table.scan, FilterExpression=Attr('period').eq(STATS_ALL_TIME),
+                        ProjectionExpression='recipe_id, like_count, save_count'):
+        counts = totals.setdefault(int(row['recipe_id']), {'like_count': 0, 'save_count': 0})
+        if not any(counts.values()) and not row.get('like_count') and not row.get('save_count'):
+            del totals[int(row['recipe_id'])]
+    for recipe_id, counts in totals.items():
+        recipe_stats_table.update_item(
+            Key={'recipe_id': recipe_id, 'period': STATS_ALL_TIME},
+            UpdateExpression='SET like_count = :likes, save_count = :saves',
+            ExpressionAttributeValues={':likes': counts['like_count'], ':saves': counts['save_count']}
+        )
+    print(f"Rebuilt counters for {len(totals)} recipes")
+    return len(totals)
+
+class TrendingRecipes:
+    """Most-liked recipe ids per window, read from the PeriodLikesIndex GSI.
+
+    The index keeps each period's rows sorted by like_count, so all-time
+    top-N is a single Query. A window of days merges the top candidates
+    of each daily bucket. Results are kept for ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def top(self, window_days, limit):
+        """``[(recipe_id, likes)]``; ``window_days`` None means all time"""
+        key = (window_days, limit)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+        if window_days is None:
+            ranked = self._period_top(STATS_ALL_TIME, limit)
+        else:
+            today = datetime.datetime.utcnow().date()
+            periods = [f'day#{(today - datetime.timedelta(days=n)).isoformat()}' for n in range(window_days)]
+            fetch = propagate(lambda period: self._period_top(period, limit * TRENDING_DAY_FANOUT))
+            totals = {}
+            for rows in get_batch_executor().map(fetch, periods):
+                for recipe_id, likes in rows:
+                    totals[recipe_id] = totals.get(recipe_id, 0) + likes
+            ranked = sorted(totals.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        with self.lock:
+            self.entries[key] = (time.monotonic(), ranked)
+        return ranked
+
+    def _period_top(self, period, limit):
+        response = recipe_stats_table.query(
+            IndexName='PeriodLikesIndex',
+            KeyConditionExpression=Key('period').eq(period),
+            ScanIndexForward=False,
+            Limit=limit
+        )
+        return [(int(r['recipe_id']), int(r['like_count'])) for r in response['Items'] if r['like_count'] > 0]
+
+trending = TrendingRecipes(TRENDING_CACHE_TTL)
+
+# ============= USER ACCOUNTS =============
+
+def normalise_email(email):
+    """Key of an address in the user-emails table: addresses are unique regardless of case"""
+    return str(email).strip().lower()
+
+def create_user(username, email, password):
+    """Write a new user and claim their email address in one transaction.
+
+    Returns None on success, or 'username' / 'email' when that one is
+    already registered (nothing is written in that case).
+    """
+    user = {
+        'username': username,
+        'email': email,
+        'password': hash_password(password),
+        'created_at': datetime.datetime.utcnow().isoformat()
+    }
+    try:
+        call_dynamodb(users_table.name, 'transact_write_items', get_dynamodb().meta.client.transact_write_items,
+                      TransactItems=[
+                          {'Put': {
+                              'TableName': users_table.name,
+                              'Item': to_attribute_values(user),
+                              'ConditionExpression': 'attribute_not_exists(username)'
+                          }},
+                          {'Put': {
+                              'TableName': user_emails_table.name,
+                              'Item': to_attribute_values({'email': normalise_email(email), 'username': username}),
+                              'ConditionExpression': 'attribute_not_exists(email)'
+                          }}
+                      ])
+    except ClientError as e:
+        codes = [reason.get('Code') for reason in e.response.get('CancellationReasons') or []]
+        if e.response['Error']['Code'] == 'TransactionCanceledException' and 'ConditionalCheckFailed' in codes:
+            return 'username' if codes[0] == 'ConditionalCheckFailed' else 'email'
+        raise
+    return None
+
+def find_user(email_or_username):
+    """User item for a username or an email address, or None.
+
+    Without an '@' the input can only be a username: one GetItem. With one
+    it may be either (usernames are not restricted), so the username read
+    and the email -> username read run concurrently; a username match wins,
+    as it always has.
+    """
+    def by_username():
+        return users_table.get_item(Key={'username': email_or_username}).get('Item')
+    
+    if '@' not in email_or_username:
+        return by_username()
+    pending = get_batch_executor().submit(propagate(by_username))
+    claimed = user_emails_table.get_item(Key={'email': normalise_email(email_or_username)}).get('Item')
+    user = pending.result()
+    if user:
+        return user
+    if claimed:
+        return users_table.get_item(Key={'username': claimed['username']}).get('Item')
+    if USER_EMAIL_INDEX_FALLBACK:
+        response = users_table.query(
+            IndexName='EmailIndex',
+            KeyConditionExpression=Key('email').eq(email_or_username)
+        )
+        if response['Items']:
+            return response['Items'][0]
+    return None
+
+def backfill_user_emails():
+    """Claim the email address of every existing user (one-off migration).
+
+    An address already claimed by a different user is reported and left
+    alone; that account can still log in by username.
+    """
+    claimed, conflicts = 0, 0
+    for user in read_all(users_table.scan, ProjectionExpression='username, email'):
+        if not user.get('email'):
+            continue
+        try:
+            user_emails_table.put_item(
+                Item={'email': normalise_email(user['email']), 'username': user['username']},
+                ConditionExpression='attribute_not_exists(email) OR username = :username',
+                ExpressionAttributeValues={':username': user['username']}
+            )
+            claimed += 1
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            conflicts += 1
+            print(f"Email of {user['username']} is already claimed by another user")
+    print(f"Claimed {claimed} email addresses ({conflicts} conflicts)")
+    return claimed
+
+# ============= PAGINATION =============
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _cursor_signature(body, issued, scope):
+    digest = hmac.new(SECRET_KEY.encode(), f'{scope}|{issued}|{body}'.encode(), hashlib.sha256).digest()
+    return _b64encode(digest[:16])
+
+def encode_cursor(position, scope, now=None):
+    """Turn a resume position into an opaque token signed for one endpoint, stamped with when it was issued"""
+    body = _b64encode(json.dumps(position, default=json_default, separators=(',', ':'), sort_keys=True).encode())
+    issued = int(time.time() if now is None else now)
+    return f'{body}.{issued}.{_cursor_signature(body, issued, scope)}'
+
+def decode_cursor(token, scope, now=None):
+    """Verify a cursor token and return its position, or raise ValueError (also once it is CURSOR_TTL old)"""
+    try:
+        body, issued, signature = token.split('.')
+        if not hmac.compare_digest(signature, _cursor_signature(body, issued, scope)):
+            raise ValueError('bad signature')
+        if CURSOR_TTL > 0 and (time.time() if now is None else now) - int(issued) > CURSOR_TTL:
+            raise ValueError('expired')
+        return json.loads(_b64decode(body), parse_float=Decimal)
+    except Exception as e:
+        raise ValueError(f'Invalid cursor: {e}') from None
+
+def cursor_generation():
+    """A counter that moves on every CURSOR_TTL / 2 seconds, for the ETags of paged responses.
+
+    A cached page revalidated with a 304 keeps its old body, cursors and
+    all; changing its ETag every half TTL means no page is served with
+    cursors that are about to expire.
+    """
+    return int(time.time() // (CURSOR_TTL / 2)) if CURSOR_TTL > 0 else 0
+
+def get_page_args(scope):
+    """Read ?limit= and ?cursor=; returns None when the client did not ask for paging"""
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError('limit must be an integer') from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    position = decode_cursor(cursor, scope) if cursor else None
+    return limit, position
+
+def paginate(operation, key_attrs, limit, start_key=None, predicate=None, **kwargs):
+    """Read one page from a DynamoDB scan/query, resuming at ``start_key``.
+
+    Keeps reading until ``limit`` items pass ``predicate`` or the table is
+    exhausted. Returns the items and the key to resume after (None at the end).
+    DynamoDB returns scan and query results in a fixed key order, so the same
+    cursor always resumes at the same place.
+    """
+    items = []
+    # Filtered reads discard rows, so fetch wider pages to save round trips
+    read_size = max(limit, MAX_PAGE_SIZE) if predicate else limit
+    while True:
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        response = operation(Limit=read_size, **kwargs)
+        batch = response['Items']
+        for index, item in enumerate(batch):
+            if predicate and not predicate(item):
+                continue
+            items.append(item)
+            if len(items) == limit:
+                more = index < len(batch) - 1 or 'LastEvaluatedKey' in response
+                return items, ({k: item[k] for k in key_attrs} if more else None)
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key:
+            return items, None
+
+def page_response(items, next_key, scope, cached=False, fields=None):
+    """JSON body for one page of a paged list endpoint.
+
+    ``cached`` items come from the catalog cache and reuse their
+    pre-serialised fragments for ``fields``.
+    """
+    next_cursor = encode_cursor(next_key, scope) if next_key else None
+    if cached:
+        body = b''.join([
+            b'{"count":', str(len(items)).encode(),
+            b',"items":', recipe_json.array(items, fields),
+            b',"next_cursor":', app.json.dumps_bytes(next_cursor), b'}'
+        ])
+        return json_bytes_response(body)
+    return jsonify({
+        'items': items,
+        'count': len(items),
+        'next_cursor': next_cursor
+    })
+
+def offset_page(items, page, scope, fields=None):
+    """One page of an in-memory list of cached recipes, resumed by offset"""
+    limit, position = page
+    offset = position['offset'] if position else 0
+    next_key = {'offset': offset + limit} if offset + limit < len(items) else None
+    return page_response(items[offset:offset + limit], next_key, scope, cached=True, fields=fields)
+
+# ============= FILTERED LISTINGS =============
+
+def get_listing_filters():
+    """Filters and sort order for GET /api/recipes, or None if none were given; raises ValueError"""
+    args = request.args
+    if not any(name in args for name in LISTING_PARAMS):
+        return None
+    filters = {}
+    for name in ('min_cost', 'max_cost'):
+        if name in args:
+            cents = to_cents(args[name])
+            if cents is None or cents < 0:
+                raise ValueError(f'{name} must be a non-negative amount')
+            filters[name] = cents
+    for name in ('max_minutes', 'min_servings'):
+        if name in args:
+            if not args[name].isdigit():
+                raise ValueError(f'{name} must be a whole number')
+            filters[name] = int(args[name])
+    if 'difficulty' in args:
+        difficulty = args['difficulty'].strip().title()
+        if difficulty not in RECIPE_DIFFICULTIES:
+            raise ValueError(f'difficulty must be one of {", ".join(RECIPE_DIFFICULTIES)}')
+        filters['difficulty'] = difficulty
+    if 'sort' in args:
+        if args['sort'].lstrip('-') not in SORT_FIELDS:
+            raise ValueError(f'sort must be one of {", ".join(SORT_FIELDS)} (prefix with - for descending)')
+        filters['sort'] = args['sort']
+    return filters
+
+def listing_scope(filters):
+    """Cursor scope of a filtered listing, independent of parameter order"""
+    return f'{request.path}?{urlencode(sorted(filters.items()))}'
+
+def matches_listing(recipe, filters):
+    """True if a recipe item passes every filter"""
+    cents, minutes, difficulty, servings = RecipeListingIndex.row(recipe)
+    return not (
+        ('min_cost' in filters and (cents is None or cents < filters['min_cost']))
+        or ('max_cost' in filters and (cents is None or cents > filters['max_cost']))
+        or ('max_minutes' in filters and (minutes is None or minutes > filters['max_minutes']))
+        or ('difficulty' in filters and difficulty != filters['difficulty'].lower())
+        or ('min_servings' in filters and (servings is None or servings < filters['min_servings']))
+    )
+
+def query_listing(filters, page, fields=SUMMARY_FIELDS):
+    """Filtered recipes read from the CostIndex/TimeIndex GSIs instead of the catalog cache.
+
+    Each difficulty is one GSI partition already sorted by cost or time.
+    The partitions are queried concurrently with a key condition on the
+    range and merged, so a page reads O(limit) items per partition rather
+    than scanning the table. The indexes only hold SUMMARY_FIELDS; other
+    ``fields`` are read from the table with BatchGetItem. Returns (items,
+    next position or None).
+    """
+    sort = filters.get('sort')
+    if sort is None:
+        cost_bound = 'min_cost' in filters or 'max_cost' in filters
+        sort = 'time' if 'max_minutes' in filters and not cost_bound else 'cost'
+    descending = sort.startswith('-')
+    if sort.lstrip('-') == 'time':
+        index, attr = 'TimeIndex', 'time_minutes'
+        low, high = None, filters.get('max_minutes')
+    else:
+        index, attr = 'CostIndex', 'total_cost'
+        low, high = [Decimal(filters[name]) / 100 if name in filters else None for name in ('min_cost', 'max_cost')]
+    
+    def key_condition(difficulty):
+        condition = Key('difficulty').eq(difficulty)
+        if low is not None and high is not None:
+            return condition & Key(attr).between(low, high)
+        if low is not None:
+            return condition & Key(attr).gte(low)
+        if high is not None:
+            return condition & Key(attr).lte(high)
+        return condition
+    
+    query = dict(IndexName=index, ScanIndexForward=not descending)
+    difficulties = [filters['difficulty']] if 'difficulty' in filters else list(RECIPE_DIFFICULTIES)
+    position = (page[1] if page else None) or {}
+    limit = page[0] if page else None
+    
+    def read(difficulty):
+        start = position.get(difficulty)
+        if start == 'end':
+            return [], None
+        if limit is None:
+            items = read_all(recipes_table.query, KeyConditionExpression=key_condition(difficulty), **query,
+                             **projection(SUMMARY_FIELDS))
+            return [item for item in items if matches_listing(item, filters)], None
+        return paginate(recipes_table.query, ['recipe_id', 'difficulty', attr], limit, start,
+                        lambda item: matches_listing(item, filters),
+                        KeyConditionExpression=key_condition(difficulty), **query, **projection(SUMMARY_FIELDS))
+    
+    results = dict(zip(difficulties, get_batch_executor().map(propagate(read), difficulties)))
+    merged = heapq.merge(
+        *[[(item[attr], difficulty, item) for item in items] for difficulty, (items, _) in results.items()],
+        key=lambda entry: entry[0], reverse=descending
+    )
+    page_items, consumed = [], {}
+    for _, difficulty, item in merged:
+        if limit is not None and len(page_items) == limit:
+            break
+        page_items.append(item)
+        consumed[difficulty] = consumed.get(difficulty, 0) + 1
+    if fields is None or not set(fields) <= set(SUMMARY_FIELDS):
+        selected = hydrate_recipes([item['recipe_id'] for item in page_items], fields=fields)
+    else:
+        selected = [project(item, fields) for item in page_items]
+    if limit is None:
+        return selected, None
+    
+    # Resume each partition after the last item this page used from it
+    next_position = {}
+    for difficulty, (items, next_key) in results.items():
+        used = consumed.get(difficulty, 0)
+        if used == len(items):
+            next_position[difficulty] = next_key or 'end'
+        elif used:
+            last = items[used - 1]
+            next_position[difficulty] = {'recipe_id': last['recipe_id'], 'difficulty': difficulty, attr: last[attr]}
+        else:
+            next_position[difficulty] = position.get(difficulty)
+    if all(state == 'end' for state in next_position.values()):
+        return selected, None
+    return selected, next_position
+
 # ============= SAMPLE DATA =============
 
 SAMPLE_RECIPES = [
@@ -235,12 +1785,31 @@ SAMPLE_RECIPES = [
     }
 ]
 
-def init_sample_recipes():
-    """Sync sample recipes to DynamoDB"""
+def sample_recipes_hash():
+    """Content hash of SAMPLE_RECIPES, stored once they have been written"""
+    payload = json.dumps([prepare_recipe(r) for r in SAMPLE_RECIPES], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def init_sample_recipes(force=False):
+    """Sync sample recipes to DynamoDB unless this exact set was already written"""
     try:
+        content_hash = sample_recipes_hash()
+        if not force:
+            marker = metadata_table.get_item(Key={'meta_key': SAMPLE_SEED_MARKER}).get('Item')
+            if marker and marker.get('content_hash') == content_hash:
+                print("Sample recipes already synced")
+                return True
+        
         print("Syncing sample recipes...")
-        for recipe in SAMPLE_RECIPES:
-            recipes_table.put_item(Item=recipe)
+        with recipes_table.batch_writer() as batch:
+            for recipe in SAMPLE_RECIPES:
+                batch.put_item(Item=prepare_recipe(recipe))
+        metadata_table.put_item(Item={
+            'meta_key': SAMPLE_SEED_MARKER,
+            'content_hash': content_hash,
+            'synced_at': datetime.datetime.utcnow().isoformat()
+        })
+        recipe_cache.invalidate()
             
         print(f"{len(SAMPLE_RECIPES)} sample recipes synced successfully")
         return True
@@ -248,6 +1817,92 @@ def init_sample_recipes():
         print(f"Recipe init error: {e}")
         return False
 
+# ============= STATIC SNAPSHOTS =============
+
+_s3 = None
+
+def get_s3():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3', region_name=REGION)
+    return _s3
+
+def snapshot_target():
+    """Where snapshots are published: SNAPSHOT_DIR, else SNAPSHOT_BUCKET, else None"""
+    if SNAPSHOT_DIR:
+        return DirectoryTarget(SNAPSHOT_DIR)
+    if SNAPSHOT_BUCKET:
+        return S3Target(get_s3(), SNAPSHOT_BUCKET, SNAPSHOT_PREFIX)
+    return None
+
+def publish_snapshots(force=False, target=None):
+    """Publish the current catalog as static snapshots; a no-op while the catalog version is unchanged"""
+    target = target or snapshot_target()
+    if target is None:
+        return {'published': False, 'message': 'Set SNAPSHOT_BUCKET or SNAPSHOT_DIR'}
+    # Loading the catalog syncs the version digests, JSON fragments and search index used below
+    recipes = recipe_cache.get()
+    publisher = SnapshotPublisher(
+        target,
+        recipe_hash=lambda r: (catalog_version.recipe_etag(r['recipe_id']) or recipe_digest(r))[:16],
+        encode_recipe=recipe_json.fragment,
+        encode_summary=lambda r: recipe_json.fragment(r, SUMMARY_FIELDS),
+        workers=SNAPSHOT_UPLOAD_WORKERS,
+        retain_seconds=SNAPSHOT_RETAIN_SECONDS
+    )
+    return publisher.publish(recipes, search_index.export_postings(), f'{catalog_version.value:032x}', force)
+
+# ============= COLD START =============
+
+COLD_START = {'import_ms': None, 'seed_ms': None}
+
+def warm_up():
+    """Build AWS clients and fill the in-process caches without going through Flask"""
+    started = time.perf_counter()
+    for table in ALL_TABLES:
+        table.table_name
+    recipes = recipe_cache.get()
+    popular = [rid for rid, _ in trending.top(None, TRENDING_MAX_LIMIT)]
+    similar = similarity_index.precompute(popular + [int(r['recipe_id']) for r in recipes],
+                                          deadline=time.monotonic() + SIMILAR_PRECOMPUTE_SECONDS)
+    return {
+        'warmed': True,
+        'recipes': len(recipes),
+        'similar_lists': similar,
+        'elapsed_ms': round(1000 * (time.perf_counter() - started), 2),
+        'cold_start': COLD_START
+    }
+
+def is_snapshot_event(event):
+    """Scheduled {"publish_snapshots": true} invocations"""
+    return bool(event.get('publish_snapshots'))
+
+def is_warmup_event(event):
+    """Scheduled EventBridge pings and explicit {"warmup": true} invocations"""
+    return bool(event.get('warmup')) or event.get('source') == 'aws.events'
+
+def import_profile_report(top=20):
+    """Import app in a fresh interpreter under -X importtime and print the slowest modules"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, AWS_EXECUTION_ENV='', SEED_ON_COLD_START='false'),
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    
+    total = next((c for c, _, name in rows if name == 'app'), sum(s for _, s, _ in rows))
+    print(f"Total import time of app: {total / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    return rows
+
 # ============= ROUTES =============
 
 @app.route('/', methods=['GET'])
@@ -284,12 +1939,17 @@ def health_check():
             'saved': SAVED_RECIPES_TABLE,
             'liked': LIKED_RECIPES_TABLE
         },
-        'recipe_count': recipe_count
+        'recipe_count': recipe_count,
+        'recipe_cache': recipe_cache.stats(),
+        'similar_recipes': similarity_index.stats(),
+        'token_cache': token_cache.stats(),
+        'rate_limited': rate_limiter.limited
     }), 200
 
 # ============= AUTH ROUTES =============
 
 @app.route('/api/auth/register', methods=['POST', 'OPTIONS'])
+@idempotent
 def register():
     if request.method == 'OPTIONS':
         return '', 200
@@ -306,18 +1966,12 @@ def register():
         if not all([email, username, password]):
             return jsonify({'message': 'All fields required'}), 400
         
-        # Check if user exists
-        response = users_table.get_item(Key={'username': username})
-        if 'Item' in response:
+        # One conditional transaction: no read first, and two racing sign-ups cannot both win
+        taken = create_user(username, email, password)
+        if taken == 'username':
             return jsonify({'message': 'Username already taken'}), 400
-        
-        # Create user
-        users_table.put_item(Item={
-            'username': username,
-            'email': email,
-            'password': hash_password(password),
-            'created_at': datetime.datetime.utcnow().isoformat()
-        })
+        if taken == 'email':
+            return jsonify({'message': 'Email already registered'}), 400
         
         print(f"User registered: {username}")
         return jsonify({
@@ -345,18 +1999,7 @@ def login():
         if not all([email_or_username, password]):
             return jsonify({'message': 'Credentials required'}), 400
         
-        # Try username first
-        response = users_table.get_item(Key={'username': email_or_username})
-        user = response.get('Item')
-        
-        # Try email if username not found
-        if not user:
-            response = users_table.query(
-                IndexName='EmailIndex',
-                KeyConditionExpression=Key('email').eq(email_or_username)
-            )
-            if response['Items']:
-                user = response['Items'][0]
+        user = find_user(email_or_username)
         
         if user and user['password'] == hash_password(password):
             token = generate_token(user['username'])
@@ -399,10 +2042,49 @@ def get_recipes():
         return '', 200
     
     try:
-        response = recipes_table.scan()
-        recipes = decimal_to_float(response['Items'])
-        print(f"Returning {len(recipes)} recipes")
-        return jsonify(recipes), 200
+        filters = get_listing_filters()
+        scope = listing_scope(filters) if filters else request.path
+        page = get_page_args(scope)
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        if filters and RECIPE_CACHE_TTL <= 0:
+            # Without the catalog cache, filtered reads go to the GSIs rather than a scan
+            items, next_key = query_listing(filters, page, fields)
+            if page:
+                return page_response(items, next_key, scope), 200
+            return jsonify(items), 200
+        
+        if page and not filters:
+            def build_page():
+                limit, start_key = page
+                items, next_key = paginate(recipes_table.scan, ['recipe_id'], limit, start_key, **projection(fields))
+                print(f"Returning page of {len(items)} recipes")
+                return page_response(items, next_key, request.path)
+            
+            # A page is one bounded Scan: a cold cache is not loaded for it, and only a warm one supplies the ETag
+            if recipe_cache.peek() is None:
+                return build_page()
+            etag = catalog_version.etag(request.path, request.query_string.decode(), cursor_generation())
+            return conditional_response(etag, 'recipes', build_page)
+        
+        recipes = recipe_cache.get()
+        paged = (cursor_generation(),) if page else ()
+        etag = catalog_version.etag(request.path, request.query_string.decode(), *paged)
+        
+        def build():
+            if filters:
+                by_id = recipe_cache.get_by_id()
+                matches = [by_id[rid] for rid in listing_index.query(**filters) if rid in by_id]
+                if page:
+                    return offset_page(matches, page, scope, fields)
+                return json_bytes_response(recipe_json.array(matches, fields))
+            print(f"Returning {len(recipes)} recipes")
+            return json_bytes_response(recipe_json.array(recipes, fields))
+        
+        return conditional_response(etag, 'recipes', build)
     except Exception as e:
         print(f"Get recipes error: {e}")
         return jsonify([]), 500
@@ -413,10 +2095,27 @@ def get_recipe(recipe_id):
         return '', 200
     
     try:
-        response = recipes_table.get_item(Key={'recipe_id': recipe_id})
-        if 'Item' in response:
-            return jsonify(decimal_to_float(response['Item'])), 200
-        return jsonify({'message': 'Recipe not found'}), 404
+        fields = get_fields(default='full')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        # One recipe never loads the whole catalog: without a warm cache it is a single GetItem
+        by_id = recipe_cache.peek_by_id()
+        recipe = by_id.get(recipe_id) if by_id is not None else None
+        if recipe is None:
+            response = recipes_table.get_item(Key={'recipe_id': recipe_id}, **projection(fields))
+            if 'Item' not in response:
+                return jsonify({'message': 'Recipe not found'}), 404
+            recipe = response['Item']
+            if fields is None:
+                recipe_cache.upsert(recipe)
+            digest = recipe_digest(recipe)
+        else:
+            digest = catalog_version.recipe_etag(recipe_id) or recipe_digest(recipe)
+        
+        etag = view_etag(digest, fields)
+        return conditional_response(etag, 'recipe', lambda: json_bytes_response(recipe_json.fragment(recipe, fields)))
     except Exception as e:
         print(f"Get recipe error: {e}")
         return jsonify({'message': 'Error loading recipe'}), 500
@@ -427,12 +2126,29 @@ def search_recipes():
         return '', 200
     
     query = request.args.get('q', '').lower()
+    scope = f'{request.path}?q={query}'
+    try:
+        page = get_page_args(scope)
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
     try:
-        response = recipes_table.scan()
-        recipes = response['Items']
-        if query:
-            recipes = [r for r in recipes if query in r.get('name', '').lower()]
-        return jsonify(decimal_to_float(recipes)), 200
+        by_id = recipe_cache.get_by_id()
+        paged = (cursor_generation(),) if page else ()
+        etag = catalog_version.etag(request.path, request.query_string.decode(), *paged)
+        
+        def build():
+            if query:
+                recipes = [by_id[rid] for rid, _ in search_index.search(query) if rid in by_id]
+            else:
+                recipes = recipe_cache.get()
+            
+            if page:
+                return offset_page(recipes, page, scope, fields)
+            return json_bytes_response(recipe_json.array(recipes, fields))
+        
+        return conditional_response(etag, 'search', build)
     except Exception as e:
         print(f"Search error: {e}")
         return jsonify([]), 500
@@ -443,16 +2159,254 @@ def random_recipe():
         return '', 200
     
     try:
-        response = recipes_table.scan()
-        recipes = response['Items']
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        recipes = recipe_cache.get()
         if recipes:
-            return jsonify(decimal_to_float(random.choice(recipes))), 200
+            return json_bytes_response(recipe_json.fragment(random.choice(recipes), fields)), 200
         return jsonify({'message': 'No recipes available'}), 404
     except Exception as e:
         print(f"Random recipe error: {e}")
         return jsonify({'message': 'Error'}), 500
 
+@app.route('/api/recipes/trending', methods=['GET', 'OPTIONS'])
+def trending_recipes():
+    """Most-liked recipes: ?window=all (default) or ?window=<days>d, ?limit=<n>"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    window = request.args.get('window', 'all').lower()
+    try:
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    try:
+        limit = int(request.args.get('limit', TRENDING_DEFAULT_LIMIT))
+        window_days = None if window == 'all' else int(window.rstrip('d'))
+    except ValueError:
+        return jsonify({'message': 'window must be "all" or a number of days such as "7d"'}), 400
+    if not 1 <= limit <= TRENDING_MAX_LIMIT:
+        return jsonify({'message': f'limit must be between 1 and {TRENDING_MAX_LIMIT}'}), 400
+    if window_days is not None and not 1 <= window_days <= TRENDING_MAX_WINDOW_DAYS:
+        return jsonify({'message': f'window must be at most {TRENDING_MAX_WINDOW_DAYS} days'}), 400
+    
+    try:
+        ranked = trending.top(window_days, limit)
+        by_id = recipe_cache.get_by_id()
+        items = [dict(project(by_id[rid], fields), likes=likes) for rid, likes in ranked if rid in by_id]
+        response = jsonify({'window': window if window_days is None else f'{window_days}d',
+                            'count': len(items), 'items': items})
+        response.headers['Cache-Control'] = CACHE_POLICIES['trending']
+        return response, 200
+    except Exception as e:
+        print(f"Trending error: {e}")
+        return jsonify({'message': 'Failed to load trending recipes'}), 500
+
+similarity_loading = threading.Lock()
+
+def similarity_not_loaded():
+    """503 while this container has not indexed the catalog yet; starts one catalog load in the background"""
+    if similarity_loading.acquire(blocking=False):
+        def load():
+            try:
+                recipe_cache.get()
+            except Exception as e:
+                print(f"Similarity index load error: {e}")
+            finally:
+                similarity_loading.release()
+        get_batch_executor().submit(load)
+    response = jsonify({'message': 'Similar recipes are not available yet, please retry'})
+    response.headers['Retry-After'] = str(SIMILAR_RETRY_AFTER)
+    return response, 503
+
+@app.route('/api/recipes/<int:recipe_id>/similar', methods=['GET', 'OPTIONS'])
+def similar_recipes(recipe_id):
+    """Recipes sharing the most (and rarest) ingredients and attributes: ?limit=<n>, ?fields="""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    try:
+        limit = int(request.args.get('limit', SIMILAR_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'limit must be a number'}), 400
+    if not 1 <= limit <= SIMILAR_TOP_K:
+        return jsonify({'message': f'limit must be between 1 and {SIMILAR_TOP_K}'}), 400
+    
+    try:
+        if not len(similarity_index):
+            return similarity_not_loaded()
+        by_id = recipe_cache.peek_by_id()
+        if by_id is None:
+            # The catalog is not loaded for this: a GetItem for the recipe, a BatchGetItem for its neighbours
+            if 'Item' not in recipes_table.get_item(Key={'recipe_id': recipe_id}, ProjectionExpression='recipe_id'):
+                return jsonify({'message': 'Recipe not found'}), 404
+            by_id = hydrated([rid for rid, _ in similarity_index.similar(recipe_id)], fields)
+        elif recipe_id not in by_id:
+            return jsonify({'message': 'Recipe not found'}), 404
+        etag = catalog_version.etag(request.path, request.query_string.decode())
+        
+        def build():
+            neighbours = [(rid, score) for rid, score in similarity_index.similar(recipe_id) if rid in by_id][:limit]
+            items = [dict(project(by_id[rid], fields), similarity=round(score, 4)) for rid, score in neighbours]
+            return jsonify({'recipe_id': recipe_id, 'count': len(items), 'items': items})
+        
+        return conditional_response(etag, 'similar', build)
+    except Exception as e:
+        print(f"Similar recipes error: {e}")
+        return jsonify({'message': 'Failed to load similar recipes'}), 500
+
+def parse_shopping_plan(data):
+    """``[(recipe_id, servings or None)]`` from a shopping-list body; raises ValueError.
+
+    Entries are recipe ids or ``{"recipe_id", "servings"}`` objects. A
+    top-level ``servings`` applies to entries without their own. Repeated
+    ids are kept: the same recipe twice in a week is bought for twice.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('recipes'), list) or not data['recipes']:
+        raise ValueError('recipes must be a non-empty list')
+    if len(data['recipes']) > SHOPPING_LIST_MAX_RECIPES:
+        raise ValueError(f'At most {SHOPPING_LIST_MAX_RECIPES} recipes per shopping list')
+    
+    def servings_of(value):
+        if value is None:
+            return None
+        if isinstance(value, bool) or not str(value).isdigit() or not 1 <= int(value) <= SHOPPING_LIST_MAX_SERVINGS:
+            raise ValueError(f'servings must be between 1 and {SHOPPING_LIST_MAX_SERVINGS}')
+        return int(value)
+    
+    default_servings = servings_of(data.get('servings'))
+    plan = []
+    for entry in data['recipes']:
+        if isinstance(entry, dict):
+            recipe_id, servings = entry.get('recipe_id'), servings_of(entry.get('servings'))
+        else:
+            recipe_id, servings = entry, None
+        plan.append((parse_recipe_ids([recipe_id])[0], servings or default_servings))
+    return plan
+
+@app.route('/api/shopping-list', methods=['POST', 'OPTIONS'])
+def shopping_list():
+    """Aggregated ingredients and cost for a list of recipes scaled to the requested servings"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        plan = parse_shopping_plan(request.get_json(force=True, silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        if RECIPE_CACHE_TTL > 0:
+            recipe_cache.get()
+            index = shopping_lists
+        else:
+            index = ShoppingListIndex()
+            index.sync(hydrate_recipes([rid for rid, _ in plan]))
+        items, total_cost, missing = index.aggregate(plan)
+        if missing:
+            return jsonify({'message': 'Recipes not found', 'missing': sorted(set(missing))}), 404
+        return jsonify({
+            'recipes': len(plan),
+            'items': items,
+            'total_cost': total_cost,
+            'currency': CURRENCY
+        }), 200
+    except Exception as e:
+        print(f"Shopping list error: {e}")
+        return jsonify({'message': 'Failed to build shopping list'}), 500
+
+def parse_meal_plan_request(data):
+    """Validated meal-plan options from a request body; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    
+    def bounded(field, default, low, high, kind=int):
+        value = data.get(field, default)
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            value = kind(str(value))
+            in_range = low <= value <= high
+        except (ValueError, ArithmeticError):
+            raise ValueError(f'{field} must be a number')
+        if not in_range:
+            raise ValueError(f'{field} must be between {low} and {high}')
+        return value
+    
+    if data.get('budget') is None:
+        raise ValueError('budget required')
+    meals = bounded('meals', 7, 1, MEAL_PLAN_MAX_MEALS)
+    options = {
+        'budget_cents': int(bounded('budget', None, Decimal('0.01'), MEAL_PLAN_MAX_BUDGET, Decimal) * 100),
+        'people': bounded('people', 2, 1, MEAL_PLAN_MAX_PEOPLE),
+        'meals': meals,
+        'max_repeats': bounded('max_repeats', 1, 1, meals)
+    }
+    exclude = data.get('exclude', [])
+    if not isinstance(exclude, list) or not all(isinstance(term, str) and term.strip() for term in exclude):
+        raise ValueError('exclude must be a list of ingredient names or dietary groups')
+    options['exclude'] = exclude
+    return options
+
+@app.route('/api/meal-plan', methods=['POST', 'OPTIONS'])
+def meal_plan():
+    """Most popular set of meals within a weekly budget, favouring shared ingredients"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        options = parse_meal_plan_request(request.get_json(force=True, silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        by_id = recipe_cache.get_by_id()
+        likes = dict(trending.top(None, MEAL_PLAN_POPULAR_LIMIT))
+        started = time.monotonic()
+        plan = plan_meals(meal_plans, likes=likes, deadline=started + MEAL_PLAN_TIME_BUDGET, **options)
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        if plan is None:
+            return jsonify({'message': 'No meal plan fits this budget'}), 422
+        
+        people, budget = options['people'], Decimal(options['budget_cents']) / 100
+        meals = []
+        # Totals come from the exact costs: summing the rounded ones can overshoot the budget
+        total_cost = Decimal('0.00')
+        for recipe_id in plan['recipe_ids']:
+            recipe = by_id[recipe_id]
+            cost = Decimal(str(recipe['total_cost'])) * people / (int(recipe.get('servings') or 1))
+            total_cost += cost
+            meals.append({
+                'recipe_id': recipe_id,
+                'name': recipe.get('name'),
+                'emoji': recipe.get('emoji'),
+                'servings': people,
+                'cost': cost.quantize(Decimal('0.01'))
+            })
+        print(f"Meal plan: {len(meals)} meals for {people} in {elapsed_ms} ms (complete={plan['complete']})")
+        return jsonify({
+            'meals': meals,
+            'people': people,
+            'budget': budget.quantize(Decimal('0.01')),
+            'total_cost': total_cost.quantize(Decimal('0.01')),
+            'remaining': (budget - total_cost).quantize(Decimal('0.01')),
+            'shared_ingredients': plan['shared_ingredients'],
+            'complete': plan['complete'],
+            'currency': CURRENCY
+        }), 200
+    except Exception as e:
+        print(f"Meal plan error: {e}")
+        return jsonify({'message': 'Failed to build meal plan'}), 500
+
 @app.route('/api/recipes/generate', methods=['POST', 'OPTIONS'])
+@idempotent
 def generate_recipe():
     if request.method == 'OPTIONS':
         return '', 200
@@ -464,14 +2418,8 @@ def generate_recipe():
         if not user_input:
             return jsonify({'message': 'Recipe name required'}), 400
         
-        # Get max recipe_id
-        response = recipes_table.scan()
-        max_id = max([r.get('recipe_id', 0) for r in response['Items']], default=0)
-        new_id = max_id + 1
-        
         # Generate simple recipe
-        new_recipe = {
-            'recipe_id': new_id,
+        new_recipe = prepare_recipe({
             'name': user_input.title(),
             'emoji': '🍽️',
             'time': '30 min',
@@ -489,11 +2437,12 @@ def generate_recipe():
                 'Add seasonings to taste',
                 'Serve hot and enjoy'
             ]
-        }
+        })
         
-        recipes_table.put_item(Item=new_recipe)
+        put_new_recipe(new_recipe)
+        recipe_cache.upsert(new_recipe)
         print(f"Recipe generated: {new_recipe['name']}")
-        return jsonify(decimal_to_float(new_recipe)), 201
+        return jsonify(new_recipe), 201
         
     except Exception as e:
         print(f"Generate error: {e}")
@@ -503,24 +2452,36 @@ def generate_recipe():
 
 @app.route('/api/user/saved', methods=['GET', 'POST', 'OPTIONS'])
 @auth_required
+@idempotent
 def handle_saved_recipes(username):
     if request.method == 'OPTIONS':
         return '', 200
     
     if request.method == 'GET':
+        scope = f'{request.path}#{username}'
         try:
-            response = saved_recipes_table.query(
-                KeyConditionExpression=Key('username').eq(username)
-            )
-            recipe_ids = [int(item['recipe_id']) for item in response['Items']]
-            
-            recipes = []
-            for rid in recipe_ids:
-                r = recipes_table.get_item(Key={'recipe_id': rid})
-                if 'Item' in r:
-                    recipes.append(r['Item'])
+            page = get_page_args(scope)
+            fields = get_fields()
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        try:
+            if page:
+                limit, start_key = page
+                rows, next_key = paginate(
+                    saved_recipes_table.query, ['username', 'recipe_id'], limit, start_key,
+                    KeyConditionExpression=Key('username').eq(username)
+                )
+            else:
+                rows = read_all(
+                    saved_recipes_table.query,
+                    KeyConditionExpression=Key('username').eq(username)
+                )
+            recipes = hydrate_recipes((item['recipe_id'] for item in rows), fields=fields)
             
-            return jsonify(decimal_to_float(recipes)), 200
+            if page:
+                return page_response(recipes, next_key, scope), 200
+            return jsonify(recipes), 200
         except Exception as e:
             print(f"Get saved error: {e}")
             return jsonify([]), 500
@@ -532,12 +2493,14 @@ def handle_saved_recipes(username):
             
             if not recipe_id:
                 return jsonify({'message': 'Recipe ID required'}), 400
+            try:
+                recipe_id, = parse_recipe_ids([recipe_id])
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
             
-            saved_recipes_table.put_item(Item={
-                'username': username,
-                'recipe_id': recipe_id,
-                'saved_at': datetime.datetime.utcnow().isoformat()
-            })
+            # Saving/liking again is a no-op, so the recipe's counter only moves once
+            if add_to_collection('saved', username, recipe_id) is None:
+                return jsonify({'message': 'Recipe not found'}), 404
             return jsonify({'message': 'Recipe saved'}), 200
         except Exception as e:
             print(f"Save error: {e}")
@@ -550,10 +2513,7 @@ def remove_saved_recipe(username, recipe_id):
         return '', 200
     
     try:
-        saved_recipes_table.delete_item(Key={
-            'username': username,
-            'recipe_id': recipe_id
-        })
+        remove_from_collection('saved', username, recipe_id)
         return jsonify({'message': 'Recipe removed'}), 200
     except Exception as e:
         print(f"Remove error: {e}")
@@ -561,24 +2521,36 @@ def remove_saved_recipe(username, recipe_id):
 
 @app.route('/api/user/liked', methods=['GET', 'POST', 'OPTIONS'])
 @auth_required
+@idempotent
 def handle_liked_recipes(username):
     if request.method == 'OPTIONS':
         return '', 200
     
     if request.method == 'GET':
+        scope = f'{request.path}#{username}'
         try:
-            response = liked_recipes_table.query(
-                KeyConditionExpression=Key('username').eq(username)
-            )
-            recipe_ids = [int(item['recipe_id']) for item in response['Items']]
-            
-            recipes = []
-            for rid in recipe_ids:
-                r = recipes_table.get_item(Key={'recipe_id': rid})
-                if 'Item' in r:
-                    recipes.append(r['Item'])
+            page = get_page_args(scope)
+            fields = get_fields()
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        try:
+            if page:
+                limit, start_key = page
+                rows, next_key = paginate(
+                    liked_recipes_table.query, ['username', 'recipe_id'], limit, start_key,
+                    KeyConditionExpression=Key('username').eq(username)
+                )
+            else:
+                rows = read_all(
+                    liked_recipes_table.query,
+                    KeyConditionExpression=Key('username').eq(username)
+                )
+            recipes = hydrate_recipes((item['recipe_id'] for item in rows), fields=fields)
             
-            return jsonify(decimal_to_float(recipes)), 200
+            if page:
+                return page_response(recipes, next_key, scope), 200
+            return jsonify(recipes), 200
         except Exception as e:
             print(f"Get liked error: {e}")
             return jsonify([]), 500
@@ -590,12 +2562,14 @@ def handle_liked_recipes(username):
             
             if not recipe_id:
                 return jsonify({'message': 'Recipe ID required'}), 400
+            try:
+                recipe_id, = parse_recipe_ids([recipe_id])
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
             
-            liked_recipes_table.put_item(Item={
-                'username': username,
-                'recipe_id': recipe_id,
-                'liked_at': datetime.datetime.utcnow().isoformat()
-            })
+            # Saving/liking again is a no-op, so the recipe's counter only moves once
+            if add_to_collection('liked', username, recipe_id) is None:
+                return jsonify({'message': 'Recipe not found'}), 404
             return jsonify({'message': 'Recipe liked'}), 200
         except Exception as e:
             print(f"Like error: {e}")
@@ -608,91 +2582,192 @@ def remove_liked_recipe(username, recipe_id):
         return '', 200
     
     try:
-        liked_recipes_table.delete_item(Key={
-            'username': username,
-            'recipe_id': recipe_id
-        })
+        remove_from_collection('liked', username, recipe_id)
         return jsonify({'message': 'Recipe unliked'}), 200
     except Exception as e:
         print(f"Unlike error: {e}")
         return jsonify({'message': 'Unlike failed'}), 500
 
-# ============= LAMBDA HANDLER =============
+def user_recipe_ids(table, username):
+    """Recipe ids in one of a user's lists, in recipe id order"""
+    rows = read_all(
+        table.query,
+        KeyConditionExpression=Key('username').eq(username),
+        ProjectionExpression='recipe_id'
+    )
+    return [int(row['recipe_id']) for row in rows]
 
-def lambda_handler(event, context):
-    """AWS Lambda handler for API Gateway proxy integration"""
-    print(f"Request: {event.get('httpMethod')} {event.get('path')}")
+def parse_recipe_ids(value):
+    """De-duplicated list of positive integer recipe ids; raises ValueError"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError('Recipe IDs must be a list')
+    recipe_ids = []
+    for rid in value:
+        if isinstance(rid, bool) or not isinstance(rid, (int, str)) or not str(rid).isdigit() or int(rid) < 1:
+            raise ValueError(f'Invalid recipe ID: {rid!r}')
+        recipe_ids.append(int(rid))
+    return list(dict.fromkeys(recipe_ids))
+
+@app.route('/api/user/state', methods=['GET', 'OPTIONS'])
+@auth_required
+def user_state(username):
+    """Saved and liked recipe ids in one response; ?include=recipes also returns the recipes (see ?fields=)"""
+    if request.method == 'OPTIONS':
+        return '', 200
     
     try:
-        # Handle OPTIONS for CORS
-        if event.get('httpMethod') == 'OPTIONS':
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization'
-                },
-                'body': ''
-            }
-        
-        # Build WSGI environ
-        http_method = event.get('httpMethod', 'GET')
-        path = event.get('path', '/')
-        query_params = event.get('queryStringParameters') or {}
-        query_string = '&'.join([f"{k}={v}" for k, v in query_params.items()])
-        
-        body = event.get('body') or ''
-        if event.get('isBase64Encoded'):
-            import base64
-            body = base64.b64decode(body).decode('utf-8')
-        
-        environ = {
-            'REQUEST_METHOD': http_method,
-            'SCRIPT_NAME': '',
-            'PATH_INFO': path,
-            'QUERY_STRING': query_string,
-            'CONTENT_TYPE': event.get('headers', {}).get('content-type', 'application/json'),
-            'CONTENT_LENGTH': str(len(body)),
-            'SERVER_NAME': 'lambda',
-            'SERVER_PORT': '443',
-            'SERVER_PROTOCOL': 'HTTP/1.1',
-            'wsgi.version': (1, 0),
-            'wsgi.url_scheme': 'https',
-            'wsgi.input': BytesIO(body.encode('utf-8')),
-            'wsgi.errors': BytesIO(),
-            'wsgi.multiprocess': False,
-            'wsgi.multithread': False,
-            'wsgi.run_once': False,
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        lookup = propagate(lambda table: user_recipe_ids(table, username))
+        saved, liked = get_batch_executor().map(lookup, [saved_recipes_table, liked_recipes_table])
+        state = {'username': username, 'saved': saved, 'liked': liked}
+        if 'recipes' in request.args.get('include', '').split(','):
+            state['recipes'] = hydrate_recipes(saved + liked, fields=fields)
+        return jsonify(state), 200
+    except Exception as e:
+        print(f"User state error: {e}")
+        return jsonify({'message': 'Failed to load account state'}), 500
+
+@app.route('/api/user/recommendations', methods=['GET', 'OPTIONS'])
+@auth_required
+def user_recommendations(username):
+    """Recipes like the user's recent likes (newer likes count more), or trending ones without any: ?limit=<n>"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        fields = get_fields()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    try:
+        limit = int(request.args.get('limit', SIMILAR_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'limit must be a number'}), 400
+    if not 1 <= limit <= RECOMMEND_MAX_LIMIT:
+        return jsonify({'message': f'limit must be between 1 and {RECOMMEND_MAX_LIMIT}'}), 400
+    
+    try:
+        rows = read_all(
+            liked_recipes_table.query,
+            KeyConditionExpression=Key('username').eq(username),
+            ProjectionExpression='recipe_id, liked_at'
+        )
+        if not len(similarity_index):
+            return similarity_not_loaded()
+        by_id = recipe_cache.peek_by_id()
+        known = similarity_index if by_id is None else by_id
+        liked = {int(row['recipe_id']) for row in rows}
+        recent = sorted(rows, key=lambda row: str(row.get('liked_at', '')), reverse=True)
+        seeds = [int(row['recipe_id']) for row in recent if int(row['recipe_id']) in known][:RECOMMEND_MAX_SEEDS]
+        ranked = similarity_index.recommend([(rid, RECOMMEND_DECAY ** n) for n, rid in enumerate(seeds)],
+                                            limit, exclude=liked)
+        source = 'likes'
+        if not ranked:
+            ranked = [(rid, likes) for rid, likes in trending.top(None, TRENDING_MAX_LIMIT) if rid not in liked]
+            source = 'trending'
+        if by_id is None:
+            by_id = hydrated([rid for rid, _ in ranked], fields)
+        items = [dict(project(by_id[rid], fields), score=round(score, 4))
+                 for rid, score in ranked if rid in by_id][:limit]
+        return jsonify({'source': source, 'based_on': len(seeds), 'count': len(items), 'items': items}), 200
+    except Exception as e:
+        print(f"Recommendations error: {e}")
+        return jsonify({'message': 'Failed to load recommendations'}), 500
+
+@app.route('/api/user/<any(saved, liked):collection>/batch', methods=['POST', 'OPTIONS'])
+@auth_required
+@idempotent
+def bulk_update_recipes(username, collection):
+    """Add and remove many saved/liked recipes at once: {"add": [ids], "remove": [ids]}"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        add = parse_recipe_ids(data.get('add'))
+        remove = parse_recipe_ids(data.get('remove'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    if not add and not remove:
+        return jsonify({'message': 'Recipe IDs required'}), 400
+    if set(add) & set(remove):
+        return jsonify({'message': 'A recipe cannot be added and removed in one request'}), 400
+    if len(add) + len(remove) > BULK_MAX_RECIPES:
+        return jsonify({'message': f'At most {BULK_MAX_RECIPES} recipes per request'}), 400
+    
+    table, stamp_attr, _ = USER_COLLECTIONS[collection]
+    try:
+        # Each change is its own conditional transaction, as for a single like/save, so only rows that
+        # really change move the counters: a concurrent request, or a retry after a partial failure,
+        # finds its condition failed and counts nothing
+        current = {
+            int(row['recipe_id']): row
+            for row in read_all(
+                table.query,
+                KeyConditionExpression=Key('username').eq(username),
+                ProjectionExpression='username, recipe_id, #stamp',
+                ExpressionAttributeNames={'#stamp': stamp_attr}
+            )
         }
+        changes = [('add', rid) for rid in add if rid not in current] + \
+            [('remove', rid) for rid in remove if rid in current]
         
-        # Add headers
-        for key, value in event.get('headers', {}).items():
-            key = key.upper().replace('-', '_')
-            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
-                key = f'HTTP_{key}'
-            environ[key] = value
-        
-        # Process request through Flask
-        with app.request_context(environ):
-            response = app.full_dispatch_request()
-        
-        # Build Lambda response
-        headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Content-Type': 'application/json'
-        }
-        headers.update(dict(response.headers))
+        def apply(change):
+            action, rid = change
+            if action == 'add':
+                return add_to_collection(collection, username, rid)
+            return remove_from_collection(collection, username, rid, current[rid])
         
-        result = {
-            'statusCode': response.status_code,
-            'headers': headers,
-            'body': response.get_data(as_text=True)
-        }
+        results = list(get_batch_executor().map(propagate(apply), changes))
+        added = sum(1 for (action, _), done in zip(changes, results) if action == 'add' and done)
+        removed = sum(1 for (action, _), done in zip(changes, results) if action == 'remove' and done)
+        missing = sorted(rid for (_, rid), done in zip(changes, results) if done is None)
+        print(f"Bulk {collection} update for {username}: +{added} -{removed}")
+        return jsonify({
+            'message': f'{collection.capitalize()} recipes updated',
+            'added': added,
+            'removed': removed,
+            'missing': missing
+        }), 200
+    except Exception as e:
+        print(f"Bulk {collection} error: {e}")
+        return jsonify({'message': 'Bulk update failed'}), 500
+
+# ============= LAMBDA HANDLER =============
+
+lambda_adapter = LambdaAdapter(
+    app,
+    compress_min_bytes=COMPRESS_MIN_BYTES,
+    compress_v1=os.environ.get('API_GATEWAY_V1_BINARY', 'false').lower() == 'true'
+)
+
+def lambda_handler(event, context):
+    """AWS Lambda handler for API Gateway proxy integration (REST v1 and HTTP API v2)"""
+    if is_snapshot_event(event):
+        result = publish_snapshots(force=bool(event.get('force')))
+        print(f"Snapshots: {json.dumps(result)}")
+        return result
+    if is_warmup_event(event):
+        result = warm_up()
+        print(f"Warm-up: {json.dumps(result)}")
+        return result
+    
+    method = event_method(event)
+    print(f"Request: {method} {event_path(event)}")
+    
+    try:
+        # Handle OPTIONS for CORS
+        if method == 'OPTIONS':
+            return lambda_adapter.preflight(event)
         
-        print(f"Response: {response.status_code}")
+        result = lambda_adapter(event, context)
+        print(f"Response: {result['statusCode']}")
         return result
         
     except Exception as e:
@@ -702,21 +2777,43 @@ def lambda_handler(event, context):
         
         return {
             'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
+            'headers': dict(CORS_HEADERS, **{'Content-Type': 'application/json'}),
             'body': json.dumps({'message': f'Internal error: {str(e)}'})
         }
 
 # Initialize recipes on Lambda cold start
 if IS_LAMBDA:
     print("Lambda cold start - initializing...")
-    init_sample_recipes()
-    print("Lambda ready")
+    COLD_START['import_ms'] = round(1000 * (time.perf_counter() - IMPORT_STARTED), 2)
+    if SEED_ON_COLD_START:
+        seed_started = time.perf_counter()
+        init_sample_recipes()
+        COLD_START['seed_ms'] = round(1000 * (time.perf_counter() - seed_started), 2)
+    print(f"Lambda ready: {json.dumps(COLD_START)}")
 
-# Local development server
+# Local development server and one-off commands:
+#   python app.py                       run the dev server
+#   python app.py seed                  (re)write SAMPLE_RECIPES to DynamoDB
+#   python app.py rebuild-counters      recompute like/save counters from the saved/liked tables
+#   python app.py backfill-recipes      add derived fields (time_minutes, ...) to existing recipes
+#   python app.py backfill-user-emails  claim existing users' email addresses for email login
+#   python app.py publish-snapshots     write static catalog snapshots (--force rewrites every file)
+#   python app.py profile-import        report where import time goes
 if __name__ == '__main__':
-    print("Starting local development server...")
-    init_sample_recipes()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    command = sys.argv[1] if len(sys.argv) > 1 else 'serve'
+    if command == 'seed':
+        sys.exit(0 if init_sample_recipes(force=True) else 1)
+    elif command == 'backfill-recipes':
+        backfill_recipes()
+    elif command == 'rebuild-counters':
+        rebuild_counters()
+    elif command == 'backfill-user-emails':
+        backfill_user_emails()
+    elif command == 'publish-snapshots':
+        print(json.dumps(publish_snapshots(force='--force' in sys.argv[2:])))
+    elif command == 'profile-import':
+        import_profile_report()
+    else:
+        print("Starting local development server...")
+        init_sample_recipes()
+        app.run(debug=True, host='0.0.0.0', port=5000)
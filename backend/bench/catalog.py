@@ -0,0 +1,111 @@
+"""Synthetic recipes, users and saved/liked lists at production-like scale.
+
+The catalog is deterministic for a given seed. Recipe popularity follows a
+Zipf-like curve, so a few recipes show up in many users' lists, as they
+would in real traffic.
+
+``populate`` writes through ``Table.batch_writer``, so it can fill the
+in-memory stand-in or a real dev stack.
+"""
+import itertools
+import random
+from decimal import Decimal
+
+import app as api
+
+BENCH_PASSWORD = 'benchmark-password'
+
+ADJECTIVES = ['Smoky', 'Zesty', 'Creamy', 'Crispy', 'Spicy', 'Rustic', 'Herby', 'Golden', 'Tangy', 'Hearty',
+              'Garlicky', 'Sticky', 'Fresh', 'Roasted', 'Charred', 'Simple', 'Weeknight', 'Cape', 'Lemony', 'Sweet']
+DISHES = ['Chicken Stir Fry', 'Bean Chili', 'Vegetable Curry', 'Pasta Bake', 'Lentil Soup', 'Beef Stew',
+          'Fish Tacos', 'Mac & Cheese', 'Fried Rice', 'Chickpea Salad', 'Pap & Wors', 'Bobotie',
+          'Butternut Risotto', 'Egg Fried Noodles', 'Tomato Bredie', 'Spinach Pie', 'Bunny Chow', 'Samp & Beans']
+EMOJIS = ['🍗', '🌶️', '🍛', '🍝', '🥣', '🍲', '🌮', '🧀', '🍚', '🥗', '🥧', '🥘']
+DIFFICULTIES = ['Easy', 'Easy', 'Medium', 'Medium', 'Hard']
+AMOUNTS = ['100g', '250g', '500g', '1kg', '1 cup', '2 cups', '1 tbsp', '2 tsp', '1 can', '3 cloves', 'To taste']
+STEPS = ['Prepare all ingredients', 'Heat oil in a large pan', 'Brown the main ingredient',
+         'Add vegetables and cook until soft', 'Season to taste', 'Simmer for 15 minutes',
+         'Bake until golden', 'Garnish and serve hot']
+
+def ingredient_pool():
+    """Ingredient names from SAMPLE_RECIPES plus generic extras"""
+    names = {i['name'] for r in api.SAMPLE_RECIPES for i in r['ingredients']}
+    names.update(['Butternut', 'Spinach', 'Chickpeas', 'Lentils', 'Mealie meal', 'Boerewors', 'Hake',
+                  'Tortillas', 'Coriander', 'Ginger', 'Chutney', 'Samp', 'Sugar beans', 'Feta'])
+    return sorted(names)
+
+def make_recipe(recipe_id, rng, pool):
+    ingredients = []
+    for name in rng.sample(pool, rng.randint(3, 8)):
+        ingredients.append({
+            'name': name,
+            'amount': rng.choice(AMOUNTS),
+            'cost': Decimal(rng.randint(50, 6000)) / 100
+        })
+    return api.prepare_recipe({
+        'recipe_id': recipe_id,
+        'name': f"{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {recipe_id}",
+        'emoji': rng.choice(EMOJIS),
+        'time': f"{rng.randrange(10, 125, 5)} min",
+        'difficulty': rng.choice(DIFFICULTIES),
+        'servings': rng.randint(1, 8),
+        'total_cost': sum((i['cost'] for i in ingredients), Decimal('0.00')),
+        'ingredients': ingredients,
+        'instructions': rng.sample(STEPS, rng.randint(3, len(STEPS)))
+    })
+
+def recipes(count, seed=7):
+    """``count`` recipes with ids 1..count"""
+    rng = random.Random(seed)
+    pool = ingredient_pool()
+    return [make_recipe(recipe_id, rng, pool) for recipe_id in range(1, count + 1)]
+
+def users(count, seed=7):
+    """``count`` users sharing BENCH_PASSWORD"""
+    password = api.hash_password(BENCH_PASSWORD)
+    return [{
+        'username': f"user{n}",
+        'email': f"user{n}@bench.greenplate.test",
+        'password': password,
+        'created_at': '2024-01-01T00:00:00'
+    } for n in range(1, count + 1)]
+
+def user_lists(usernames, recipe_count, mean_size=20, skew=1.1, seed=7):
+    """``{username: [recipe_id, ...]}`` drawn from a Zipf-like popularity curve"""
+    rng = random.Random(seed)
+    weights = itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, recipe_count + 1))
+    cumulative = list(weights)
+    # Popularity rank is shuffled so the most popular recipes are not simply the lowest ids
+    ranked_ids = list(range(1, recipe_count + 1))
+    rng.shuffle(ranked_ids)
+    lists = {}
+    for username in usernames:
+        size = min(recipe_count, int(rng.expovariate(1.0 / mean_size)))
+        picks = rng.choices(ranked_ids, cum_weights=cumulative, k=size)
+        lists[username] = list(dict.fromkeys(picks))
+    return lists
+
+def _write(table_name, items):
+    with api.get_dynamodb().Table(table_name).batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+def populate(recipe_count=100000, user_count=10000, mean_list_size=20, seed=7):
+    """Write a synthetic catalog through the app's DynamoDB resource; returns what was written"""
+    catalog = recipes(recipe_count, seed)
+    people = users(user_count, seed)
+    usernames = [u['username'] for u in people]
+    saved = user_lists(usernames, recipe_count, mean_list_size, seed=seed)
+    liked = user_lists(usernames, recipe_count, mean_list_size // 2, seed=seed + 1)
+
+    _write(api.RECIPES_TABLE, catalog)
+    _write(api.USERS_TABLE, people)
+    _write(api.USER_EMAILS_TABLE, ({'email': api.normalise_email(u['email']), 'username': u['username']}
+                                   for u in people))
+    for table_name, lists, stamp in ((api.SAVED_RECIPES_TABLE, saved, 'saved_at'),
+                                     (api.LIKED_RECIPES_TABLE, liked, 'liked_at')):
+        _write(table_name, ({'username': username, 'recipe_id': recipe_id, stamp: '2024-01-01T00:00:00'}
+                            for username, ids in lists.items() for recipe_id in ids))
+    api.rebuild_counters()
+    api.recipe_cache.invalidate()
+    return {'recipes': catalog, 'users': people, 'saved': saved, 'liked': liked}
@@ -0,0 +1,72 @@
+"""Bytes per cached recipe: boto3 item dicts vs CompactRecipe objects over a shared ValuePool.
+
+Run from backend/:  python -m bench.memory [--recipes 100000] [--seed 7]
+
+Items go through DynamoDB's wire format (TypeSerializer, JSON, then
+TypeDeserializer) so that every string is a fresh object, as it is when
+boto3 parses a scan. Memory is what tracemalloc still counts once the
+catalog is built and the intermediate items are freed. Every compact
+recipe is checked against its item to confirm the conversion is lossless.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from bench import catalog
+from recipe_model import CompactRecipe, ValuePool
+
+def wire_catalog(count, seed):
+    """The recipes as the JSON a DynamoDB scan returns, one string per item"""
+    serializer = TypeSerializer()
+    return [json.dumps(serializer.serialize(r)['M']) for r in catalog.recipes(count, seed)]
+
+def load(wire):
+    """Fresh boto3-style items from ``wire``"""
+    deserializer = TypeDeserializer()
+    return [{k: deserializer.deserialize(v) for k, v in json.loads(w).items()} for w in wire]
+
+def measure(build):
+    """(bytes still allocated by what ``build`` returns, seconds taken, result)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, elapsed, result
+
+def compact(wire):
+    """CompactRecipes for ``wire``; like RecipeCatalogCache, the pool is dropped once they are built"""
+    pool = ValuePool()
+    recipes = [CompactRecipe(item, pool) for item in load(wire)]
+    return recipes, len(pool)
+
+def run(count, seed):
+    print(f"building {count} recipes ...")
+    wire = wire_catalog(count, seed)
+
+    dict_bytes, dict_seconds, items = measure(lambda: load(wire))
+    del items
+    compact_bytes, compact_seconds, (recipes, pooled) = measure(lambda: compact(wire))
+
+    mismatches = sum(1 for recipe, item in zip(recipes, load(wire)) if recipe.to_item() != item)
+
+    print(f"{'representation':<28} {'bytes/recipe':>13} {'total MB':>10} {'build s':>9}")
+    print(f"{'boto3 item dicts':<28} {dict_bytes / count:>13.0f} {dict_bytes / 1e6:>10.1f} {dict_seconds:>9.2f}")
+    print(f"{'CompactRecipe + ValuePool':<28} {compact_bytes / count:>13.0f} {compact_bytes / 1e6:>10.1f} "
+          f"{compact_seconds:>9.2f}")
+    print(f"reduction: {dict_bytes / compact_bytes:.1f}x, pooled values: {pooled}, "
+          f"round-trip mismatches: {mismatches}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    run(args.recipes, args.seed)
@@ -0,0 +1,221 @@
+"""Latency, DynamoDB round trips and memory per route against a synthetic catalog.
+
+Every event in bench/events/ (recorded API Gateway REST v1 and HTTP API v2
+proxy events) is replayed through lambda_handler and through the Flask
+test client, against the in-memory DynamoDB stand-in filled by
+bench.catalog. No AWS account is needed.
+
+Run from backend/:  python -m bench.routes [--recipes 100000] [--users 10000] [--requests 50]
+"""
+import argparse
+import contextlib
+import glob
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+import app as api
+from bench import catalog
+from lambda_adapter import event_body, event_headers, event_method, event_path, event_query_string
+
+EVENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'events')
+
+SEARCH_TERMS = ['chicken', 'curry', 'pasta', 'soup', 'beans', 'rice', 'smoky chili', 'creamy', 'tacos',
+                'butternut', 'lentl', 'mac cheese', 'stew', 'garlic', 'spinach pie']
+
+# Shared by every mode so registrations never collide with an earlier run's users
+UNIQUE = itertools.count(1)
+
+def load_events(directory, only=None):
+    """``[(name, event)]`` in file-name order, optionally filtered by substring"""
+    events = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if only and not any(part in name for part in only):
+            continue
+        with open(path) as f:
+            events.append((name, json.load(f)))
+    return events
+
+def fill(value, values):
+    """Replace ``{{placeholder}}`` markers in every string of an event"""
+    if isinstance(value, dict):
+        return {k: fill(v, values) for k, v in value.items()}
+    if isinstance(value, list):
+        return [fill(v, values) for v in value]
+    if isinstance(value, str) and '{{' in value:
+        for key, replacement in values.items():
+            value = value.replace('{{' + key + '}}', str(replacement))
+    return value
+
+class Placeholders:
+    """Picks a user, recipe and search term for each replayed request"""
+
+    def __init__(self, data, seed=11):
+        self.rng = random.Random(seed)
+        self.users = data['users']
+        self.recipe_count = len(data['recipes'])
+        self.saved = {k: list(v) for k, v in data['saved'].items()}
+        self.liked = {k: list(v) for k, v in data['liked'].items()}
+        self.tokens = {}
+
+    def _pop(self, lists, username):
+        ids = lists.get(username)
+        return ids.pop() if ids else self.rng.randint(1, self.recipe_count)
+
+    def next(self):
+        user = self.rng.choice(self.users)
+        username = user['username']
+        if username not in self.tokens:
+            self.tokens[username] = api.generate_token(username)
+        saved_recipe_id = self._pop(self.saved, username)
+        recipe_ids = [rid for rid in self.rng.sample(range(1, self.recipe_count + 1), 11) if rid != saved_recipe_id]
+        return {
+            'token': self.tokens[username],
+            'username': username,
+            'email': user['email'],
+            'password': catalog.BENCH_PASSWORD,
+            'recipe_id': self.rng.randint(1, self.recipe_count),
+            'recipe_ids': json.dumps(recipe_ids[:10]),
+            'meal_plan': json.dumps([self.rng.randint(1, self.recipe_count) for _ in range(21)]),
+            'saved_recipe_id': saved_recipe_id,
+            'liked_recipe_id': self._pop(self.liked, username),
+            'query': self.rng.choice(SEARCH_TERMS),
+            'unique': f"{os.getpid()}x{next(UNIQUE)}",
+            'source_ip': f"10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+        }
+
+def via_lambda(event):
+    return api.lambda_handler(event, None)['statusCode']
+
+def via_client(client):
+    def run(event):
+        headers = event_headers(event)
+        headers.pop('content-length', None)
+        response = client.open(
+            event_path(event),
+            method=event_method(event),
+            query_string=event_query_string(event),
+            headers=headers,
+            data=event_body(event),
+            environ_base={'REMOTE_ADDR': event['requestContext'].get('identity', {}).get('sourceIp')
+                          or event['requestContext'].get('http', {}).get('sourceIp', '')}
+        )
+        return response.status_code
+    return run
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def max_rss_mib():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def replay(name, template, run, db, placeholders, count, memory_samples):
+    samples, calls, statuses = [], [], {}
+    for _ in range(count):
+        event = fill(template, placeholders.next())
+        db.reset_calls()
+        started = time.perf_counter()
+        status = run(event)
+        samples.append((time.perf_counter() - started) * 1000)
+        calls.append(len(db.reset_calls()))
+        statuses[status] = statuses.get(status, 0) + 1
+
+    # Allocation is measured in a separate pass so tracemalloc does not skew the timings
+    peak = 0
+    if memory_samples:
+        tracemalloc.start()
+        for _ in range(memory_samples):
+            event = fill(template, placeholders.next())
+            tracemalloc.reset_peak()
+            run(event)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    ordered = sorted(samples)
+    return {
+        'route': name,
+        'requests': count,
+        'first_ms': samples[0],
+        'p50_ms': percentile(ordered, 50),
+        'p95_ms': percentile(ordered, 95),
+        'p99_ms': percentile(ordered, 99),
+        'mean_ms': statistics.fmean(samples),
+        'dynamodb_calls': statistics.fmean(calls),
+        'dynamodb_calls_max': max(calls),
+        'peak_kib': peak / 1024.0,
+        'statuses': statuses
+    }
+
+def print_rows(mode, rows):
+    print(f"\n== {mode} ==")
+    print(f"{'route':<26} {'first':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'ddb/req':>8} {'max':>4} "
+          f"{'peak KiB':>9}  status")
+    for row in rows:
+        statuses = ' '.join(f"{code}x{n}" for code, n in sorted(row['statuses'].items()))
+        print(f"{row['route']:<26} {row['first_ms']:>9.2f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['dynamodb_calls']:>8.2f} {row['dynamodb_calls_max']:>4} "
+              f"{row['peak_kib']:>9.1f}  {statuses}")
+
+def main(args):
+    db = api.use_local_dynamodb(latency=args.latency_ms / 1000.0, unprocessed_rate=args.unprocessed_rate, seed=1)
+    api.instrumentation.enabled = False
+    quiet = open(os.devnull, 'w')
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(quiet):
+        data = catalog.populate(args.recipes, args.users, args.mean_list_size)
+    print(f"catalog: {args.recipes} recipes, {args.users} users, "
+          f"{sum(map(len, data['saved'].values()))} saved, {sum(map(len, data['liked'].values()))} liked "
+          f"(built in {time.perf_counter() - started:.1f} s, max RSS {max_rss_mib() or 0:.0f} MiB)")
+
+    events = load_events(args.events, args.only)
+    modes = {'lambda_handler': via_lambda, 'flask test client': via_client(api.app.test_client())}
+    report = {}
+    for mode in args.via:
+        label = 'lambda_handler' if mode == 'lambda' else 'flask test client'
+        # Every mode starts like a cold container: empty catalog and token caches
+        api.recipe_cache.invalidate()
+        api.token_cache = api.VerifiedTokenCache(api.TOKEN_CACHE_SIZE, api.REJECTED_TOKEN_TTL)
+        placeholders = Placeholders(data)
+        rows = []
+        with contextlib.redirect_stdout(quiet):
+            for name, template in events:
+                rows.append(replay(name, template, modes[label], db, placeholders,
+                                   args.requests, args.memory_samples))
+        print_rows(label, rows)
+        report[label] = rows
+
+    print(f"\nmax RSS {max_rss_mib() or 0:.0f} MiB")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"wrote {args.json}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--mean-list-size', type=int, default=20, help='average saved recipes per user')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--memory-samples', type=int, default=3, help='requests per route run under tracemalloc')
+    parser.add_argument('--via', nargs='+', choices=['lambda', 'client'], default=['lambda', 'client'])
+    parser.add_argument('--only', nargs='+', help='replay only events whose name contains one of these')
+    parser.add_argument('--events', default=EVENTS_DIR)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated DynamoDB round trip')
+    parser.add_argument('--unprocessed-rate', type=float, default=0.0,
+                        help='share of batch keys left unprocessed to exercise retries')
+    parser.add_argument('--json', help='also write the results to this file')
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+"""Compare JSON serialisation of recipe lists: old decimal_to_float path vs the Decimal-aware provider.
+
+Run from backend/:  python -m bench.serialization [--sizes 1000 50000] [--repeat 5]
+"""
+import argparse
+import copy
+import statistics
+import time
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+import app as api
+
+def decimal_to_float(obj):
+    """The serialisation step every response used to run before jsonify"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {k: decimal_to_float(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [decimal_to_float(i) for i in obj]
+    return obj
+
+def synthetic_catalog(size):
+    """``size`` recipes cloned from SAMPLE_RECIPES with distinct ids and names"""
+    recipes = []
+    for i in range(size):
+        recipe = copy.deepcopy(api.SAMPLE_RECIPES[i % len(api.SAMPLE_RECIPES)])
+        recipe['recipe_id'] = Decimal(i + 1)
+        recipe['name'] = f"{recipe['name']} #{i + 1}"
+        recipe['servings'] = Decimal(recipe['servings'])
+        recipes.append(recipe)
+    return recipes
+
+def timed(fn, repeat):
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(fn())
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, size
+
+def run(sizes, repeat):
+    legacy = DefaultJSONProvider(api.app)
+    print(f"encoder backend: {'orjson' if api.orjson else 'json (stdlib)'}")
+    print(f"{'recipes':>8}  {'path':<34} {'median ms':>10} {'bytes':>12}")
+    with api.app.app_context():
+        for size in sizes:
+            recipes = synthetic_catalog(size)
+            api.catalog_version.sync(recipes)
+            api.recipe_json.sync(recipes)
+
+            def cold_fragments():
+                api.recipe_json.fragments.clear()
+                return api.recipe_json.array(recipes)
+
+            paths = [
+                ('decimal_to_float + jsonify', lambda: legacy.response(decimal_to_float(recipes)).get_data()),
+                ('DecimalJSONProvider', lambda: api.app.json.response(recipes).get_data()),
+                ('fragment cache (cold)', cold_fragments),
+                # the cold runs leave every fragment cached
+                ('fragment cache (warm)', lambda: api.recipe_json.array(recipes)),
+            ]
+            for name, fn in paths:
+                ms, nbytes = timed(fn, repeat)
+                print(f"{size:>8}  {name:<34} {ms:>10.2f} {nbytes:>12}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-orjson', action='store_true', help='benchmark the stdlib encoder')
+    args = parser.parse_args()
+    if args.no_orjson:
+        api.orjson = None
+    run(args.sizes, args.repeat)
@@ -0,0 +1,198 @@
+"""Translate API Gateway proxy events (REST v1 and HTTP API v2) to WSGI and back"""
+import base64
+import gzip
+import sys
+from io import BytesIO
+from urllib.parse import urlencode
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# CORS headers are the same on every response, so build them once
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization,Idempotency-Key'
+}
+
+TEXT_TYPES = ('application/json', 'application/javascript', 'application/xml', 'text/')
+
+def is_v2(event):
+    """True for HTTP API payload format 2.0 events"""
+    return event.get('version') == '2.0'
+
+def event_method(event):
+    if is_v2(event):
+        return event['requestContext']['http']['method']
+    return event.get('httpMethod', 'GET')
+
+def event_path(event):
+    if is_v2(event):
+        return event.get('rawPath', '/')
+    return event.get('path', '/')
+
+def event_headers(event):
+    """Request headers with lower-case names; repeated headers are comma-joined"""
+    if not is_v2(event) and event.get('multiValueHeaders'):
+        return {k.lower(): ', '.join(v) for k, v in event['multiValueHeaders'].items()}
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    if is_v2(event) and event.get('cookies'):
+        headers['cookie'] = '; '.join(event['cookies'])
+    return headers
+
+def event_query_string(event):
+    """URL-encoded query string, keeping repeated parameters"""
+    if is_v2(event):
+        return event.get('rawQueryString', '')
+    if event.get('multiValueQueryStringParameters'):
+        return urlencode(event['multiValueQueryStringParameters'], doseq=True)
+    return urlencode(event.get('queryStringParameters') or {})
+
+def event_source_ip(event):
+    context = event.get('requestContext') or {}
+    if is_v2(event):
+        return context.get('http', {}).get('sourceIp', '')
+    return context.get('identity', {}).get('sourceIp', '')
+
+def event_body(event):
+    """Raw request body bytes; base64 bodies are decoded, text is not re-encoded twice"""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        return base64.b64decode(body)
+    return body.encode('utf-8')
+
+def build_environ(event):
+    """WSGI environ for an API Gateway event"""
+    body = event_body(event)
+    headers = event_headers(event)
+    environ = {
+        'REQUEST_METHOD': event_method(event),
+        'SCRIPT_NAME': '',
+        'PATH_INFO': event_path(event),
+        'QUERY_STRING': event_query_string(event),
+        'CONTENT_TYPE': headers.pop('content-type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'REMOTE_ADDR': event_source_ip(event),
+        'SERVER_NAME': headers.get('host', 'lambda'),
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'https',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multiprocess': False,
+        'wsgi.multithread': False,
+        'wsgi.run_once': False,
+        'lambda.event': event,
+    }
+    headers.pop('content-length', None)
+    for key, value in headers.items():
+        environ['HTTP_' + key.upper().replace('-', '_')] = value
+    return environ
+
+def _is_text(content_type):
+    return content_type.startswith(TEXT_TYPES)
+
+def _choose_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+class LambdaAdapter:
+    """Runs a WSGI app for API Gateway proxy events.
+
+    Handles both payload formats, multi-value query strings and headers,
+    binary bodies, and compresses large text responses when the client
+    sends Accept-Encoding. REST (v1) APIs only pass compressed bodies
+    through when binary media types are configured on the gateway, so
+    v1 compression is opt-in via ``compress_v1``.
+    """
+
+    def __init__(self, app, compress_min_bytes=1024, compress_v1=False):
+        self.app = app
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_v1 = compress_v1
+
+    def preflight(self, event):
+        """Answer a CORS preflight without touching the app"""
+        return self._result(event, 200, dict(CORS_HEADERS), [], b'', base64_body=False)
+
+    def __call__(self, event, context=None):
+        environ = build_environ(event)
+        environ['lambda.context'] = context
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured['status'] = int(status.split(' ', 1)[0])
+            captured['headers'] = headers
+
+        chunks = self.app(environ, start_response)
+        try:
+            body = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return self.build_response(event, captured['status'], captured['headers'], body, environ)
+
+    def build_response(self, event, status, header_list, body, environ):
+        headers = dict(CORS_HEADERS)
+        cookies = []
+        repeated = {}
+        for name, value in header_list:
+            if name.lower() == 'set-cookie':
+                cookies.append(value)
+            elif name in headers and name not in CORS_HEADERS:
+                repeated.setdefault(name, [headers[name]]).append(value)
+            else:
+                headers[name] = value
+        headers.setdefault('Content-Type', 'application/json')
+
+        content_type = headers['Content-Type']
+        encoding = None
+        if (
+            len(body) >= self.compress_min_bytes
+            and _is_text(content_type)
+            and 'Content-Encoding' not in headers
+            and (is_v2(event) or self.compress_v1)
+        ):
+            encoding = _choose_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding:
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+            headers['Vary'] = ', '.join(filter(None, [headers.get('Vary'), 'Accept-Encoding']))
+            headers['Content-Length'] = str(len(body))
+
+        base64_body = encoding is not None or not _is_text(content_type)
+        return self._result(event, status, headers, cookies, body, base64_body, repeated)
+
+    def _result(self, event, status, headers, cookies, body, base64_body, repeated=None):
+        result = {
+            'statusCode': status,
+            'headers': headers,
+            'body': base64.b64encode(body).decode('ascii') if base64_body else body.decode('utf-8'),
+            'isBase64Encoded': base64_body,
+        }
+        if is_v2(event):
+            for name, values in (repeated or {}).items():
+                headers[name] = ', '.join(values)
+            if cookies:
+                result['cookies'] = cookies
+        else:
+            multi = dict(repeated or {})
+            if cookies:
+                multi['Set-Cookie'] = cookies
+            if multi:
+                for name in multi:
+                    headers.pop(name, None)
+                result['multiValueHeaders'] = multi
+        return result
@@ -0,0 +1,182 @@
+"""Sorted in-memory indexes for filtering and ordering recipes by cost, time, difficulty and servings"""
+import bisect
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+
+HOURS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:h|hr|hrs|hour|hours)\b')
+MINUTES_RE = re.compile(r'(\d+)\s*(?:m|min|mins|minute|minutes)\b')
+NUMBER_RE = re.compile(r'\d+')
+
+# Sort keys accepted by RecipeListingIndex.query; a leading '-' sorts descending
+SORT_FIELDS = ('cost', 'time')
+
+def parse_minutes(text):
+    """Minutes in a free-form time such as '25 min', '1 hr 15 min' or '20-30 mins'; None if absent.
+
+    Ranges resolve to their upper bound so ``max_minutes`` filters stay
+    conservative.
+    """
+    text = str(text or '').lower()
+    hours = HOURS_RE.search(text)
+    minutes = MINUTES_RE.search(text)
+    if hours or minutes:
+        total = Decimal(hours.group(1)) * 60 if hours else 0
+        return int(total + (int(minutes.group(1)) if minutes else 0))
+    numbers = NUMBER_RE.findall(text)
+    return max(int(n) for n in numbers) if numbers else None
+
+def to_cents(value):
+    """Integer cents of a cost, or None if it is not a number"""
+    try:
+        return int((Decimal(str(value)) * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        return None
+
+class RecipeListingIndex:
+    """Recipe ids kept sorted by cost and by cooking time, plus difficulty buckets.
+
+    Range filters are two binary searches over the sorted arrays, so a
+    query costs O(log n + k) for k matching recipes. The narrowest
+    constrained dimension drives the lookup and the remaining filters are
+    checked per candidate. Rows come from the catalog cache through
+    ``sync``/``add``.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.rows = {}
+        self.by_cost = []
+        self.by_time = []
+        self.by_difficulty = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    @staticmethod
+    def row(recipe):
+        """(cents, minutes, difficulty, servings) for a recipe; unknown values are None"""
+        minutes = recipe.get('time_minutes')
+        minutes = int(minutes) if minutes is not None else parse_minutes(recipe.get('time'))
+        servings = recipe.get('servings')
+        return (
+            to_cents(recipe.get('total_cost')),
+            minutes,
+            str(recipe.get('difficulty') or '').lower(),
+            int(servings) if servings is not None else None
+        )
+
+    def _insert(self, recipe_id, row):
+        cents, minutes, difficulty, _ = row
+        self.rows[recipe_id] = row
+        if cents is not None:
+            bisect.insort(self.by_cost, (cents, recipe_id))
+        if minutes is not None:
+            bisect.insort(self.by_time, (minutes, recipe_id))
+        self.by_difficulty.setdefault(difficulty, set()).add(recipe_id)
+
+    def remove(self, recipe_id):
+        with self.lock:
+            row = self.rows.pop(recipe_id, None)
+            if row is None:
+                return
+            cents, minutes, difficulty, _ = row
+            for array, value in ((self.by_cost, cents), (self.by_time, minutes)):
+                if value is not None:
+                    position = bisect.bisect_left(array, (value, recipe_id))
+                    if position < len(array) and array[position] == (value, recipe_id):
+                        del array[position]
+            bucket = self.by_difficulty.get(difficulty)
+            if bucket is not None:
+                bucket.discard(recipe_id)
+                if not bucket:
+                    del self.by_difficulty[difficulty]
+
+    def add(self, recipe):
+        """Index a recipe, replacing any earlier version with the same id"""
+        recipe_id = int(recipe['recipe_id'])
+        row = self.row(recipe)
+        with self.lock:
+            if self.rows.get(recipe_id) == row:
+                return
+            self.remove(recipe_id)
+            self._insert(recipe_id, row)
+
+    def sync(self, recipes):
+        """Rebuild from a full catalog unless nothing the index depends on changed"""
+        rows = {int(r['recipe_id']): self.row(r) for r in recipes}
+        with self.lock:
+            if rows == self.rows:
+                return
+            self.rows = rows
+            self.by_cost = sorted((row[0], rid) for rid, row in rows.items() if row[0] is not None)
+            self.by_time = sorted((row[1], rid) for rid, row in rows.items() if row[1] is not None)
+            self.by_difficulty = {}
+            for rid, row in rows.items():
+                self.by_difficulty.setdefault(row[2], set()).add(rid)
+
+    @staticmethod
+    def _range(array, low, high):
+        start = 0 if low is None else bisect.bisect_left(array, (low, -1))
+        end = len(array) if high is None else bisect.bisect_right(array, (high, float('inf')))
+        return start, end
+
+    def query(self, min_cost=None, max_cost=None, max_minutes=None, difficulty=None, min_servings=None,
+              sort=None):
+        """Recipe ids matching every given filter.
+
+        Costs are in cents. ``sort`` is 'cost' or 'time', optionally prefixed
+        with '-' for descending; without it ids come back in ascending order.
+        """
+        descending = bool(sort) and sort.startswith('-')
+        sort_field = sort.lstrip('-') if sort else None
+        difficulty = difficulty.lower() if difficulty else None
+        with self.lock:
+            cost_span = self._range(self.by_cost, min_cost, max_cost)
+            time_span = self._range(self.by_time, None, max_minutes)
+            candidates = []
+            if min_cost is not None or max_cost is not None:
+                candidates.append((cost_span[1] - cost_span[0], 'cost'))
+            if max_minutes is not None:
+                candidates.append((time_span[1] - time_span[0], 'time'))
+            if difficulty is not None:
+                candidates.append((len(self.by_difficulty.get(difficulty, ())), 'difficulty'))
+            if not candidates and sort_field:
+                candidates.append((0, sort_field))
+
+            driver = min(candidates)[1] if candidates else None
+            if driver == 'cost':
+                ids = [rid for _, rid in self.by_cost[cost_span[0]:cost_span[1]]]
+            elif driver == 'time':
+                ids = [rid for _, rid in self.by_time[time_span[0]:time_span[1]]]
+            elif driver == 'difficulty':
+                ids = sorted(self.by_difficulty.get(difficulty, ()))
+            else:
+                ids = sorted(self.rows)
+
+            matches = []
+            for rid in ids:
+                cents, minutes, level, servings = self.rows[rid]
+                if min_cost is not None and (cents is None or cents < min_cost):
+                    continue
+                if max_cost is not None and (cents is None or cents > max_cost):
+                    continue
+                if max_minutes is not None and (minutes is None or minutes > max_minutes):
+                    continue
+                if difficulty is not None and level != difficulty:
+                    continue
+                if min_servings is not None and (servings is None or servings < min_servings):
+                    continue
+                matches.append(rid)
+
+            if sort_field:
+                column = 0 if sort_field == 'cost' else 1
+                if sort_field != driver:
+                    # Recipes without a value sort last either way
+                    matches.sort(key=lambda rid: (self.rows[rid][column] is None, self.rows[rid][column] or 0, rid))
+                if descending:
+                    present = [rid for rid in matches if self.rows[rid][column] is not None]
+                    matches = present[::-1] + matches[len(present):]
+            elif driver in ('cost', 'time'):
+                matches.sort()
+        return matches
@@ -0,0 +1,931 @@
+"""In-memory stand-in for the parts of the boto3 DynamoDB resource API that app.py uses.
+
+Used by the benchmark suite and for running the backend without AWS
+(``DYNAMODB_BACKEND=local``). Supports item reads and writes with
+condition/update/projection expressions, Query on tables and GSIs, paged
+and segmented Scan, BatchGetItem/BatchWriteItem and TransactWriteItems.
+Every call is recorded so callers can count round trips, and a fixed
+per-call latency or a share of unprocessed batch keys can be simulated.
+"""
+import bisect
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+_MISSING = object()
+
+# Scan and Query stop after roughly this much item data, like the real 1 MB page limit
+PAGE_BYTES = 1024 * 1024
+
+
+def client_error(code, message, operation, **extra):
+    error = {'Error': {'Code': code, 'Message': message}}
+    error.update(extra)
+    return ClientError(error, operation)
+
+
+def _normalise(value):
+    """Apply the type coercion boto3 performs on the way in (ints become Decimal)"""
+    if isinstance(value, dict):
+        return {k: _normalise(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalise(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {_normalise(v) for v in value}
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    return value
+
+
+def item_size(value):
+    """Approximate stored size of an attribute value in bytes"""
+    if isinstance(value, dict):
+        return 3 + sum(len(k) + item_size(v) for k, v in value.items())
+    if isinstance(value, (list, set)):
+        return 3 + sum(1 + item_size(v) for v in value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, Decimal):
+        return 1 + (len(value.as_tuple().digits) + 1) // 2
+    return 1
+
+
+def _copy(value):
+    """Fast deep copy for plain item data"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+# ============= EXPRESSIONS =============
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>\d+)
+      | (?P<op><>|<=|>=|=|<|>|\(|\)|,|\.|\[|\]|\+|-)
+      | (?P<name>\#[A-Za-z0-9_]+)
+      | (?P<value>:[A-Za-z0-9_]+)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+
+def _tokenize(expression):
+    tokens = []
+    expression = expression.strip()
+    pos = 0
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f'Cannot parse expression near {expression[pos:]!r}')
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        pos = match.end()
+        while pos < len(expression) and expression[pos].isspace():
+            pos += 1
+    return tokens
+
+
+def _resolve(item, path):
+    current = item
+    for part in path:
+        if isinstance(part, int):
+            if not isinstance(current, list) or part >= len(current):
+                return _MISSING
+        elif not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _assign(item, path, value):
+    current = item
+    for part in path[:-1]:
+        current = current.setdefault(part, {}) if isinstance(part, str) else current[part]
+    last = path[-1]
+    if isinstance(last, int) and last >= len(current):
+        current.append(value)
+    else:
+        current[last] = value
+
+
+def _remove(item, path):
+    parent = _resolve(item, path[:-1]) if len(path) > 1 else item
+    last = path[-1]
+    if isinstance(parent, dict):
+        parent.pop(last, None)
+    elif isinstance(parent, list) and last < len(parent):
+        parent.pop(last)
+
+
+def _type_of(value):
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, Decimal):
+        return 'N'
+    if isinstance(value, (bytes, bytearray)):
+        return 'B'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, set):
+        return 'SS' if all(isinstance(v, str) for v in value) else 'NS'
+    if value is None:
+        return 'NULL'
+    return None
+
+
+def _ordered(left, right, op):
+    if left is _MISSING or right is _MISSING or _type_of(left) != _type_of(right):
+        return False
+    if op == '<':
+        return left < right
+    if op == '<=':
+        return left <= right
+    if op == '>':
+        return left > right
+    return left >= right
+
+
+def _contains(subject, needle):
+    if isinstance(subject, str):
+        return isinstance(needle, str) and needle in subject
+    if isinstance(subject, (list, set)):
+        return needle in subject
+    return False
+
+
+class _Parser:
+    """Recursive-descent parser producing closures over an item"""
+
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        kind, text = self.peek()
+        if expected is not None and (text is None or text.upper() != expected.upper()):
+            raise ValueError(f'Expected {expected!r}, got {text!r}')
+        self.pos += 1
+        return kind, text
+
+    def done(self):
+        return self.peek()[0] is None
+
+    def keyword(self, *words):
+        kind, text = self.peek()
+        return kind == 'word' and text.upper() in words
+
+    def _name(self):
+        kind, text = self.take()
+        if kind == 'name':
+            if text not in self.names:
+                raise ValueError(f'Undefined attribute name placeholder {text}')
+            return self.names[text]
+        return text
+
+    def path(self):
+        parts = [self._name()]
+        while True:
+            text = self.peek()[1]
+            if text == '.':
+                self.take()
+                parts.append(self._name())
+            elif text == '[':
+                self.take()
+                parts.append(int(self.take()[1]))
+                self.take(']')
+            else:
+                return tuple(parts)
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            self.take()
+            if text not in self.values:
+                raise ValueError(f'Undefined attribute value placeholder {text}')
+            value = self.values[text]
+            return lambda item: value
+        if kind == 'word' and text == 'size' and self.peek(1)[1] == '(':
+            self.take()
+            self.take('(')
+            inner = self.operand()
+            self.take(')')
+
+            def size(item):
+                value = inner(item)
+                return _MISSING if value is _MISSING else Decimal(len(value))
+            return size
+        path = self.path()
+        return lambda item: _resolve(item, path)
+
+    # Conditions
+
+    def condition(self):
+        left = self.conjunction()
+        while self.keyword('OR'):
+            self.take()
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.keyword('AND'):
+            self.take()
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self):
+        if self.keyword('NOT'):
+            self.take()
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self):
+        kind, text = self.peek()
+        if text == '(':
+            self.take()
+            inner = self.condition()
+            self.take(')')
+            return inner
+        if kind == 'word' and text != 'size' and self.peek(1)[1] == '(':
+            return self.function()
+        left = self.operand()
+        kind, text = self.peek()
+        if text in ('=', '<>'):
+            self.take()
+            right = self.operand()
+            if text == '=':
+                return lambda item: left(item) is not _MISSING and left(item) == right(item)
+            return lambda item: left(item) != right(item)
+        if text in ('<', '<=', '>', '>='):
+            self.take()
+            right = self.operand()
+            return (lambda op: lambda item: _ordered(left(item), right(item), op))(text)
+        if self.keyword('BETWEEN'):
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return lambda item: _ordered(left(item), low(item), '>=') and _ordered(left(item), high(item), '<=')
+        if self.keyword('IN'):
+            self.take()
+            self.take('(')
+            options = [self.operand()]
+            while self.peek()[1] == ',':
+                self.take()
+                options.append(self.operand())
+            self.take(')')
+            return lambda item: any(left(item) == option(item) for option in options)
+        raise ValueError(f'Unexpected token {text!r}')
+
+    def function(self):
+        name = self.take()[1]
+        self.take('(')
+        if name in ('attribute_exists', 'attribute_not_exists'):
+            path = self.path()
+            self.take(')')
+            if name == 'attribute_exists':
+                return lambda item: _resolve(item, path) is not _MISSING
+            return lambda item: _resolve(item, path) is _MISSING
+        if name == 'attribute_type':
+            path = self.path()
+            self.take(',')
+            expected = self.operand()
+            self.take(')')
+            return lambda item: _type_of(_resolve(item, path)) == expected(item)
+        if name in ('begins_with', 'contains'):
+            subject = self.operand()
+            self.take(',')
+            needle = self.operand()
+            self.take(')')
+            if name == 'begins_with':
+                return lambda item: isinstance(subject(item), str) and subject(item).startswith(needle(item))
+            return lambda item: _contains(subject(item), needle(item))
+        raise ValueError(f'Unsupported function {name}')
+
+    # Updates
+
+    def update_value(self):
+        left = self.update_operand()
+        text = self.peek()[1]
+        if text in ('+', '-'):
+            self.take()
+            right = self.update_operand()
+            if text == '+':
+                return lambda item: left(item) + right(item)
+            return lambda item: left(item) - right(item)
+        return left
+
+    def update_operand(self):
+        kind, text = self.peek()
+        if kind == 'word' and text in ('if_not_exists', 'list_append') and self.peek(1)[1] == '(':
+            self.take()
+            self.take('(')
+            first = self.update_operand()
+            self.take(',')
+            second = self.update_operand()
+            self.take(')')
+            if text == 'list_append':
+                return lambda item: list(first(item)) + list(second(item))
+            return lambda item: second(item) if first(item) is _MISSING else first(item)
+        return self.operand()
+
+
+def compile_condition(expression, names=None, values=None):
+    """Compile a condition, filter or key condition expression into a predicate"""
+    parser = _Parser(expression, names, values)
+    predicate = parser.condition()
+    if not parser.done():
+        raise ValueError(f'Trailing tokens in {expression!r}')
+    return predicate
+
+
+def apply_update(item, expression, names=None, values=None):
+    """Apply an UpdateExpression to ``item`` in place"""
+    parser = _Parser(expression, names, values)
+    while not parser.done():
+        clause = parser.take()[1].upper()
+        while True:
+            if clause == 'SET':
+                path = parser.path()
+                parser.take('=')
+                _assign(item, path, _copy(parser.update_value()(item)))
+            elif clause == 'REMOVE':
+                _remove(item, parser.path())
+            elif clause == 'ADD':
+                path = parser.path()
+                value = parser.operand()(item)
+                current = _resolve(item, path)
+                if current is _MISSING:
+                    _assign(item, path, _copy(value))
+                elif isinstance(current, set):
+                    current |= value
+                else:
+                    _assign(item, path, current + value)
+            elif clause == 'DELETE':
+                path = parser.path()
+                value = parser.operand()(item)
+                current = _resolve(item, path)
+                if isinstance(current, set):
+                    current -= value
+                    if not current:
+                        _remove(item, path)
+            else:
+                raise ValueError(f'Unknown update clause {clause}')
+            if parser.peek()[1] != ',':
+                break
+            parser.take()
+
+
+def project(item, expression, names=None):
+    """Apply a ProjectionExpression, returning a new item"""
+    parser = _Parser(expression, names, {})
+    result = {}
+    while True:
+        path = parser.path()
+        value = _resolve(item, path)
+        if value is not _MISSING:
+            if len(path) == 1:
+                result[path[0]] = _copy(value)
+            else:
+                target, source = result, item
+                for part in path[:-1]:
+                    source = source[part]
+                    if isinstance(target, dict):
+                        target = target.setdefault(part, [] if isinstance(source, list) else {})
+                if isinstance(target, list):
+                    target.append(_copy(value))
+                else:
+                    target[path[-1]] = _copy(value)
+        if parser.peek()[1] != ',':
+            return result
+        parser.take()
+
+
+def _expression(kwargs, key, is_key_condition=False):
+    """Expression string plus merged name/value placeholders for one request parameter"""
+    expression = kwargs.get(key)
+    names = dict(kwargs.get('ExpressionAttributeNames') or {})
+    values = _normalise(dict(kwargs.get('ExpressionAttributeValues') or {}))
+    if isinstance(expression, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(expression, is_key_condition=is_key_condition)
+        expression = built.condition_expression
+        # Prefix the builder's placeholders so they cannot clash with the caller's
+        for old, value in sorted(built.attribute_name_placeholders.items(), key=lambda kv: -len(kv[0])):
+            new = f'#{key}_{old[1:]}'
+            expression = expression.replace(old, new)
+            names[new] = value
+        for old, value in sorted(built.attribute_value_placeholders.items(), key=lambda kv: -len(kv[0])):
+            new = f':{key}_{old[1:]}'
+            expression = expression.replace(old, new)
+            values[new] = _normalise(value)
+    return expression, names, values
+
+
+def _predicate(kwargs, key, is_key_condition=False):
+    if kwargs.get(key) is None:
+        return None
+    return compile_condition(*_expression(kwargs, key, is_key_condition))
+
+
+# ============= TABLES =============
+
+class LocalTable:
+    """One table: items by primary key, plus per-partition maps for the table and each GSI"""
+
+    def __init__(self, resource, name, hash_key, range_key=None, indexes=None, projections=None):
+        self.resource = resource
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = dict(indexes or {})
+        self.projections = dict(projections or {})
+        self.items = {}
+        self.sizes = {}
+        self.partitions = {None: {}}
+        for index_name in self.indexes:
+            self.partitions[index_name] = {}
+        self._order = None
+        self.lock = threading.RLock()
+
+    @property
+    def key_schema(self):
+        schema = [{'AttributeName': self.hash_key, 'KeyType': 'HASH'}]
+        if self.range_key:
+            schema.append({'AttributeName': self.range_key, 'KeyType': 'RANGE'})
+        return schema
+
+    # Storage
+
+    def _key(self, item, operation='GetItem'):
+        try:
+            hash_value = _normalise(item[self.hash_key])
+            range_value = _normalise(item[self.range_key]) if self.range_key else None
+        except KeyError:
+            raise client_error('ValidationException',
+                               'The provided key element does not match the schema', operation) from None
+        return (hash_value, range_value)
+
+    def key_of(self, item):
+        key = {self.hash_key: item[self.hash_key]}
+        if self.range_key:
+            key[self.range_key] = item[self.range_key]
+        return key
+
+    def _index_keys(self, index_name):
+        if index_name is None:
+            return self.hash_key, self.range_key
+        return self.indexes[index_name]
+
+    def _store(self, key, item):
+        old = self.items.get(key)
+        if old is None:
+            self._order = None
+        else:
+            self._unlink(key, old)
+        self.items[key] = item
+        self.sizes[key] = item_size(item)
+        for index_name in self.partitions:
+            hash_key, range_key = self._index_keys(index_name)
+            if hash_key in item and (range_key is None or range_key in item):
+                self.partitions[index_name].setdefault(item[hash_key], {})[key] = item
+
+    def _unlink(self, key, item):
+        for index_name, partitions in self.partitions.items():
+            hash_key, _ = self._index_keys(index_name)
+            partition = partitions.get(item.get(hash_key, _MISSING))
+            if partition is not None:
+                partition.pop(key, None)
+                if not partition:
+                    del partitions[item[hash_key]]
+
+    def _delete(self, key):
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.sizes.pop(key, None)
+            self._unlink(key, old)
+            self._order = None
+        return old
+
+    def _ordered_keys(self):
+        if self._order is None:
+            self._order = sorted(self.items)
+        return self._order
+
+    # Item operations
+
+    def _record(self, operation, kwargs):
+        self.resource.record(self.name, operation)
+
+    def _check(self, kwargs, existing, operation):
+        predicate = _predicate(kwargs, 'ConditionExpression')
+        if predicate is not None and not predicate(existing or {}):
+            extra = {}
+            if kwargs.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD' and existing:
+                extra['Item'] = _copy(existing)
+            raise client_error('ConditionalCheckFailedException', 'The conditional request failed',
+                               operation, **extra)
+
+    def _consumed(self, kwargs, units):
+        if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            return {'ConsumedCapacity': {'TableName': self.name, 'CapacityUnits': units}}
+        return {}
+
+    def get_item(self, **kwargs):
+        self._record('GetItem', kwargs)
+        with self.lock:
+            item = self.items.get(self._key(kwargs['Key']))
+            response = self._consumed(kwargs, 0.5)
+            if item is not None:
+                if kwargs.get('ProjectionExpression'):
+                    response['Item'] = project(item, kwargs['ProjectionExpression'],
+                                               kwargs.get('ExpressionAttributeNames'))
+                else:
+                    response['Item'] = _copy(item)
+            return response
+
+    def put_item(self, **kwargs):
+        self._record('PutItem', kwargs)
+        item = _normalise(kwargs['Item'])
+        with self.lock:
+            key = self._key(item, 'PutItem')
+            existing = self.items.get(key)
+            self._check(kwargs, existing, 'PutItem')
+            self._store(key, item)
+            response = self._consumed(kwargs, 1.0)
+            if kwargs.get('ReturnValues') == 'ALL_OLD' and existing is not None:
+                response['Attributes'] = _copy(existing)
+            return response
+
+    def delete_item(self, **kwargs):
+        self._record('DeleteItem', kwargs)
+        with self.lock:
+            key = self._key(kwargs['Key'], 'DeleteItem')
+            existing = self.items.get(key)
+            self._check(kwargs, existing, 'DeleteItem')
+            self._delete(key)
+            response = self._consumed(kwargs, 1.0)
+            if kwargs.get('ReturnValues') == 'ALL_OLD' and existing is not None:
+                response['Attributes'] = existing
+            return response
+
+    def update_item(self, **kwargs):
+        self._record('UpdateItem', kwargs)
+        with self.lock:
+            key_item = _normalise(dict(kwargs['Key']))
+            key = self._key(key_item, 'UpdateItem')
+            existing = self.items.get(key)
+            self._check(kwargs, existing, 'UpdateItem')
+            item = _copy(existing) if existing is not None else dict(key_item)
+            if kwargs.get('UpdateExpression'):
+                expression, names, values = _expression(kwargs, 'UpdateExpression')
+                apply_update(item, expression, names, values)
+            self._store(key, item)
+            response = self._consumed(kwargs, 1.0)
+            mode = kwargs.get('ReturnValues', 'NONE')
+            before = existing or {}
+            if mode == 'ALL_NEW':
+                response['Attributes'] = _copy(item)
+            elif mode == 'ALL_OLD' and existing is not None:
+                response['Attributes'] = _copy(existing)
+            elif mode in ('UPDATED_NEW', 'UPDATED_OLD'):
+                source = item if mode == 'UPDATED_NEW' else before
+                response['Attributes'] = {
+                    k: _copy(v) for k, v in source.items()
+                    if before.get(k, _MISSING) != item.get(k, _MISSING)
+                }
+            return response
+
+    # Reads over many items
+
+    def _page(self, keys, kwargs, index_name):
+        """Items after ExclusiveStartKey up to Limit or PAGE_BYTES; returns (items, last item or None)"""
+        start = 0
+        exclusive = kwargs.get('ExclusiveStartKey')
+        if exclusive:
+            start_key = self._key(exclusive, 'Scan')
+            position = self._position(keys, start_key, index_name)
+            start = position + 1 if position is not None else 0
+        limit = kwargs.get('Limit')
+        end = min(len(keys), start + limit) if limit else len(keys)
+        total = 0
+        for position in range(start, end):
+            total += self.sizes[keys[position]]
+            if total >= PAGE_BYTES:
+                end = position + 1
+                break
+        window = [self.items[k] for k in keys[start:end]]
+        last = window[-1] if end < len(keys) and window else None
+        return window, last
+
+    def _position(self, keys, start_key, index_name):
+        if index_name is None and keys is self._order:
+            position = bisect.bisect_left(keys, start_key)
+            return position if position < len(keys) and keys[position] == start_key else position - 1
+        for position, key in enumerate(keys):
+            if key == start_key:
+                return position
+        return None
+
+    def _index_view(self, item, index_name):
+        """The attributes an INCLUDE-projected GSI holds for an item"""
+        keep = {self.hash_key, self.range_key, *self.indexes[index_name], *self.projections[index_name]}
+        return {k: v for k, v in item.items() if k in keep}
+
+    def _respond(self, window, last, kwargs, index_name):
+        scanned = len(window)
+        if index_name in self.projections:
+            window = [self._index_view(item, index_name) for item in window]
+        predicate = _predicate(kwargs, 'FilterExpression')
+        if predicate is not None:
+            window = [item for item in window if predicate(item)]
+        if kwargs.get('Select') == 'COUNT':
+            items = []
+        elif kwargs.get('ProjectionExpression'):
+            items = [project(item, kwargs['ProjectionExpression'], kwargs.get('ExpressionAttributeNames'))
+                     for item in window]
+        else:
+            items = [_copy(item) for item in window]
+        response = {'Items': items, 'Count': len(window), 'ScannedCount': scanned}
+        response.update(self._consumed(kwargs, max(0.5, scanned / 8.0)))
+        if last is not None:
+            key = self.key_of(last)
+            if index_name:
+                hash_key, range_key = self.indexes[index_name]
+                key[hash_key] = last[hash_key]
+                if range_key:
+                    key[range_key] = last[range_key]
+            response['LastEvaluatedKey'] = key
+        return response
+
+    def scan(self, **kwargs):
+        self._record('Scan', kwargs)
+        with self.lock:
+            index_name = kwargs.get('IndexName')
+            keys = self._ordered_keys()
+            if index_name:
+                keys = [k for k in keys if k in self._index_members(index_name)]
+            total = kwargs.get('TotalSegments')
+            if total:
+                segment = kwargs['Segment']
+                keys = [k for k in keys if hash(k) % total == segment]
+            window, last = self._page(keys, kwargs, index_name)
+            return self._respond(window, last, kwargs, index_name)
+
+    def _index_members(self, index_name):
+        members = set()
+        for partition in self.partitions[index_name].values():
+            members.update(partition)
+        return members
+
+    def _partition_value(self, kwargs, hash_key):
+        expression, names, values = _expression(kwargs, 'KeyConditionExpression', is_key_condition=True)
+        for name, value in re.findall(r'(#?[A-Za-z0-9_]+)\s*=\s*(:[A-Za-z0-9_]+)', expression):
+            if names.get(name, name) == hash_key:
+                return values[value], compile_condition(expression, names, values)
+        raise client_error('ValidationException', 'Query condition missed key schema element', 'Query')
+
+    def query(self, **kwargs):
+        self._record('Query', kwargs)
+        with self.lock:
+            index_name = kwargs.get('IndexName')
+            hash_key, range_key = self._index_keys(index_name)
+            hash_value, predicate = self._partition_value(kwargs, hash_key)
+            partition = self.partitions[index_name].get(hash_value, {})
+            keys = [k for k, item in partition.items() if predicate(item)]
+            if range_key:
+                keys.sort(key=lambda k: (self.items[k][range_key], k))
+            else:
+                keys.sort()
+            if kwargs.get('ScanIndexForward') is False:
+                keys.reverse()
+            window, last = self._page(keys, kwargs, index_name)
+            return self._respond(window, last, kwargs, index_name)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+
+class _BatchWriter:
+    """Buffers writes and flushes them through BatchWriteItem in groups of 25"""
+
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+    def put_item(self, Item):
+        self.pending.append({'PutRequest': {'Item': Item}})
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def delete_item(self, Key):
+        self.pending.append({'DeleteRequest': {'Key': Key}})
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def flush(self):
+        while self.pending:
+            batch, self.pending = self.pending[:25], self.pending[25:]
+            response = self.table.resource.batch_write_item(RequestItems={self.table.name: batch})
+            self.pending.extend(response['UnprocessedItems'].get(self.table.name, []))
+
+
+class _Exceptions:
+    ClientError = ClientError
+    ConditionalCheckFailedException = ClientError
+    TransactionCanceledException = ClientError
+    ResourceNotFoundException = ClientError
+
+
+class LocalClient:
+    """Client-level API (low-level attribute values) for transactions"""
+
+    exceptions = _Exceptions()
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.deserializer = TypeDeserializer()
+
+    def _plain(self, value):
+        return {k: self.deserializer.deserialize(v) for k, v in (value or {}).items()}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        self.resource.record(None, 'TransactWriteItems')
+        entries = []
+        for entry in TransactItems:
+            (kind, spec), = entry.items()
+            entries.append((kind, spec, self.resource.Table(spec['TableName'])))
+        tables = sorted({id(t): t for _, _, t in entries}.values(), key=lambda t: t.name)
+        for table in tables:
+            table.lock.acquire()
+        try:
+            reasons, failed = [], False
+            for kind, spec, table in entries:
+                key_source = spec['Item'] if kind == 'Put' else spec['Key']
+                existing = table.items.get(table._key(self._plain(key_source)))
+                ok = True
+                if spec.get('ConditionExpression'):
+                    ok = compile_condition(spec['ConditionExpression'], spec.get('ExpressionAttributeNames'),
+                                           self._plain(spec.get('ExpressionAttributeValues')))(existing or {})
+                reasons.append({'Code': 'None'} if ok else
+                               {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+                failed = failed or not ok
+            if failed:
+                raise client_error('TransactionCanceledException',
+                                   'Transaction cancelled, please refer cancellation reasons for specific reasons',
+                                   'TransactWriteItems', CancellationReasons=reasons)
+            for kind, spec, table in entries:
+                if kind == 'Put':
+                    item = self._plain(spec['Item'])
+                    table._store(table._key(item), item)
+                elif kind == 'Delete':
+                    table._delete(table._key(self._plain(spec['Key'])))
+                elif kind == 'Update':
+                    key_item = self._plain(spec['Key'])
+                    key = table._key(key_item)
+                    item = _copy(table.items.get(key)) or dict(key_item)
+                    apply_update(item, spec['UpdateExpression'], spec.get('ExpressionAttributeNames'),
+                                 self._plain(spec.get('ExpressionAttributeValues')))
+                    table._store(key, item)
+            return {}
+        finally:
+            for table in tables:
+                table.lock.release()
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class LocalDynamoDB:
+    """Drop-in for ``boto3.resource('dynamodb')`` backed by dictionaries.
+
+    ``latency`` adds a fixed delay (seconds) to every call to imitate the
+    network; ``unprocessed_rate`` leaves that share of BatchGetItem /
+    BatchWriteItem requests unprocessed so retry paths are exercised.
+    """
+
+    def __init__(self, latency=0.0, unprocessed_rate=0.0, seed=None):
+        self.tables = {}
+        self.calls = []
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.meta = _Meta(LocalClient(self))
+
+    def create_table(self, name, hash_key, range_key=None, indexes=None, projections=None):
+        """Create a table; ``indexes`` maps GSI name to (hash_key, range_key or None).
+
+        ``projections`` maps a GSI name to the non-key attributes it includes;
+        other indexes project every attribute.
+        """
+        table = LocalTable(self, name, hash_key, range_key, indexes, projections)
+        self.tables[name] = table
+        return table
+
+    def Table(self, name):
+        if name not in self.tables:
+            raise client_error('ResourceNotFoundException', f'Requested resource not found: {name}', 'DescribeTable')
+        return self.tables[name]
+
+    def record(self, table, operation):
+        with self.lock:
+            self.calls.append((table, operation))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_calls(self):
+        """Return the calls recorded so far and start a new list"""
+        with self.lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+    def _unprocessed(self):
+        return self.unprocessed_rate and self.random.random() < self.unprocessed_rate
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.record(None, 'BatchGetItem')
+        responses, unprocessed, consumed = {}, {}, []
+        for name, spec in RequestItems.items():
+            table = self.Table(name)
+            found = []
+            with table.lock:
+                for key in spec['Keys']:
+                    if self._unprocessed():
+                        unprocessed.setdefault(name, {k: v for k, v in spec.items() if k != 'Keys'})
+                        unprocessed[name].setdefault('Keys', []).append(key)
+                        continue
+                    item = table.items.get(table._key(key))
+                    if item is None:
+                        continue
+                    if spec.get('ProjectionExpression'):
+                        found.append(project(item, spec['ProjectionExpression'], spec.get('ExpressionAttributeNames')))
+                    else:
+                        found.append(_copy(item))
+            responses[name] = found
+            consumed.append({'TableName': name, 'CapacityUnits': len(spec['Keys']) / 2.0})
+        result = {'Responses': responses, 'UnprocessedKeys': unprocessed}
+        if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            result['ConsumedCapacity'] = consumed
+        return result
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.record(None, 'BatchWriteItem')
+        unprocessed, consumed = {}, []
+        for name, requests in RequestItems.items():
+            if len(requests) > 25:
+                raise client_error('ValidationException', 'Too many items requested for the BatchWriteItem call',
+                                   'BatchWriteItem')
+            table = self.Table(name)
+            with table.lock:
+                for entry in requests:
+                    if self._unprocessed():
+                        unprocessed.setdefault(name, []).append(entry)
+                        continue
+                    if 'PutRequest' in entry:
+                        item = _normalise(entry['PutRequest']['Item'])
+                        table._store(table._key(item, 'BatchWriteItem'), item)
+                    else:
+                        table._delete(table._key(entry['DeleteRequest']['Key'], 'BatchWriteItem'))
+            consumed.append({'TableName': name, 'CapacityUnits': float(len(requests))})
+        result = {'UnprocessedItems': unprocessed}
+        if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            result['ConsumedCapacity'] = consumed
+        return result
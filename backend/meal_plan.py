@@ -0,0 +1,309 @@
+"""Weekly meal plans under a budget: knapsack over cost-per-serving arrays plus an ingredient-overlap search"""
+import heapq
+import math
+import threading
+import time
+from array import array
+from decimal import Decimal
+
+from shopping_list import ingredient_id
+
+# Budget resolution of the knapsack table; costs are rounded up to a bucket so plans never overspend
+BUDGET_BUCKETS = 1000
+# Score for each extra recipe in a plan that uses an ingredient another recipe already needs
+OVERLAP_WEIGHT = 0.5
+# Cheapest recipes per plan ingredient tried as swaps during the overlap search
+OVERLAP_NEIGHBOURS = 40
+
+# Exclusion terms that stand for several ingredients
+DIETARY_GROUPS = {
+    'vegetarian': ('beef', 'chicken', 'pork', 'bacon', 'ham', 'lamb', 'mutton', 'mince', 'boerewors', 'sausage',
+                   'wors', 'fish', 'hake', 'tuna', 'salmon', 'prawn', 'anchovy', 'biltong'),
+    'pescatarian': ('beef', 'chicken', 'pork', 'bacon', 'ham', 'lamb', 'mutton', 'mince', 'boerewors', 'sausage',
+                    'wors', 'biltong'),
+    'dairy': ('milk', 'cheese', 'butter', 'cream', 'parmesan', 'feta', 'cheddar', 'yoghurt', 'yogurt', 'mozzarella'),
+    'meat': ('beef', 'chicken', 'pork', 'bacon', 'ham', 'lamb', 'mutton', 'mince', 'boerewors', 'sausage', 'wors',
+             'biltong'),
+    'gluten': ('flour', 'bread', 'bun', 'pasta', 'spaghetti', 'noodle', 'tortilla', 'breadcrumb', 'macaroni')
+}
+
+class _Snapshot:
+    """Parallel arrays over every plannable recipe, rebuilt after catalog changes"""
+    __slots__ = ('ids', 'positions', 'cost', 'ingredients', 'names', 'words', 'by_ingredient')
+
+    def __init__(self, rows):
+        self.ids = array('l', sorted(rows))
+        self.positions = {rid: pos for pos, rid in enumerate(self.ids)}
+        self.cost = array('d', (rows[rid][0] for rid in self.ids))
+        codes, self.names = {}, []
+        self.ingredients = []
+        for rid in self.ids:
+            recipe_codes = set()
+            for name in rows[rid][1]:
+                if name not in codes:
+                    codes[name] = len(self.names)
+                    self.names.append(name)
+                recipe_codes.add(codes[name])
+            self.ingredients.append(tuple(sorted(recipe_codes)))
+
+        # Inverted indexes: ingredient word -> positions (exclusions), ingredient -> positions by cost (swaps)
+        self.words = {}
+        members = [[] for _ in self.names]
+        for pos, recipe_codes in enumerate(self.ingredients):
+            for code in recipe_codes:
+                members[code].append(pos)
+        for code, name in enumerate(self.names):
+            for word in {name, *name.split('-')}:
+                self.words.setdefault(word, set()).update(members[code])
+        self.by_ingredient = [sorted(positions, key=self.cost.__getitem__) for positions in members]
+
+class MealPlanIndex:
+    """Cost per serving (cents) and ingredient ids of every recipe, kept by the catalog cache.
+
+    Writes only mark the arrays stale; they are rebuilt on the next plan.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.current = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @staticmethod
+    def row(recipe):
+        """(cents per serving, ingredient ids), or None if the recipe has no usable cost"""
+        try:
+            cents = Decimal(str(recipe['total_cost'])) * 100
+        except (KeyError, ArithmeticError, ValueError):
+            return None
+        servings = recipe.get('servings')
+        servings = int(servings) if servings else 1
+        names = tuple(i.get('ingredient_id') or ingredient_id(i.get('name', '')) for i in recipe.get('ingredients') or [])
+        return float(cents) / max(servings, 1), names
+
+    def add(self, recipe):
+        row = self.row(recipe)
+        with self.lock:
+            if row is None:
+                self.rows.pop(int(recipe['recipe_id']), None)
+            else:
+                self.rows[int(recipe['recipe_id'])] = row
+            self.current = None
+
+    def sync(self, recipes):
+        rows = {}
+        for recipe in recipes:
+            row = self.row(recipe)
+            if row is not None:
+                rows[int(recipe['recipe_id'])] = row
+        with self.lock:
+            if rows != self.rows:
+                self.rows = rows
+                self.current = None
+
+    def snapshot(self):
+        with self.lock:
+            if self.current is None:
+                self.current = _Snapshot(self.rows)
+            return self.current
+
+def excluded_positions(snapshot, terms):
+    """Positions of recipes using any excluded ingredient or dietary group"""
+    excluded = set()
+    for term in terms:
+        term = str(term).strip().lower()
+        for word in DIETARY_GROUPS.get(term, (term,)):
+            excluded.update(snapshot.words.get(ingredient_id(word), ()))
+    return excluded
+
+class _Planner:
+    def __init__(self, snapshot, allowed, scaled, values, meals, max_repeats, budget, overlap_weight, deadline):
+        self.snapshot = snapshot
+        self.allowed = allowed
+        self.scaled = scaled
+        self.values = values
+        self.meals = meals
+        self.max_repeats = max_repeats
+        self.budget = budget
+        self.overlap_weight = overlap_weight
+        self.deadline = deadline
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def overlap(self, plan):
+        seen, shared = set(), 0
+        for pos in set(plan):
+            for code in self.snapshot.ingredients[pos]:
+                if code in seen:
+                    shared += 1
+                else:
+                    seen.add(code)
+        return shared
+
+    def score(self, plan):
+        return sum(self.values[pos] for pos in plan) + self.overlap_weight * self.overlap(plan)
+
+    def cost(self, plan):
+        return sum(self.scaled[pos] for pos in plan)
+
+    def greedy(self):
+        """Cheapest recipes, each up to max_repeats times; None if even they exceed the budget"""
+        distinct = -(-self.meals // self.max_repeats)
+        cheapest = heapq.nsmallest(distinct, self.allowed, key=lambda pos: (self.scaled[pos], -self.values[pos]))
+        if len(cheapest) < distinct:
+            return None
+        plan = [pos for pos in cheapest for _ in range(self.max_repeats)][:self.meals]
+        return plan if self.cost(plan) <= self.budget else None
+
+    def frontier(self):
+        """Recipes not dominated by enough cheaper, at-least-as-valuable ones to fill a plan.
+
+        A recipe with ``ceil(meals / max_repeats)`` others that cost no more
+        and score no less can always be swapped for one of them, so the
+        knapsack only needs the rest.
+        """
+        slots = -(-self.meals // self.max_repeats)
+        best = []
+        kept = []
+        for pos in sorted(self.allowed, key=lambda pos: (self.scaled[pos], -self.values[pos])):
+            value = self.values[pos]
+            if len(best) == slots and best[0] >= value:
+                continue
+            kept.append(pos)
+            if len(best) < slots:
+                heapq.heappush(best, value)
+            else:
+                heapq.heapreplace(best, value)
+        return kept
+
+    def knapsack(self, candidates, buckets):
+        """Highest-value plan of exactly ``meals`` recipes within budget; None if the deadline passes"""
+        unit = max(self.budget / buckets, 1e-9)
+        size = int(self.budget / unit) + 1
+        floor = float('-inf')
+        table = [[0.0] + [floor] * (size - 1)] + [[floor] * size for _ in range(self.meals)]
+        steps = []
+        for pos in candidates:
+            weight = math.ceil(self.scaled[pos] / unit - 1e-9)
+            if weight >= size:
+                continue
+            value = self.values[pos]
+            for _ in range(min(self.max_repeats, self.meals)):
+                if self.expired():
+                    return None
+                took = []
+                for count in range(self.meals, 0, -1):
+                    row, previous = table[count], table[count - 1]
+                    offered = [v + value for v in previous[:size - weight]]
+                    current = row[weight:]
+                    took.append(bytes(map(float.__gt__, offered, current)))
+                    row[weight:] = map(max, offered, current)
+                steps.append((pos, weight, took[::-1]))
+
+        last = table[self.meals]
+        best = max(range(size), key=lambda b: (last[b], -b))
+        if last[best] == floor:
+            return None
+        plan, count, b = [], self.meals, best
+        for pos, weight, took in reversed(steps):
+            if count and b >= weight and took[count - 1][b - weight]:
+                plan.append(pos)
+                count -= 1
+                b -= weight
+        return plan[::-1]
+
+    def neighbours(self, plan, candidates):
+        pool = dict.fromkeys(candidates)
+        allowed = self.allowed_set
+        for pos in set(plan):
+            for code in self.snapshot.ingredients[pos]:
+                added = 0
+                for other in self.snapshot.by_ingredient[code]:
+                    if other in allowed:
+                        pool[other] = None
+                        added += 1
+                        if added == OVERLAP_NEIGHBOURS:
+                            break
+        return list(pool)
+
+    def improve(self, plan, candidates):
+        """Single-meal swaps that raise value plus ingredient overlap, until none helps or time runs out.
+
+        Returns ``(plan, finished)``.
+        """
+        self.allowed_set = set(self.allowed)
+        current, spent = self.score(plan), self.cost(plan)
+        improved = True
+        while improved:
+            improved = False
+            pool = self.neighbours(plan, candidates)
+            for index in range(len(plan)):
+                if self.expired():
+                    return plan, False
+                old = plan[index]
+                for pos in pool:
+                    if pos == old or plan.count(pos) >= self.max_repeats:
+                        continue
+                    if spent - self.scaled[old] + self.scaled[pos] > self.budget:
+                        continue
+                    trial = plan[:index] + [pos] + plan[index + 1:]
+                    trial_score = self.score(trial)
+                    if trial_score > current + 1e-9:
+                        plan, current = trial, trial_score
+                        spent = spent - self.scaled[old] + self.scaled[pos]
+                        old = pos
+                        improved = True
+        return plan, True
+
+def plan_meals(index, budget_cents, people, meals, likes=None, exclude=(), max_repeats=1, deadline=None,
+               overlap_weight=OVERLAP_WEIGHT, buckets=BUDGET_BUCKETS):
+    """Pick ``meals`` recipes for ``people`` within ``budget_cents``.
+
+    Each recipe is worth ``1 + log(1 + likes)``; the plan maximises total
+    worth plus ``overlap_weight`` for every ingredient shared between its
+    recipes, since shared ingredients are bought once. A greedy plan comes
+    first, then an exact knapsack over the non-dominated recipes (ignoring
+    overlap), then swap-based local search for overlap. Once ``deadline``
+    (a ``time.monotonic()`` value) passes the best plan so far is returned.
+
+    Returns None when no plan fits, otherwise a dict with ``recipe_ids``,
+    ``cost`` (cents), ``score``, ``shared_ingredients`` and ``complete``.
+    """
+    snapshot = index.snapshot()
+    skip = excluded_positions(snapshot, exclude)
+    scaled = [cost * people for cost in snapshot.cost]
+    values = [1.0] * len(snapshot.ids)
+    for recipe_id, count in (likes or {}).items():
+        pos = snapshot.positions.get(recipe_id)
+        if pos is not None:
+            values[pos] = 1.0 + math.log1p(max(count, 0))
+    allowed = [pos for pos in range(len(snapshot.ids)) if pos not in skip and scaled[pos] <= budget_cents]
+    planner = _Planner(snapshot, allowed, scaled, values, meals, max_repeats, budget_cents, overlap_weight, deadline)
+
+    plan = planner.greedy()
+    if plan is None:
+        return None
+    complete = False
+    candidates = planner.frontier()
+    if not planner.expired():
+        optimal = planner.knapsack(candidates, buckets)
+        if optimal is not None and planner.score(optimal) >= planner.score(plan):
+            plan = optimal
+        if optimal is not None:
+            plan, complete = planner.improve(plan, candidates)
+
+    plan.sort(key=lambda pos: (-values[pos], scaled[pos]))
+    counts = {}
+    for pos in set(plan):
+        for code in snapshot.ingredients[pos]:
+            counts[code] = counts.get(code, 0) + 1
+    return {
+        'recipe_ids': [snapshot.ids[pos] for pos in plan],
+        'cost': round(planner.cost(plan)),
+        'score': round(planner.score(plan), 3),
+        'shared_ingredients': sorted(snapshot.names[code] for code, n in counts.items() if n > 1),
+        'complete': complete
+    }
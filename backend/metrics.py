@@ -0,0 +1,181 @@
+"""Per-request performance metrics written as CloudWatch Embedded Metric Format log lines"""
+import contextvars
+import cProfile
+import io
+import json
+import pstats
+import random
+import threading
+import time
+
+from flask import g, request
+
+# Table operations that are timed and asked for ReturnConsumedCapacity
+INSTRUMENTED_OPERATIONS = {'get_item', 'put_item', 'update_item', 'delete_item', 'query', 'scan'}
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+class RequestMetrics:
+    """Timings and DynamoDB usage gathered while serving one request"""
+
+    def __init__(self, cold_start):
+        self.started = time.perf_counter()
+        self.cold_start = cold_start
+        self.lock = threading.Lock()
+        self.tables = {}
+
+    def record_dynamodb(self, table, operation, elapsed, capacity):
+        with self.lock:
+            stats = self.tables.setdefault(table, {'calls': 0, 'latency_ms': 0.0, 'capacity': 0.0, 'operations': {}})
+            stats['calls'] += 1
+            stats['latency_ms'] += elapsed * 1000
+            stats['capacity'] += capacity
+            stats['operations'][operation] = stats['operations'].get(operation, 0) + 1
+
+def _capacity_units(consumed):
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, list):
+        return sum(float(c.get('CapacityUnits', 0)) for c in consumed)
+    return float(consumed.get('CapacityUnits', 0))
+
+def call_dynamodb(table, operation, fn, **kwargs):
+    """Run a DynamoDB call, recording its latency and consumed capacity on the current request"""
+    kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    started = time.perf_counter()
+    response = None
+    try:
+        response = fn(**kwargs)
+        return response
+    finally:
+        metrics = current.get()
+        if metrics is not None:
+            consumed = response.get('ConsumedCapacity') if isinstance(response, dict) else None
+            metrics.record_dynamodb(table, operation, time.perf_counter() - started, _capacity_units(consumed))
+
+def propagate(fn):
+    """Wrap ``fn`` so calls from worker threads count towards the submitting request"""
+    metrics = current.get()
+
+    def run(*args, **kwargs):
+        token = current.set(metrics)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            current.reset(token)
+    return run
+
+def emf_lines(metrics, namespace, route, method, status, payload_bytes, latency_ms):
+    """EMF documents for one request: one for the route, one per table touched"""
+    timestamp = int(time.time() * 1000)
+    calls = sum(t['calls'] for t in metrics.tables.values())
+    lines = [{
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [['Route'], ['Route', 'Method']],
+                'Metrics': [
+                    {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                    {'Name': 'DynamoDBCalls', 'Unit': 'Count'},
+                    {'Name': 'DynamoDBLatency', 'Unit': 'Milliseconds'},
+                    {'Name': 'ConsumedCapacity', 'Unit': 'Count'},
+                    {'Name': 'PayloadBytes', 'Unit': 'Bytes'},
+                    {'Name': 'ColdStart', 'Unit': 'Count'}
+                ]
+            }]
+        },
+        'Route': route,
+        'Method': method,
+        'StatusCode': status,
+        'Latency': round(latency_ms, 3),
+        'DynamoDBCalls': calls,
+        'DynamoDBLatency': round(sum(t['latency_ms'] for t in metrics.tables.values()), 3),
+        'ConsumedCapacity': round(sum(t['capacity'] for t in metrics.tables.values()), 3),
+        'PayloadBytes': payload_bytes,
+        'ColdStart': 1 if metrics.cold_start else 0
+    }]
+    for table, stats in metrics.tables.items():
+        lines.append({
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [['Table']],
+                    'Metrics': [
+                        {'Name': 'TableCalls', 'Unit': 'Count'},
+                        {'Name': 'TableLatency', 'Unit': 'Milliseconds'},
+                        {'Name': 'TableConsumedCapacity', 'Unit': 'Count'}
+                    ]
+                }]
+            },
+            'Table': table,
+            'Route': route,
+            'TableCalls': stats['calls'],
+            'TableLatency': round(stats['latency_ms'], 3),
+            'TableConsumedCapacity': round(stats['capacity'], 3),
+            'Operations': stats['operations']
+        })
+    return lines
+
+class RequestInstrumentation:
+    """Flask hooks that time every request and print EMF metrics when it finishes.
+
+    With ``profile_sample_rate`` > 0 a fraction of requests also run under
+    cProfile, and the top functions are logged for those that took longer
+    than ``profile_slow_ms``.
+    """
+
+    def __init__(self, app, namespace, enabled=True, profile_sample_rate=0.0, profile_slow_ms=1000.0):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_slow_ms = profile_slow_ms
+        self.cold_start = True
+        self.last = None
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        metrics = RequestMetrics(self.cold_start)
+        self.cold_start = False
+        g.request_metrics = metrics
+        g.request_metrics_token = current.set(metrics)
+        g.profiler = None
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def after_request(self, response):
+        metrics = g.get('request_metrics')
+        if metrics is not None:
+            g.response_status = response.status_code
+            g.response_bytes = 0 if response.is_streamed else len(response.get_data())
+        return response
+
+    def teardown_request(self, error=None):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return
+        current.reset(g.pop('request_metrics_token'))
+        latency_ms = (time.perf_counter() - metrics.started) * 1000
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if latency_ms >= self.profile_slow_ms:
+                self.log_profile(profiler, latency_ms)
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.get('response_status', 500)
+        lines = emf_lines(metrics, self.namespace, route, request.method, status,
+                          g.get('response_bytes', 0), latency_ms)
+        self.last = lines
+        if self.enabled:
+            for line in lines:
+                print(json.dumps(line, separators=(',', ':')))
+
+    def log_profile(self, profiler, latency_ms):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        print(f"Slow request profile ({latency_ms:.1f} ms) {request.method} {request.path}\n{out.getvalue()}")
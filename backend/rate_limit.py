@@ -0,0 +1,185 @@
+"""Per-IP and per-user request rate limits: in-process token buckets plus a shared DynamoDB sliding window"""
+import hmac
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+from flask import jsonify, request
+
+def parse_costs(text):
+    """``{'endpoint': cost}`` from 'generate_recipe=10,search_recipes=2'"""
+    costs = {}
+    for part in (text or '').split(','):
+        if '=' in part:
+            endpoint, cost = part.split('=', 1)
+            costs[endpoint.strip()] = float(cost)
+    return costs
+
+# CloudFront adds this header, with a secret value, to the requests it sends to the API origin
+PROXY_SECRET_HEADER = 'X-Origin-Verify'
+
+def client_ip(proxy_secret=''):
+    """The viewer's IP address for the current request.
+
+    Requests through CloudFront arrive from an edge server, so for those
+    the viewer is read from CloudFront-Viewer-Address, or else from the
+    X-Forwarded-For entry CloudFront appended (API Gateway appends the edge
+    server's address after it; anything further left came from the client
+    and is ignored). These headers are only believed when the request
+    carries ``proxy_secret``; otherwise it is the peer address.
+    """
+    remote = request.remote_addr or 'unknown'
+    sent = request.headers.get(PROXY_SECRET_HEADER, '')
+    if not proxy_secret or not hmac.compare_digest(sent.encode(), proxy_secret.encode()):
+        return remote
+    viewer = request.headers.get('CloudFront-Viewer-Address', '').strip()
+    if viewer:
+        # "<ip>:<port>", where an IPv6 address itself contains colons
+        return viewer.rsplit(':', 1)[0].strip('[]')
+    forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+    if forwarded and forwarded[-1] == remote:
+        forwarded.pop()
+    return forwarded[-1] if forwarded else remote
+
+class TokenBuckets:
+    """One token bucket per key (refill ``rate`` per second up to ``burst``), least recently used evicted"""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def take(self, key, cost, now=None):
+        """Spend ``cost`` tokens; returns 0 if allowed, otherwise seconds until it would be"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (min(cost, self.burst) - tokens) / self.rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+class SlidingWindow:
+    """Request cost per key over the last ``window`` seconds, shared by every container through DynamoDB.
+
+    Each key has one counter item per fixed window (expired by TTL). The
+    estimate weights the previous window by how much of it still overlaps
+    the sliding window. A finished window never changes, so its count is
+    read once and kept in memory: a check is normally a single UpdateItem.
+    """
+
+    def __init__(self, table, window, max_keys=10000):
+        self.table = table
+        self.window = window
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.finished = OrderedDict()
+
+    def _finished_count(self, key, index):
+        with self.lock:
+            count = self.finished.get((key, index))
+        if count is None:
+            item = self.table.get_item(Key={'limit_key': f'{key}#{index}'}).get('Item')
+            count = float(item['hits']) if item else 0.0
+            with self.lock:
+                self.finished[(key, index)] = count
+                if len(self.finished) > self.max_keys:
+                    self.finished.popitem(last=False)
+        return count
+
+    def hit(self, key, cost, limit, now=None):
+        """Record ``cost`` against ``key``; returns 0 if within ``limit``, otherwise seconds to wait"""
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+        elapsed = now - index * self.window
+        previous = self._finished_count(key, index - 1)
+        response = self.table.update_item(
+            Key={'limit_key': f'{key}#{index}'},
+            UpdateExpression='ADD hits :cost SET expires_at = if_not_exists(expires_at, :expires)',
+            ExpressionAttributeValues={':cost': int(math.ceil(cost)), ':expires': int((index + 2) * self.window)},
+            ReturnValues='UPDATED_NEW'
+        )
+        current = float(response['Attributes']['hits'])
+        overlap = 1 - elapsed / self.window
+        if previous * overlap + current <= limit:
+            return 0.0
+        # Wait for the previous window to slide out far enough, or failing that into the next window
+        if previous and current <= limit:
+            wait = (previous * overlap + current - limit) * self.window / previous
+            if wait <= self.window - elapsed:
+                return wait
+        return self.window - elapsed + max(0.0, (current - limit) * self.window / max(current, 1))
+
+class RateLimiter:
+    """Flask hook that rejects requests over their limits with 429 before the handler runs.
+
+    Every route has a cost (``costs`` by endpoint name, ``default_cost``
+    otherwise; 0 exempts it). Each request spends its cost from the client
+    IP's bucket and, when ``identify`` returns a username for it, that
+    user's bucket. Requests costing at least ``shared_min_cost`` are also
+    counted in the shared sliding window, so the limit holds across Lambda
+    containers. If the shared counter cannot be reached the request is let
+    through. Client IPs come from ``client_ip(proxy_secret)``.
+    """
+
+    def __init__(self, app, identify, ip_buckets, user_buckets, shared=None, costs=None, default_cost=1.0,
+                 shared_min_cost=5.0, shared_ip_limit=600, shared_user_limit=1200, enabled=True, proxy_secret=''):
+        self.identify = identify
+        self.ip_buckets = ip_buckets
+        self.user_buckets = user_buckets
+        self.shared = shared
+        self.costs = costs or {}
+        self.default_cost = default_cost
+        self.shared_min_cost = shared_min_cost
+        self.shared_ip_limit = shared_ip_limit
+        self.shared_user_limit = shared_user_limit
+        self.enabled = enabled
+        self.proxy_secret = proxy_secret
+        self.limited = 0
+        app.before_request(self.before_request)
+
+    def cost(self, endpoint):
+        if request.method == 'OPTIONS' or endpoint is None:
+            return 0.0
+        return self.costs.get(endpoint, self.default_cost)
+
+    def before_request(self):
+        if not self.enabled:
+            return None
+        cost = self.cost(request.endpoint)
+        if cost <= 0:
+            return None
+        ip = client_ip(self.proxy_secret)
+        username = self.identify()
+
+        wait = self.ip_buckets.take(f'ip:{ip}', cost)
+        if not wait and username:
+            wait = self.user_buckets.take(f'user:{username}', cost)
+        if not wait and self.shared is not None and cost >= self.shared_min_cost:
+            try:
+                wait = self.shared.hit(f'ip:{ip}', cost, self.shared_ip_limit)
+                if not wait and username:
+                    wait = self.shared.hit(f'user:{username}', cost, self.shared_user_limit)
+            except ClientError as e:
+                print(f"Rate limit store error: {e}")
+                wait = 0.0
+        if not wait:
+            return None
+
+        self.limited += 1
+        retry_after = max(1, int(math.ceil(wait)))
+        print(f"Rate limited {request.method} {request.path} for {username or ip} ({retry_after}s)")
+        response = jsonify({'message': 'Too many requests', 'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
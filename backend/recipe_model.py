@@ -0,0 +1,222 @@
+"""Compact in-memory recipes for the warm catalog cache: ``__slots__`` objects over pooled values.
+
+A recipe item from boto3 is a dict of ``Decimal`` numbers and freshly
+allocated strings, with a dict per ingredient line: about 6 KB per recipe.
+``CompactRecipe`` keeps the same data in one slotted object: whole numbers
+as ints, costs as integer cents, and every string, quantity, instruction
+step, instruction list and ingredient line shared through a ``ValuePool``,
+so a line such as ('Garlic', '2 cloves', ...) exists once however many
+recipes use it.
+
+It is a read-only ``Mapping`` that decodes back to the DynamoDB item
+format (``Decimal`` numbers, lists and dicts), so code written against
+items keeps working. The round trip is lossless up to number formatting:
+numbers come back in DynamoDB's normalised form (``Decimal('8.3')`` for a
+stored 8.30). Values of an unexpected type are kept as they are.
+"""
+import functools
+from collections.abc import Mapping
+from decimal import Decimal
+
+_MISSING = object()
+
+STRING_FIELDS = ('name', 'emoji', 'time', 'difficulty')
+INTEGER_FIELDS = ('time_minutes', 'servings')
+FIELDS = ('recipe_id', 'name', 'emoji', 'time', 'time_minutes', 'difficulty', 'servings', 'total_cost',
+          'ingredients', 'instructions')
+_FIELD_KEYS = frozenset(FIELDS)
+# Ingredient lines with only these attributes (any may be absent) are stored as pooled tuples
+INGREDIENT_FIELDS = ('name', 'amount', 'cost', 'ingredient_id', 'quantity', 'unit')
+_INGREDIENT_KEYS = frozenset(INGREDIENT_FIELDS)
+
+class ValuePool:
+    """One shared object per distinct value: equal strings, numbers and tuples are stored once.
+
+    There is a table per type, since ``2 == Decimal(2)`` but one must not
+    stand in for the other. Only needed while a catalog is being packed.
+    """
+
+    def __init__(self):
+        self.tables = {}
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    def __call__(self, value):
+        table = self.tables.get(type(value))
+        if table is None:
+            table = self.tables[type(value)] = {}
+        return table.setdefault(value, value)
+
+def _whole(value):
+    """int for a whole number, else _MISSING"""
+    if type(value) is int:
+        return value
+    if type(value) is not Decimal:
+        return _MISSING
+    try:
+        number = int(value)
+    except (ValueError, OverflowError):
+        return _MISSING
+    return number if number == value else _MISSING
+
+def _cents(value):
+    """Integer cents for an amount with at most two decimal places, else _MISSING"""
+    if type(value) is not int and type(value) is not Decimal:
+        return _MISSING
+    return _whole(value * 100)
+
+@functools.lru_cache(maxsize=65536)
+def _amount(cents):
+    return Decimal(cents) / 100
+
+def _pack_line(line, pool):
+    """An ingredient line as a pooled tuple in INGREDIENT_FIELDS order, or None if it does not fit one"""
+    if type(line) is not dict or not line.keys() <= _INGREDIENT_KEYS:
+        return None
+    name, amount, cost, ingredient_id, quantity, unit = [line.get(field, _MISSING) for field in INGREDIENT_FIELDS]
+    for text in (name, amount, ingredient_id, unit):
+        if text is not _MISSING and type(text) is not str:
+            return None
+    if cost is not _MISSING:
+        cost = _cents(cost)
+        if cost is _MISSING:
+            return None
+    if type(quantity) is int:
+        quantity = Decimal(quantity)
+    elif quantity is not _MISSING and type(quantity) is not Decimal:
+        return None
+    return pool(tuple(value if value is _MISSING else pool(value)
+                      for value in (name, amount, cost, ingredient_id, quantity, unit)))
+
+def _unpack_line(line):
+    unpacked = {}
+    for field, value in zip(INGREDIENT_FIELDS, line):
+        if value is not _MISSING:
+            unpacked[field] = _amount(value) if field == 'cost' else value
+    return unpacked
+
+class CompactRecipe(Mapping):
+    """One recipe in compact form; behaves like its DynamoDB item (read-only)"""
+    __slots__ = ('recipe_id', 'name', 'emoji', 'time', 'time_minutes', 'difficulty', 'servings', 'cost_cents',
+                 'ingredients', 'instructions', 'extra')
+
+    def __init__(self, item, pool):
+        extra = {field: value for field, value in item.items() if field not in _FIELD_KEYS}
+        self.recipe_id = _whole(item['recipe_id'])
+        if self.recipe_id is _MISSING:
+            raise ValueError(f'recipe_id must be a whole number: {item["recipe_id"]!r}')
+        self.name = self._string(item, 'name', pool, extra)
+        self.emoji = self._string(item, 'emoji', pool, extra)
+        self.time = self._string(item, 'time', pool, extra)
+        self.difficulty = self._string(item, 'difficulty', pool, extra)
+        self.time_minutes = self._number(item, 'time_minutes', _whole, pool, extra)
+        self.servings = self._number(item, 'servings', _whole, pool, extra)
+        self.cost_cents = self._number(item, 'total_cost', _cents, pool, extra)
+
+        value = item.get('ingredients', _MISSING)
+        lines = tuple(_pack_line(line, pool) for line in value) if type(value) is list else None
+        if lines is not None and None not in lines:
+            self.ingredients = pool(lines)
+        else:
+            self.ingredients = _MISSING
+            if value is not _MISSING:
+                extra['ingredients'] = value
+
+        value = item.get('instructions', _MISSING)
+        if type(value) is list and all(type(step) is str for step in value):
+            self.instructions = pool(tuple(pool(step) for step in value))
+        else:
+            self.instructions = _MISSING
+            if value is not _MISSING:
+                extra['instructions'] = value
+        self.extra = extra or None
+
+    @staticmethod
+    def _string(item, field, pool, extra):
+        value = item.get(field, _MISSING)
+        if type(value) is str:
+            return pool(value)
+        if value is not _MISSING:
+            extra[field] = value
+        return _MISSING
+
+    @staticmethod
+    def _number(item, field, convert, pool, extra):
+        value = item.get(field, _MISSING)
+        if value is _MISSING:
+            return value
+        number = convert(value)
+        if number is _MISSING:
+            extra[field] = value
+            return number
+        return pool(number)
+
+    def _value(self, key):
+        if key == 'recipe_id':
+            return Decimal(self.recipe_id)
+        if key in STRING_FIELDS:
+            if getattr(self, key) is not _MISSING:
+                return getattr(self, key)
+        elif key in INTEGER_FIELDS:
+            if getattr(self, key) is not _MISSING:
+                return Decimal(getattr(self, key))
+        elif key == 'total_cost':
+            if self.cost_cents is not _MISSING:
+                return _amount(self.cost_cents)
+        elif key == 'ingredients':
+            if self.ingredients is not _MISSING:
+                return [_unpack_line(line) for line in self.ingredients]
+        elif key == 'instructions':
+            if self.instructions is not _MISSING:
+                return list(self.instructions)
+        if self.extra is not None:
+            return self.extra.get(key, _MISSING)
+        return _MISSING
+
+    def _has(self, key):
+        if key == 'recipe_id':
+            return True
+        if key == 'total_cost':
+            present = self.cost_cents is not _MISSING
+        elif key in FIELDS:
+            present = getattr(self, key) is not _MISSING
+        else:
+            present = False
+        return present or (self.extra is not None and key in self.extra)
+
+    def __getitem__(self, key):
+        value = self._value(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._has(key)
+
+    def __iter__(self):
+        for field in FIELDS:
+            if self._has(field):
+                yield field
+        if self.extra is not None:
+            for field in self.extra:
+                if field not in FIELDS:
+                    yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'CompactRecipe({self.to_item()!r})'
+
+    def to_item(self):
+        """The recipe as a DynamoDB item dict"""
+        return {field: self[field] for field in self}
+
+def compact_recipe(item, pool):
+    """``item`` as a CompactRecipe sharing values through ``pool`` (already compact recipes are kept)"""
+    return item if isinstance(item, CompactRecipe) else CompactRecipe(item, pool)
+
+def recipe_item(recipe):
+    """A plain dict for a recipe that may be compact"""
+    return recipe.to_item() if isinstance(recipe, CompactRecipe) else recipe
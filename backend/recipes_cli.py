@@ -0,0 +1,431 @@
+"""Bulk import and export of the recipes table.
+
+    python recipes_cli.py import recipes.ndjson [--format csv] [--workers 16] [--allocate-ids]
+    python recipes_cli.py export recipes.ndjson [--segments 8] [--format csv]
+
+Import streams NDJSON (one recipe object per line) or CSV (nested fields as
+JSON text) through a bounded queue into concurrent BatchWriteItem calls,
+retrying unprocessed items. Invalid records go to ``<input>.rejects.ndjson``
+instead of stopping the run. Export runs a parallel Scan, one worker per
+segment, with each segment streaming to its own part file; the parts are
+joined at the end, so the table is never held in memory.
+
+Both commands checkpoint to ``<file>.checkpoint.json`` and pick up where
+they left off when rerun with the same arguments (``--restart`` ignores the
+checkpoint). Imported recipes keep their ``recipe_id``, so rewriting the
+few batches that were in flight at a crash is harmless; with
+``--allocate-ids`` records without one get a fresh id from the shared counter
+(which the import advances past its highest explicit id), and those may be
+written twice if the run is resumed.
+Set DYNAMODB_BACKEND=local to try either against the in-memory stand-in.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+import app as api
+
+CSV_FIELDS = ['recipe_id', 'name', 'emoji', 'time', 'difficulty', 'servings', 'total_cost',
+              'ingredients', 'instructions']
+JSON_FIELDS = ('ingredients', 'instructions')
+CHECKPOINT_INTERVAL = 2.0
+PROGRESS_INTERVAL = 1.0
+
+# ============= SHARED =============
+
+class Checkpoint:
+    """JSON progress file replaced atomically, so a crash never leaves it half written"""
+
+    def __init__(self, path, identity):
+        self.path = path
+        self.identity = identity
+
+    def load(self):
+        """Saved state if it belongs to the same job, else None"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f, parse_float=Decimal)
+        except (OSError, ValueError):
+            return None
+        return state if state.get('job') == self.identity else None
+
+    def save(self, state):
+        temp = f'{self.path}.tmp'
+        with open(temp, 'w') as f:
+            json.dump(dict(state, job=self.identity), f, default=api.json_default)
+        os.replace(temp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class Progress:
+    """Throttled one-line progress report on stderr"""
+
+    def __init__(self, label, total_bytes=None, quiet=False):
+        self.label = label
+        self.total_bytes = total_bytes
+        self.quiet = quiet
+        self.started = time.monotonic()
+        self.last = 0.0
+
+    def report(self, count, done_bytes=None, force=False, extra=''):
+        now = time.monotonic()
+        if self.quiet or (not force and now - self.last < PROGRESS_INTERVAL):
+            return
+        self.last = now
+        rate = count / max(now - self.started, 1e-9)
+        line = f'{self.label} {count:,} recipes ({rate:,.0f}/s)'
+        if self.total_bytes and done_bytes is not None:
+            share = done_bytes / self.total_bytes
+            line += f' {100 * share:.1f}%'
+            if 0 < share < 1:
+                line += f' eta {(now - self.started) * (1 - share) / share:.0f}s'
+        print(f'\r{line}{extra}', end='\n' if force else '', file=sys.stderr, flush=True)
+
+# ============= IMPORT =============
+
+def _number(value, field, kind=Decimal):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'{field} must be a number')
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'{field} must be a number')
+    if not number.is_finite() or number < 0:
+        raise ValueError(f'{field} must be a non-negative number')
+    if kind is int:
+        if number != number.to_integral_value():
+            raise ValueError(f'{field} must be a whole number')
+        return int(number)
+    return number
+
+def validate_recipe(record, allocate_ids=False):
+    """Clean copy of an imported recipe ready for DynamoDB; raises ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+    recipe = {k: v for k, v in record.items() if v is not None and v != ''}
+    for field in JSON_FIELDS:
+        if isinstance(recipe.get(field), str):
+            try:
+                recipe[field] = json.loads(recipe[field], parse_float=Decimal)
+            except ValueError:
+                raise ValueError(f'{field} is not valid JSON')
+
+    recipe_id = _number(recipe.get('recipe_id'), 'recipe_id', int)
+    if recipe_id is None and not allocate_ids:
+        raise ValueError('recipe_id required (or pass --allocate-ids)')
+    if recipe_id is not None:
+        if recipe_id < 1:
+            raise ValueError('recipe_id must be positive')
+        recipe['recipe_id'] = recipe_id
+    if not isinstance(recipe.get('name'), str) or not recipe['name'].strip():
+        raise ValueError('name required')
+    for field, kind in (('servings', int), ('total_cost', Decimal), ('time_minutes', int)):
+        if field in recipe:
+            recipe[field] = _number(recipe[field], field, kind)
+    if recipe.get('servings') == 0:
+        raise ValueError('servings must be positive')
+
+    ingredients = recipe.get('ingredients', [])
+    if not isinstance(ingredients, list) or not all(isinstance(i, dict) and i.get('name') for i in ingredients):
+        raise ValueError('ingredients must be a list of objects with a name')
+    for ingredient in ingredients:
+        if 'cost' in ingredient:
+            ingredient['cost'] = _number(ingredient['cost'], 'ingredient cost')
+    instructions = recipe.get('instructions', [])
+    if not isinstance(instructions, list) or not all(isinstance(step, str) for step in instructions):
+        raise ValueError('instructions must be a list of strings')
+    return api.prepare_recipe(recipe)
+
+def read_records(f, fmt, start_offset):
+    """``(record, end_offset)`` for every record from ``start_offset``; bad JSON yields a ValueError"""
+    def lines():
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            yield line.decode('utf-8')
+
+    if fmt == 'csv':
+        header = next(csv.reader([f.readline().decode('utf-8-sig')]))
+        if start_offset:
+            f.seek(start_offset)
+        for row in csv.reader(lines()):
+            if row:
+                yield dict(zip(header, row)), f.tell()
+        return
+
+    f.seek(start_offset)
+    for line in lines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line, parse_float=Decimal)
+        except ValueError as e:
+            record = ValueError(f'invalid JSON: {e}')
+        yield record, f.tell()
+
+def import_recipes(path, fmt='ndjson', workers=16, allocate_ids=False, restart=False, quiet=False):
+    """Load a file of recipes into the recipes table; returns ``(written, rejected)``"""
+    table_name = api.recipes_table.name
+    size = os.path.getsize(path)
+    checkpoint = Checkpoint(f'{path}.checkpoint.json',
+                            {'command': 'import', 'source': os.path.abspath(path), 'size': size, 'table': table_name})
+    state = None if restart else checkpoint.load()
+    if restart:
+        checkpoint.clear()
+    state = state or {'offset': 0, 'written': 0, 'rejected': 0, 'rejects_offset': 0, 'highest_id': 0}
+    if state['offset'] and not quiet:
+        print(f'Resuming {path} at byte {state["offset"]:,} ({state["written"]:,} already written)', file=sys.stderr)
+
+    chunks = queue.Queue(maxsize=workers * 4)
+    lock = threading.Lock()
+    pending = {}
+    finished = set()
+    failures = []
+    progress = Progress('imported', size, quiet)
+    counts = {'written': state['written'], 'rejected': state['rejected'], 'next_commit': 0,
+              'last_save': time.monotonic()}
+
+    def commit(seq):
+        # Only the contiguous prefix of finished chunks is durable enough to resume after
+        with lock:
+            finished.add(seq)
+            while counts['next_commit'] in finished:
+                done = counts['next_commit']
+                finished.discard(done)
+                end_offset, written, highest, rejected, rejects_offset = pending.pop(done)
+                state['offset'] = end_offset
+                state['written'] += written
+                state['rejected'] += rejected
+                state['rejects_offset'] = rejects_offset
+                state['highest_id'] = max(state['highest_id'], highest)
+                counts['next_commit'] += 1
+            if time.monotonic() - counts['last_save'] >= CHECKPOINT_INTERVAL:
+                checkpoint.save(state)
+                counts['last_save'] = time.monotonic()
+
+    def worker():
+        while True:
+            job = chunks.get()
+            if job is None:
+                return
+            seq, requests = job
+            if failures:
+                # Leave the rest uncommitted so a rerun resumes before them
+                continue
+            try:
+                if requests:
+                    api.batch_write(table_name, requests)
+                with lock:
+                    counts['written'] += len(requests)
+                commit(seq)
+            except Exception as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    rejects_path = f'{path}.rejects.ndjson'
+    rejects = open(rejects_path, 'a' if state['offset'] else 'w')
+    if state.get('rejects_offset') is not None:
+        # Rejects past the checkpoint came from records this run reads again
+        rejects.truncate(state['rejects_offset'])
+    seq = 0
+    try:
+        with open(path, 'rb') as f:
+            batch, highest, rejected, end_offset = {}, 0, 0, state['offset']
+
+            def flush():
+                nonlocal seq, batch, highest, rejected
+                # The checkpoint may only point at rejects that are already in the file
+                rejects.flush()
+                with lock:
+                    pending[seq] = (end_offset, len(batch), highest, rejected, rejects.tell())
+                # Ids are unique within a batch: a later duplicate line wins, as it would across batches
+                chunks.put((seq, [{'PutRequest': {'Item': item}} for item in batch.values()]))
+                seq += 1
+                batch, highest, rejected = {}, 0, 0
+
+            for record, end_offset in read_records(f, fmt, state['offset']):
+                if failures:
+                    break
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    recipe = validate_recipe(record, allocate_ids)
+                    if 'recipe_id' not in recipe:
+                        recipe['recipe_id'] = api.recipe_ids.allocate()
+                    batch[recipe['recipe_id']] = recipe
+                    highest = max(highest, recipe['recipe_id'])
+                except ValueError as e:
+                    rejected += 1
+                    counts['rejected'] += 1
+                    rejects.write(json.dumps({'error': str(e), 'offset': end_offset,
+                                              'record': record if isinstance(record, dict) else None},
+                                             default=api.json_default) + '\n')
+                if len(batch) == api.BATCH_WRITE_MAX_ITEMS:
+                    flush()
+                progress.report(counts['written'], end_offset, extra=f', {counts["rejected"]:,} rejected')
+            # Also commits the offset past trailing rejected records
+            flush()
+    finally:
+        for _ in threads:
+            chunks.put(None)
+        for thread in threads:
+            thread.join()
+        rejects.close()
+        with lock:
+            checkpoint.save(state)
+
+    if failures:
+        raise failures[0]
+    if state['highest_id']:
+        api.recipe_ids.advance(state['highest_id'])
+    progress.report(state['written'], size, force=True, extra=f', {state["rejected"]:,} rejected')
+    checkpoint.clear()
+    if not state['rejected']:
+        os.remove(rejects_path)
+    elif not quiet:
+        print(f'Rejected records written to {rejects_path}', file=sys.stderr)
+    return state['written'], state['rejected']
+
+# ============= EXPORT =============
+
+def csv_line(item):
+    out = io.StringIO()
+    row = {k: item.get(k, '') for k in CSV_FIELDS}
+    for field in JSON_FIELDS:
+        row[field] = json.dumps(row[field] or [], default=api.json_default, ensure_ascii=False)
+    csv.DictWriter(out, CSV_FIELDS, extrasaction='ignore', lineterminator='\n').writerow(
+        {k: api.json_default(v) if isinstance(v, Decimal) else v for k, v in row.items()})
+    return out.getvalue()
+
+def ndjson_line(item):
+    return json.dumps(item, default=api.json_default, ensure_ascii=False) + '\n'
+
+def export_recipes(path, fmt='ndjson', segments=8, restart=False, quiet=False):
+    """Write every recipe to ``path`` with a parallel scan; returns the number exported"""
+    table_name = api.recipes_table.name
+    checkpoint = Checkpoint(f'{path}.checkpoint.json',
+                            {'command': 'export', 'table': table_name, 'segments': segments, 'format': fmt})
+    state = None if restart else checkpoint.load()
+    if state is None:
+        checkpoint.clear()
+        state = {'parts': {str(n): {'last_key': None, 'done': False, 'bytes': 0, 'items': 0}
+                           for n in range(segments)}}
+    elif not quiet:
+        print(f'Resuming export to {path} ({sum(p["items"] for p in state["parts"].values()):,} already written)',
+              file=sys.stderr)
+
+    encode = csv_line if fmt == 'csv' else ndjson_line
+    lock = threading.Lock()
+    progress = Progress('exported', quiet=quiet)
+    last_save = [time.monotonic()]
+
+    def scan_segment(segment):
+        part = state['parts'][str(segment)]
+        part_path = f'{path}.part{segment}'
+        if part['done']:
+            return
+        with open(part_path, 'ab') as out:
+            # Anything after the last checkpoint was written by a run that did not finish
+            out.truncate(part['bytes'])
+            kwargs = {'Segment': segment, 'TotalSegments': segments}
+            if part['last_key'] is not None:
+                kwargs['ExclusiveStartKey'] = part['last_key']
+            while True:
+                response = api.recipes_table.scan(**kwargs)
+                data = ''.join(encode(item) for item in response['Items']).encode('utf-8')
+                out.write(data)
+                out.flush()
+                last_key = response.get('LastEvaluatedKey')
+                with lock:
+                    part['bytes'] += len(data)
+                    part['items'] += len(response['Items'])
+                    part['last_key'] = last_key
+                    part['done'] = last_key is None
+                    if part['done'] or time.monotonic() - last_save[0] >= CHECKPOINT_INTERVAL:
+                        checkpoint.save(state)
+                        last_save[0] = time.monotonic()
+                    progress.report(sum(p['items'] for p in state['parts'].values()))
+                if last_key is None:
+                    return
+                kwargs['ExclusiveStartKey'] = last_key
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        list(pool.map(scan_segment, range(segments)))
+
+    total = sum(p['items'] for p in state['parts'].values())
+    temp = f'{path}.tmp'
+    with open(temp, 'wb') as out:
+        if fmt == 'csv':
+            out.write((','.join(CSV_FIELDS) + '\n').encode('utf-8'))
+        for segment in range(segments):
+            part_path = f'{path}.part{segment}'
+            with open(part_path, 'rb') as part:
+                while True:
+                    block = part.read(1 << 20)
+                    if not block:
+                        break
+                    out.write(block)
+    os.replace(temp, path)
+    for segment in range(segments):
+        os.remove(f'{path}.part{segment}')
+    checkpoint.clear()
+    progress.report(total, force=True)
+    return total
+
+# ============= CLI =============
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('import', help='load recipes from NDJSON or CSV')
+    load.add_argument('path')
+    load.add_argument('--format', choices=['ndjson', 'csv'], help='default: from the file extension')
+    load.add_argument('--workers', type=int, default=16, help='concurrent BatchWriteItem calls')
+    load.add_argument('--allocate-ids', action='store_true', help='give records without recipe_id a new id')
+    load.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    load.add_argument('--quiet', action='store_true')
+
+    dump = commands.add_parser('export', help='write every recipe to NDJSON or CSV')
+    dump.add_argument('path')
+    dump.add_argument('--format', choices=['ndjson', 'csv'], help='default: from the file extension')
+    dump.add_argument('--segments', type=int, default=8, help='parallel scan segments')
+    dump.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    dump.add_argument('--quiet', action='store_true')
+
+    args = parser.parse_args(argv)
+    fmt = detect_format(args.path, args.format)
+    started = time.monotonic()
+    if args.command == 'import':
+        written, rejected = import_recipes(args.path, fmt, args.workers, args.allocate_ids, args.restart, args.quiet)
+        print(f'Imported {written:,} recipes ({rejected:,} rejected) in {time.monotonic() - started:.1f}s')
+        return 1 if rejected else 0
+    total = export_recipes(args.path, fmt, args.segments, args.restart, args.quiet)
+    print(f'Exported {total:,} recipes to {args.path} in {time.monotonic() - started:.1f}s')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""Ingredient-similarity recommendations: sparse recipe vectors and cached top-K nearest neighbours"""
+import bisect
+import heapq
+import itertools
+import math
+import threading
+import time
+from array import array
+
+from listing_index import parse_minutes, to_cents
+from shopping_list import ingredient_id
+
+# Attribute features (difficulty, time, cost) count for less than a shared ingredient of the same rarity
+ATTRIBUTE_WEIGHT = 0.5
+# Bucket upper bounds for cooking time (minutes) and cost per serving (cents)
+TIME_BUCKETS = (15, 30, 45, 60, 90)
+COST_BUCKETS = (150, 300, 500, 800, 1200)
+
+def recipe_features(recipe):
+    """Binary features of a recipe: its ingredients plus difficulty, time and cost-per-serving buckets"""
+    names = set()
+    for line in recipe.get('ingredients') or []:
+        key = line.get('ingredient_id') or ingredient_id(line.get('name', ''))
+        if key:
+            names.add(f'ingredient:{key}')
+    difficulty = str(recipe.get('difficulty') or '').strip().lower()
+    if difficulty:
+        names.add(f'difficulty:{difficulty}')
+    minutes = recipe.get('time_minutes')
+    minutes = int(minutes) if minutes is not None else parse_minutes(recipe.get('time'))
+    if minutes is not None:
+        names.add(f'time:{bisect.bisect_left(TIME_BUCKETS, minutes)}')
+    cents = to_cents(recipe.get('total_cost'))
+    if cents is not None:
+        servings = recipe.get('servings')
+        per_serving = cents / (int(servings) if servings else 1)
+        names.add(f'cost:{bisect.bisect_left(COST_BUCKETS, per_serving)}')
+    return names
+
+class RecipeSimilarityIndex:
+    """Cosine similarity between TF-IDF weighted feature vectors, with a top-K neighbour list per recipe.
+
+    Features are binary, so a recipe is stored as its feature names and
+    vector norm, and ``postings`` map each feature to the recipes that have
+    it. Neighbours are scored exactly over at most ``max_candidates``
+    recipes: those sharing the recipe's rarest features, then those sharing
+    pairs of its common ones (looking at no more than ``max_scan`` recipes
+    per pair), so computing a list has a bounded cost at any catalog size.
+    Lists are precomputed by ``precompute`` during warm-up, or computed on
+    first lookup if it has not reached them yet (a few milliseconds rather
+    than a memory read), and then served from memory.
+
+    ``sync``/``add`` update one recipe at a time: its postings, its own list
+    and the cached lists it enters or leaves. Feature weights are fixed at
+    the last full rebuild, which happens once changes since then exceed
+    ``rebuild_fraction`` of the catalog.
+    """
+
+    def __init__(self, k=20, max_candidates=1000, max_pairs=4, max_scan=None, rebuild_fraction=0.2):
+        self.k = k
+        self.max_candidates = max_candidates
+        self.max_pairs = max_pairs
+        self.max_scan = max_scan or 32 * max_candidates
+        self.rebuild_fraction = rebuild_fraction
+        self.lock = threading.RLock()
+        self.names = {}
+        self.docs = {}
+        self.postings = {}
+        self.weights = {}
+        self.top = {}
+        self.built_size = 0
+        self.changes = 0
+        self.rebuilds = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.docs
+
+    def _features(self, recipe):
+        return tuple(sorted(self.names.setdefault(name, name) for name in recipe_features(recipe)))
+
+    def _weight(self, feature):
+        """Squared weight of a feature: its IDF at the last rebuild, scaled down for attributes"""
+        weight = self.weights.get(feature)
+        if weight is None:
+            count = len(self.postings.get(feature, ())) or 1
+            idf = math.log((1 + self.built_size) / (1 + count)) + 1
+            scale = 1.0 if feature.startswith('ingredient:') else ATTRIBUTE_WEIGHT
+            weight = self.weights[feature] = (idf * scale) ** 2
+        return weight
+
+    def _norm(self, features):
+        return math.sqrt(sum(self._weight(f) for f in features))
+
+    def _rebuild(self, features):
+        """Recompute weights and postings for ``{recipe_id: features}`` and drop every cached list"""
+        postings = {}
+        for recipe_id, names in features.items():
+            for name in names:
+                postings.setdefault(name, set()).add(recipe_id)
+        self.postings = postings
+        self.built_size = len(features)
+        self.weights = {}
+        self.docs = {rid: (names, self._norm(names)) for rid, names in features.items() if names}
+        self.top = {}
+        self.changes = 0
+        self.rebuilds += 1
+
+    def _scores(self, recipe_id, features):
+        """``{other_id: similarity}`` over the candidate neighbours of a recipe with ``features``"""
+        if not features:
+            return {}
+        ranked = sorted(features, key=lambda f: len(self.postings.get(f, ())))
+        candidates = set()
+        taken = 0
+        for name in ranked:
+            posting = self.postings.get(name, ())
+            if len(candidates) + len(posting) > self.max_candidates:
+                break
+            candidates |= posting
+            taken += 1
+        # Common features left: add recipes sharing one of the ``max_pairs`` heaviest pairs of them while there
+        # is room, narrowing a pair shared by too many to those also sharing the next rarest features
+        common = ranked[taken:]
+        pairs = sorted(itertools.combinations(common, 2), key=lambda p: -self._weight(p[0]) - self._weight(p[1]))
+        for first, second in pairs[:self.max_pairs]:
+            room = self.max_candidates - len(candidates)
+            if room <= 0:
+                break
+            smaller, larger = sorted((self.postings[first], self.postings[second]), key=len)
+            if len(smaller) > self.max_scan:
+                smaller = itertools.islice(smaller, self.max_scan)
+            shared = larger.intersection(smaller)
+            for name in common:
+                if len(shared) <= room:
+                    break
+                if name != first and name != second:
+                    shared = shared & self.postings[name] or shared
+            candidates.update(shared if len(shared) <= room else itertools.islice(shared, room))
+        candidates.discard(recipe_id)
+
+        dots = dict.fromkeys(candidates, 0.0)
+        for name in ranked:
+            weight = self._weight(name)
+            for other in candidates.intersection(self.postings.get(name, ())):
+                dots[other] += weight
+        norm = self._norm(features)
+        return {other: dot / (norm * self.docs[other][1]) for other, dot in dots.items()}
+
+    def _similarity(self, a, b):
+        if a not in self.docs or b not in self.docs:
+            return 0.0
+        (features_a, norm_a), (features_b, norm_b) = self.docs[a], self.docs[b]
+        shared = set(features_a).intersection(features_b)
+        return sum(self._weight(f) for f in shared) / (norm_a * norm_b)
+
+    def _store(self, recipe_id, scores):
+        best = heapq.nlargest(self.k, ((score, -other) for other, score in scores.items() if score > 0))
+        self.top[recipe_id] = (array('l', [-negated for _, negated in best]), array('f', [s for s, _ in best]))
+
+    def _revise(self, recipe_id, changed_id, score):
+        """Move ``changed_id`` to its new place in the cached list of ``recipe_id``"""
+        entry = self.top.get(recipe_id)
+        if entry is None:
+            return
+        ids, sims = list(entry[0]), list(entry[1])
+        if score is None:
+            score = self._similarity(recipe_id, changed_id)
+        if changed_id in ids:
+            if len(ids) == self.k and score < sims[-1]:
+                # It may have dropped below recipes the list never kept: recompute on the next lookup
+                del self.top[recipe_id]
+                return
+            position = ids.index(changed_id)
+            del ids[position], sims[position]
+        if score > 0 and (len(ids) < self.k or score > sims[-1]):
+            position = bisect.bisect_left([-s for s in sims], -score)
+            ids.insert(position, changed_id)
+            sims.insert(position, score)
+            del ids[self.k:], sims[self.k:]
+        self.top[recipe_id] = (array('l', ids), array('f', sims))
+
+    def _put(self, recipe_id, features):
+        """Replace (or, with no features, remove) one recipe and revise the cached lists it affects"""
+        old = self.docs.get(recipe_id)
+        if (old[0] if old else ()) == features:
+            return
+        affected = set(self._scores(recipe_id, old[0])) if old else set()
+        if old:
+            for name in old[0]:
+                posting = self.postings[name]
+                posting.discard(recipe_id)
+                if not posting:
+                    del self.postings[name]
+        self.top.pop(recipe_id, None)
+        if features:
+            for name in features:
+                self.postings.setdefault(name, set()).add(recipe_id)
+            self.docs[recipe_id] = (features, self._norm(features))
+        else:
+            self.docs.pop(recipe_id, None)
+        self.changes += 1
+
+        scores = self._scores(recipe_id, features)
+        if features:
+            self._store(recipe_id, scores)
+        for other in affected | scores.keys():
+            self._revise(other, recipe_id, scores.get(other, 0.0 if not features else None))
+
+    def add(self, recipe):
+        """Index a recipe, replacing any earlier version with the same id"""
+        with self.lock:
+            self._put(int(recipe['recipe_id']), self._features(recipe))
+            if self.changes > self.rebuild_fraction * max(self.built_size, 1):
+                self._rebuild({rid: names for rid, (names, _) in self.docs.items()})
+
+    def remove(self, recipe_id):
+        with self.lock:
+            self._put(int(recipe_id), ())
+
+    def sync(self, recipes):
+        """Bring the index in line with a full catalog: one recipe at a time, or a rebuild if much changed"""
+        with self.lock:
+            current = {int(r['recipe_id']): self._features(r) for r in recipes}
+            changed = [rid for rid, names in current.items() if self.docs.get(rid, ((),))[0] != names]
+            removed = [rid for rid in self.docs if rid not in current]
+            pending = self.changes + len(changed) + len(removed)
+            if self.rebuilds == 0 or pending > self.rebuild_fraction * max(len(current), 1):
+                self._rebuild(current)
+                return
+            for recipe_id in removed:
+                self._put(recipe_id, ())
+            for recipe_id in changed:
+                self._put(recipe_id, current[recipe_id])
+
+    def similar(self, recipe_id, limit=None):
+        """``[(recipe_id, similarity)]`` most similar first, computing and caching the list if needed"""
+        with self.lock:
+            entry = self.top.get(recipe_id)
+            if entry is None:
+                if recipe_id not in self.docs:
+                    return []
+                self._store(recipe_id, self._scores(recipe_id, self.docs[recipe_id][0]))
+                entry = self.top[recipe_id]
+            # A list can still name a removed recipe that did not look related to it when it was removed
+            return [(rid, score) for rid, score in zip(*entry) if rid in self.docs][:limit]
+
+    def recommend(self, seeds, limit, exclude=()):
+        """``[(recipe_id, score)]`` blending the neighbours of weighted ``seeds`` (``[(recipe_id, weight)]``)"""
+        scores = {}
+        for seed, weight in seeds:
+            for other, similarity in self.similar(seed):
+                scores[other] = scores.get(other, 0.0) + weight * similarity
+        excluded = set(exclude) | {seed for seed, _ in seeds}
+        return heapq.nlargest(limit, ((rid, score) for rid, score in scores.items() if rid not in excluded),
+                              key=lambda item: (item[1], -item[0]))
+
+    def precompute(self, recipe_ids=None, deadline=None):
+        """Fill the cached lists of ``recipe_ids`` (default: all recipes) until ``deadline`` (``time.monotonic``)"""
+        computed = 0
+        for recipe_id in (list(self.docs) if recipe_ids is None else recipe_ids):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            with self.lock:
+                if recipe_id in self.top or recipe_id not in self.docs:
+                    continue
+            self.similar(recipe_id)
+            computed += 1
+        return computed
+
+    def stats(self):
+        with self.lock:
+            return {
+                'recipes': len(self.docs),
+                'features': len(self.postings),
+                'cached_lists': len(self.top),
+                'changes_since_rebuild': self.changes,
+                'rebuilds': self.rebuilds
+            }
@@ -0,0 +1,171 @@
+"""In-memory inverted index over recipe names and ingredients"""
+import math
+import re
+import threading
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Relative weight of a token depending on where in the recipe it appears
+NAME_WEIGHT = 3.0
+INGREDIENT_WEIGHT = 1.0
+
+# Score multipliers for the different ways a query term can match a token
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.6
+FUZZY_MATCH = 0.4
+
+def tokenize(text):
+    """Lowercase word tokens of a piece of text"""
+    return TOKEN_RE.findall(str(text).lower())
+
+def _deletes(token):
+    """Every variant of ``token`` with one character removed"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+class RecipeSearchIndex:
+    """Token, prefix and typo-tolerant lookup of recipes.
+
+    Postings map each token to ``{recipe_id: weight}``. Prefixes of every
+    token are indexed for type-ahead, and single-character deletions of
+    longer tokens give edit-distance-1 matches without scanning the
+    vocabulary. Recipes can be added, replaced and removed one at a time.
+    """
+
+    def __init__(self, min_prefix=1, fuzzy_min_length=4):
+        self.min_prefix = min_prefix
+        self.fuzzy_min_length = fuzzy_min_length
+        self.lock = threading.RLock()
+        self.postings = {}
+        self.prefixes = {}
+        self.deletes = {}
+        self.documents = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def export_postings(self):
+        """Copy of the postings, ``{token: {recipe_id: weight}}``, for building static search shards"""
+        with self.lock:
+            return {token: dict(postings) for token, postings in self.postings.items()}
+
+    @staticmethod
+    def fingerprint(recipe):
+        """The parts of a recipe the index depends on"""
+        names = tuple(i.get('name', '') for i in recipe.get('ingredients') or [])
+        return (recipe.get('name', ''), names)
+
+    def _weights(self, recipe):
+        weights = {}
+        for token in tokenize(recipe.get('name', '')):
+            weights[token] = weights.get(token, 0.0) + NAME_WEIGHT
+        for ingredient in recipe.get('ingredients') or []:
+            for token in tokenize(ingredient.get('name', '')):
+                weights[token] = weights.get(token, 0.0) + INGREDIENT_WEIGHT
+        return weights
+
+    def _add_token(self, token):
+        for end in range(self.min_prefix, len(token) + 1):
+            self.prefixes.setdefault(token[:end], set()).add(token)
+        if len(token) >= self.fuzzy_min_length:
+            self.deletes.setdefault(token, set()).add(token)
+            for variant in _deletes(token):
+                self.deletes.setdefault(variant, set()).add(token)
+
+    def _drop_token(self, token):
+        for end in range(self.min_prefix, len(token) + 1):
+            tokens = self.prefixes.get(token[:end])
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self.prefixes[token[:end]]
+        if len(token) >= self.fuzzy_min_length:
+            for variant in _deletes(token) | {token}:
+                tokens = self.deletes.get(variant)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.deletes[variant]
+
+    def add(self, recipe):
+        """Index a recipe, replacing any earlier version with the same id"""
+        recipe_id = int(recipe['recipe_id'])
+        with self.lock:
+            fingerprint = self.fingerprint(recipe)
+            current = self.documents.get(recipe_id)
+            if current and current[0] == fingerprint:
+                return
+            self.remove(recipe_id)
+            weights = self._weights(recipe)
+            for token, weight in weights.items():
+                if token not in self.postings:
+                    self.postings[token] = {}
+                    self._add_token(token)
+                self.postings[token][recipe_id] = weight
+            self.documents[recipe_id] = (fingerprint, tuple(weights))
+
+    def remove(self, recipe_id):
+        """Remove a recipe from the index if it is present"""
+        with self.lock:
+            current = self.documents.pop(int(recipe_id), None)
+            if not current:
+                return
+            for token in current[1]:
+                postings = self.postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(int(recipe_id), None)
+                if not postings:
+                    del self.postings[token]
+                    self._drop_token(token)
+
+    def sync(self, recipes):
+        """Bring the index in line with a full catalog, touching only changed recipes"""
+        with self.lock:
+            seen = set()
+            for recipe in recipes:
+                seen.add(int(recipe['recipe_id']))
+                self.add(recipe)
+            for recipe_id in [rid for rid in self.documents if rid not in seen]:
+                self.remove(recipe_id)
+
+    def _candidates(self, term):
+        """Tokens that ``term`` matches, with the match multiplier for each"""
+        matches = {}
+        for token in self.prefixes.get(term, ()):
+            matches[token] = EXACT_MATCH if token == term else PREFIX_MATCH
+        if len(term) >= self.fuzzy_min_length:
+            fuzzy = set(self.deletes.get(term, ()))
+            for variant in _deletes(term):
+                fuzzy.update(self.deletes.get(variant, ()))
+                if variant in self.postings:
+                    fuzzy.add(variant)
+            for token in fuzzy:
+                if abs(len(token) - len(term)) <= 1:
+                    matches.setdefault(token, FUZZY_MATCH)
+        return matches
+
+    def search(self, query, limit=None):
+        """Ranked ``[(recipe_id, score)]`` of recipes matching every query term"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            total = len(self.documents) or 1
+            scores = None
+            for term in dict.fromkeys(terms):
+                term_scores = {}
+                for token, factor in self._candidates(term).items():
+                    postings = self.postings[token]
+                    idf = math.log(1 + total / len(postings))
+                    for recipe_id, weight in postings.items():
+                        score = weight * factor * idf
+                        if score > term_scores.get(recipe_id, 0.0):
+                            term_scores[recipe_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {rid: s + term_scores[rid] for rid, s in scores.items() if rid in term_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,267 @@
+"""Normalised ingredient quantities and shopping-list aggregation over many recipes"""
+import re
+import threading
+from array import array
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Base units: grams for mass, millilitres for volume, a counted noun ('each', 'clove', ...) otherwise
+MASS_UNITS = {'g': 1, 'gram': 1, 'grams': 1, 'kg': 1000, 'kilogram': 1000, 'kilograms': 1000, 'mg': Decimal('0.001'),
+              'oz': Decimal('28.35'), 'lb': Decimal('453.6'), 'lbs': Decimal('453.6')}
+VOLUME_UNITS = {'ml': 1, 'millilitre': 1, 'millilitres': 1, 'l': 1000, 'litre': 1000, 'litres': 1000,
+                'liter': 1000, 'liters': 1000, 'tsp': 5, 'teaspoon': 5, 'teaspoons': 5, 'tbsp': 15,
+                'tablespoon': 15, 'tablespoons': 15, 'cup': 250, 'cups': 250}
+# Words that describe a whole item rather than a unit of it
+EACH_WORDS = {'', 'each', 'piece', 'pieces', 'large', 'medium', 'small', 'whole', 'x'}
+IRREGULAR_PLURALS = {'leaves': 'leaf', 'loaves': 'loaf', 'halves': 'half', 'knives': 'knife',
+                     'boerewors': 'boerewors', 'wors': 'wors'}
+FRACTIONS = {'½': Decimal('0.5'), '¼': Decimal('0.25'), '¾': Decimal('0.75'),
+             '⅓': Decimal(1) / 3, '⅔': Decimal(2) / 3}
+
+NUMBER = r'(?:\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|[½¼¾⅓⅔])'
+AMOUNT_RE = re.compile(rf'^\s*({NUMBER})(?:\s*(?:-|to)\s*({NUMBER}))?\s*([a-z]*)', re.IGNORECASE)
+SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+CENT = Decimal('0.01')
+
+def _number(text):
+    text = text.strip()
+    if text in FRACTIONS:
+        return FRACTIONS[text]
+    if '/' in text:
+        whole, _, fraction = text.rpartition(' ')
+        numerator, denominator = fraction.split('/')
+        return (Decimal(whole) if whole else 0) + Decimal(numerator) / Decimal(denominator)
+    return Decimal(text)
+
+def singular(word):
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) > 3 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('oes'):
+        return word[:-2]
+    if len(word) > 2 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+def plural(word):
+    for many, one in IRREGULAR_PLURALS.items():
+        if one == word:
+            return many
+    if word.endswith('y') and word[-2:-1] not in 'aeiou':
+        return word[:-1] + 'ies'
+    if word.endswith(('s', 'x', 'ch', 'sh')):
+        return word + 'es'
+    return word + 's'
+
+def ingredient_id(name):
+    """Canonical id of an ingredient name: 'Cherry tomatoes' -> 'cherry-tomato'"""
+    words = [w for w in SLUG_RE.split(str(name).lower()) if w]
+    if words:
+        words[-1] = singular(words[-1])
+    return '-'.join(words)
+
+def parse_amount(amount):
+    """(quantity, unit) in base units for a display amount like '400g', '2 tbsp' or '1/2 medium'.
+
+    Returns (None, None) when there is no leading quantity ('To taste').
+    Ranges ('2-3 cloves') resolve to their upper bound.
+    """
+    match = AMOUNT_RE.match(str(amount or ''))
+    if not match:
+        return None, None
+    try:
+        quantity = _number(match.group(2) or match.group(1))
+    except (InvalidOperation, ZeroDivisionError, ValueError):
+        return None, None
+    word = match.group(3).lower()
+    if word in MASS_UNITS:
+        return quantity * MASS_UNITS[word], 'g'
+    if word in VOLUME_UNITS:
+        return quantity * VOLUME_UNITS[word], 'ml'
+    if word in EACH_WORDS:
+        return quantity, 'each'
+    return quantity, singular(word)
+
+def normalise_ingredient(ingredient):
+    """Copy of an ingredient line with ingredient_id, quantity and unit added"""
+    line = dict(ingredient)
+    line['ingredient_id'] = ingredient_id(line.get('name', ''))
+    quantity, unit = parse_amount(line.get('amount'))
+    if quantity is not None:
+        line['quantity'] = Decimal(f'{quantity:.3f}'.rstrip('0').rstrip('.'))
+        line['unit'] = unit
+    else:
+        line.pop('quantity', None)
+        line.pop('unit', None)
+    return line
+
+def format_quantity(quantity, unit):
+    """Human readable amount, switching to kg / l for large quantities"""
+    if quantity is None:
+        return None
+    if unit in ('g', 'ml') and quantity >= 1000:
+        quantity, unit = quantity / 1000, 'kg' if unit == 'g' else 'l'
+    text = f'{quantity:.2f}'.rstrip('0').rstrip('.')
+    if unit == 'each':
+        return text
+    if unit not in ('g', 'kg', 'ml', 'l') and text != '1':
+        unit = plural(unit)
+    return f'{text} {unit}'
+
+class _RecipeLines:
+    """One recipe's ingredient lines as parallel arrays"""
+    __slots__ = ('codes', 'quantities', 'cents', 'servings')
+
+    def __init__(self, codes, quantities, cents, servings):
+        self.codes = codes
+        self.quantities = quantities
+        self.cents = cents
+        self.servings = servings
+
+class ShoppingListIndex:
+    """Compact per-recipe ingredient arrays for aggregating shopping lists.
+
+    Every (ingredient_id, unit) pair gets a small integer code, reference
+    counted by the recipe lines that use it and forgotten once none do. A
+    recipe is stored as parallel arrays of codes, base-unit quantities (NaN
+    when the amount has no quantity) and cost in cents. Merging a plan of
+    recipes sums the scaled arrays per code, over only the codes the plan
+    uses (numpy when it is installed). Kept current by the catalog cache
+    through ``sync``/``add``.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.codes = {}
+        self.keys = {}
+        self.names = {}
+        self.refs = {}
+        self.next_code = 0
+        self.recipes = {}
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def _code(self, line):
+        key = (line['ingredient_id'], line.get('unit'))
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = self.next_code
+            self.next_code += 1
+            self.keys[code] = key
+            self.names[code] = line.get('name', line['ingredient_id'])
+            self.refs[code] = 0
+        self.refs[code] += 1
+        return code
+
+    def _release(self, lines):
+        """Drop the references held by a recipe's lines, forgetting codes no recipe uses any more"""
+        for code in lines.codes:
+            self.refs[code] -= 1
+            if not self.refs[code]:
+                del self.refs[code], self.names[code]
+                del self.codes[self.keys.pop(code)]
+
+    def _lines(self, recipe):
+        codes, quantities, cents = array('l'), array('d'), array('q')
+        for ingredient in recipe.get('ingredients') or []:
+            line = ingredient if 'ingredient_id' in ingredient else normalise_ingredient(ingredient)
+            codes.append(self._code(line))
+            quantity = line.get('quantity')
+            quantities.append(float(quantity) if quantity is not None else float('nan'))
+            cents.append(int((Decimal(str(line.get('cost', 0))) * 100).to_integral_value(ROUND_HALF_UP)))
+        servings = recipe.get('servings')
+        return _RecipeLines(codes, quantities, cents, int(servings) if servings else None)
+
+    def add(self, recipe):
+        with self.lock:
+            recipe_id = int(recipe['recipe_id'])
+            old = self.recipes.get(recipe_id)
+            self.recipes[recipe_id] = self._lines(recipe)
+            if old is not None:
+                self._release(old)
+
+    def sync(self, recipes):
+        with self.lock:
+            old = self.recipes
+            self.recipes = {int(r['recipe_id']): self._lines(r) for r in recipes}
+            for lines in old.values():
+                self._release(lines)
+
+    def aggregate(self, plan):
+        """Merge ``[(recipe_id, servings or None)]`` into a shopping list.
+
+        Each recipe is scaled from its own servings to the requested ones.
+        Returns ``(items, total_cost, missing_ids)``; items are sorted by name.
+        """
+        with self.lock:
+            selected, factors, missing = [], [], []
+            for recipe_id, servings in plan:
+                lines = self.recipes.get(recipe_id)
+                if lines is None:
+                    missing.append(recipe_id)
+                    continue
+                selected.append((recipe_id, lines))
+                factors.append(servings / lines.servings if servings and lines.servings else 1.0)
+            if numpy is not None and selected:
+                totals = self._sum_numpy(selected, factors)
+            else:
+                totals = self._sum_python(selected, factors)
+            labels = {code: (self.keys[code], self.names[code]) for code in totals}
+
+        items, total_cents = [], 0
+        for code, (quantity, cents, counted) in totals.items():
+            (ingredient, unit), name = labels[code]
+            line_cents = int(round(cents))
+            total_cents += line_cents
+            quantity = round(quantity, 2) if counted else None
+            items.append({
+                'ingredient_id': ingredient,
+                'name': name,
+                'quantity': quantity,
+                'unit': unit,
+                'display': format_quantity(quantity, unit),
+                'cost': (Decimal(line_cents) / 100).quantize(CENT)
+            })
+        items.sort(key=lambda item: (item['name'].lower(), item['unit'] or ''))
+        return items, (Decimal(total_cents) / 100).quantize(CENT), missing
+
+    @staticmethod
+    def _sum_numpy(selected, factors):
+        """``{code: (quantity, cents, has_quantity)}`` for the codes the selected recipes use"""
+        codes = numpy.concatenate([numpy.frombuffer(lines.codes, dtype=numpy.int_ if lines.codes.itemsize == 8
+                                                    else numpy.int32) for _, lines in selected])
+        scale = numpy.concatenate([numpy.full(len(lines.codes), factor) for (_, lines), factor in zip(selected, factors)])
+        quantities = numpy.concatenate([numpy.frombuffer(lines.quantities, dtype=numpy.float64)
+                                        for _, lines in selected]) * scale
+        cents = numpy.concatenate([numpy.frombuffer(lines.cents, dtype=numpy.int64) for _, lines in selected]) * scale
+        known = ~numpy.isnan(quantities)
+        # Bin by position among the plan's distinct codes, not by code, so the work is independent of the catalog
+        used, slots = numpy.unique(codes, return_inverse=True)
+        size = len(used)
+        return dict(zip(used.tolist(), zip(
+            numpy.bincount(slots, weights=numpy.where(known, quantities, 0.0), minlength=size).tolist(),
+            numpy.bincount(slots, weights=cents, minlength=size).tolist(),
+            (numpy.bincount(slots, weights=known, minlength=size) > 0).tolist()
+        )))
+
+    @staticmethod
+    def _sum_python(selected, factors):
+        """``{code: (quantity, cents, has_quantity)}`` for the codes the selected recipes use"""
+        totals = {}
+        for (_, lines), factor in zip(selected, factors):
+            for code, quantity, line_cents in zip(lines.codes, lines.quantities, lines.cents):
+                total = totals.get(code)
+                if total is None:
+                    total = totals[code] = [0.0, 0.0, False]
+                total[1] += line_cents * factor
+                if quantity == quantity:
+                    total[0] += quantity * factor
+                    total[2] = True
+        return totals
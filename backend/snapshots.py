@@ -0,0 +1,234 @@
+"""Pre-rendered catalog snapshots: content-hashed JSON shards published to S3 (behind CloudFront) or a directory.
+
+Layout, relative to the snapshot root::
+
+    manifest.json                   names the current file of every shard; short cache lifetime
+    catalog.<hash>.json             every recipe's summary, as GET /api/recipes returns them
+    recipes/index-<n>.<hash>.json   {recipe_id: recipe file} for ids n * group_size .. (n + 1) * group_size - 1
+    recipes/<id>.<hash>.json        one recipe, as GET /api/recipes/<id> returns it
+    search/<c>.<hash>.json          {token: [[recipe_id, weight], ...]} for every token starting with c
+
+Every file except the manifest is named after a hash of its content, so it
+never changes and can be cached for a year. A publish uploads only the
+files the previous manifest does not already name, then replaces the
+manifest. Files the new manifest no longer names are kept for
+``retain_seconds`` (clients may still hold the old manifest) and deleted
+by a later publish.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+MANIFEST = 'manifest.json'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+MANIFEST_CACHE = 'public, max-age=60'
+GROUP_SIZE = 1000
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()[:16]
+
+def encode(obj):
+    """Deterministic compact JSON, so equal content always hashes the same"""
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, sort_keys=True).encode()
+
+class DirectoryTarget:
+    """Snapshot files under a local directory, for testing and local development"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def read(self, key):
+        try:
+            with open(os.path.join(self.root, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, body, cache_control):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(body)
+        os.replace(temp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+class S3Target:
+    """Snapshot files under ``prefix`` in an S3 bucket, stored gzip-encoded for CloudFront to serve as is"""
+
+    def __init__(self, client, bucket, prefix='snapshots'):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def _key(self, key):
+        return f'{self.prefix}/{key}' if self.prefix else key
+
+    def read(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        body = response['Body'].read()
+        return gzip.decompress(body) if response.get('ContentEncoding') == 'gzip' else body
+
+    def write(self, key, body, cache_control):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=gzip.compress(body, 6),
+            ContentType='application/json',
+            ContentEncoding='gzip',
+            CacheControl=cache_control
+        )
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+class SnapshotPublisher:
+    """Builds the snapshot shards for a catalog and publishes the ones that changed to ``target``.
+
+    ``recipe_hash(recipe)`` is a content hash of one recipe,
+    ``encode_recipe(recipe)`` its JSON bytes and ``encode_summary(recipe)``
+    those of the view the catalog file lists (default: the whole recipe);
+    the app passes the catalog version digests and the pre-serialised
+    fragments it already keeps, so unchanged recipes are neither re-encoded
+    nor re-uploaded.
+    """
+
+    def __init__(self, target, recipe_hash, encode_recipe, encode_summary=None, workers=16, retain_seconds=86400,
+                 group_size=GROUP_SIZE):
+        self.target = target
+        self.recipe_hash = recipe_hash
+        self.encode_recipe = encode_recipe
+        self.encode_summary = encode_summary or encode_recipe
+        self.workers = workers
+        self.retain_seconds = retain_seconds
+        self.group_size = group_size
+
+    def manifest(self):
+        """The published manifest, or None"""
+        body = self.target.read(MANIFEST)
+        return json.loads(body) if body else None
+
+    def _group_files(self, key):
+        """Recipe files named by a published index shard"""
+        body = self.target.read(key)
+        return set(json.loads(body).values()) if body else set()
+
+    def publish(self, recipes, postings, version, force=False):
+        """Publish snapshots of ``recipes`` and search ``postings`` ({token: {recipe_id: weight}}).
+
+        Does nothing when the manifest already has ``version`` (unless
+        ``force``). Returns counts of files written, retired and deleted.
+        """
+        started = time.monotonic()
+        previous = self.manifest() or {}
+        if previous.get('version') == version and not force:
+            return {'published': False, 'version': version}
+        # Everything the previous manifest names is known to be uploaded; ``force`` rewrites it all
+        named = {previous.get('catalog')} | set(previous.get('groups', {}).values()) | \
+            set(previous.get('search', {}).values())
+        published = set() if force else named
+
+        recipes = sorted(recipes, key=lambda r: int(r['recipe_id']))
+        uploads = {}
+        groups, members = {}, {}
+        for recipe in recipes:
+            recipe_id = int(recipe['recipe_id'])
+            members.setdefault(recipe_id // self.group_size, {})[str(recipe_id)] = \
+                (f'recipes/{recipe_id}.{self.recipe_hash(recipe)}.json', recipe)
+        changed_groups = []
+        for group, files in members.items():
+            body = encode({rid: key for rid, (key, _) in files.items()})
+            groups[str(group)] = f'recipes/index-{group}.{content_hash(body)}.json'
+            if groups[str(group)] not in published:
+                uploads[groups[str(group)]] = body
+                changed_groups.append(group)
+
+        # Recipe files: only those of changed groups can be new; compare with the old index shard
+        old_groups = previous.get('groups', {})
+        retired_recipes = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            old_files = dict(zip(changed_groups, pool.map(
+                lambda g: self._group_files(old_groups[str(g)]) if str(g) in old_groups else set(), changed_groups)))
+        for group in changed_groups:
+            current = {key for key, _ in members[group].values()}
+            for key, recipe in members[group].values():
+                if force or key not in old_files[group]:
+                    uploads[key] = recipe
+            retired_recipes |= old_files[group] - current
+        for group, key in old_groups.items():
+            if int(group) not in members:
+                retired_recipes |= self._group_files(key)
+
+        catalog = b'[' + b','.join(self.encode_summary(r) for r in recipes) + b']'
+        catalog_key = f'catalog.{content_hash(catalog)}.json'
+        if catalog_key not in published:
+            uploads[catalog_key] = catalog
+
+        by_letter = {}
+        for token, entries in postings.items():
+            by_letter.setdefault(token[0], {})[token] = sorted([rid, weight] for rid, weight in entries.items())
+        search = {}
+        for letter, tokens in by_letter.items():
+            body = encode(tokens)
+            search[letter] = f'search/{letter}.{content_hash(body)}.json'
+            if search[letter] not in published:
+                uploads[search[letter]] = body
+
+        def upload(item):
+            key, body = item
+            if not isinstance(body, bytes):
+                body = self.encode_recipe(body)
+            self.target.write(key, body, IMMUTABLE_CACHE)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(upload, uploads.items()))
+
+        # Retire what the new manifest no longer names; delete what has been retired long enough
+        now = int(time.time())
+        current = {catalog_key} | set(groups.values()) | set(search.values())
+        current.update(key for files in members.values() for key, _ in files.values())
+        retired = {key: at for key, at in previous.get('retired', {}).items() if key not in current}
+        for key in (named | retired_recipes) - current - {None}:
+            retired.setdefault(key, now)
+        expired = [key for key, at in retired.items() if now - at >= self.retain_seconds]
+        for key in expired:
+            del retired[key]
+
+        manifest = {
+            'version': version,
+            'generated_at': now,
+            'recipes': len(recipes),
+            'group_size': self.group_size,
+            'catalog': catalog_key,
+            'groups': groups,
+            'search': search,
+            'retired': retired
+        }
+        self.target.write(MANIFEST, encode(manifest), MANIFEST_CACHE)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self.target.delete, expired))
+
+        return {
+            'published': True,
+            'version': version,
+            'recipes': len(recipes),
+            'written': len(uploads),
+            'deleted': len(expired),
+            'retired': len(retired),
+            'elapsed_ms': round(1000 * (time.monotonic() - started), 2)
+        }
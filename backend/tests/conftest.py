@@ -0,0 +1,7 @@
+"""Backend modules import each other by bare name, as they do inside the Lambda package"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
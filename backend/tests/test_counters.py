@@ -0,0 +1,103 @@
+"""Like/save counters (app.add_to_collection / remove_from_collection / bulk_update_recipes / rebuild_counters)"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError
+
+import app
+
+RECIPE_IDS = list(range(1, 11))
+
+
+@pytest.fixture
+def db():
+    resource = app.use_local_dynamodb()
+    recipes = resource.Table(app.RECIPES_TABLE)
+    for recipe_id in RECIPE_IDS:
+        recipes.put_item(Item={'recipe_id': recipe_id, 'name': f'Recipe {recipe_id}'})
+    return resource
+
+
+@pytest.fixture
+def client(db):
+    return app.app.test_client()
+
+
+def headers(username):
+    return {'Authorization': f'Bearer {app.generate_token(username)}'}
+
+
+def all_time(db, recipe_id, counter='like_count'):
+    row = db.Table(app.RECIPE_STATS_TABLE).get_item(
+        Key={'recipe_id': recipe_id, 'period': app.STATS_ALL_TIME}).get('Item') or {}
+    return int(row.get(counter, 0))
+
+
+def test_liking_again_counts_once(db, client):
+    for _ in range(3):
+        assert client.post('/api/user/liked', json={'recipe_id': 1}, headers=headers('amy')).status_code == 200
+    response = client.post('/api/user/liked/batch', json={'add': [1, 2]}, headers=headers('amy'))
+    assert response.json['added'] == 1
+    assert client.post('/api/user/liked/batch', json={'add': [1, 2]}, headers=headers('amy')).json['added'] == 0
+    assert (all_time(db, 1), all_time(db, 2)) == (1, 1)
+
+
+def test_unlike_then_relike(db, client):
+    client.post('/api/user/liked/batch', json={'add': [3]}, headers=headers('amy'))
+    assert client.post('/api/user/liked/batch', json={'remove': [3]}, headers=headers('amy')).json['removed'] == 1
+    assert client.post('/api/user/liked/batch', json={'remove': [3]}, headers=headers('amy')).json['removed'] == 0
+    assert all_time(db, 3) == 0
+    client.post('/api/user/liked', json={'recipe_id': 3}, headers=headers('amy'))
+    assert all_time(db, 3) == 1
+
+
+def test_concurrent_bulk_and_single_likes_count_each_user_once(db, client):
+    users = ['amy', 'ben', 'cat']
+
+    def like(job):
+        username, bulk = job
+        if bulk:
+            return client.post('/api/user/liked/batch', json={'add': RECIPE_IDS}, headers=headers(username))
+        return client.post('/api/user/liked', json={'recipe_id': 5}, headers=headers(username))
+
+    jobs = [(username, n % 3 != 0) for username in users for n in range(6)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(r.status_code == 200 for r in pool.map(like, jobs))
+    assert [all_time(db, rid) for rid in RECIPE_IDS] == [len(users)] * len(RECIPE_IDS)
+
+
+def test_retry_after_a_partial_failure_counts_each_change_once(db, client, monkeypatch):
+    transact = app.get_dynamodb().meta.client.transact_write_items
+    calls = {'n': 0}
+
+    def flaky(**kwargs):
+        calls['n'] += 1
+        if calls['n'] % 2 == 0:
+            raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'boom'}}, 'TransactWriteItems')
+        return transact(**kwargs)
+
+    monkeypatch.setattr(app.get_dynamodb().meta.client, 'transact_write_items', flaky)
+    assert client.post('/api/user/saved/batch', json={'add': RECIPE_IDS}, headers=headers('amy')).status_code == 500
+    monkeypatch.setattr(app.get_dynamodb().meta.client, 'transact_write_items', transact)
+    response = client.post('/api/user/saved/batch', json={'add': RECIPE_IDS}, headers=headers('amy'))
+    assert response.status_code == 200 and 0 < response.json['added'] < len(RECIPE_IDS)
+    assert [all_time(db, rid, 'save_count') for rid in RECIPE_IDS] == [1] * len(RECIPE_IDS)
+
+
+def test_unknown_recipes_are_not_liked(db, client):
+    response = client.post('/api/user/liked/batch', json={'add': [1, 999]}, headers=headers('amy'))
+    assert (response.json['added'], response.json['missing']) == (1, [999])
+    assert client.post('/api/user/liked', json={'recipe_id': 999}, headers=headers('amy')).status_code == 404
+    assert db.Table(app.LIKED_RECIPES_TABLE).get_item(Key={'username': 'amy', 'recipe_id': 999}).get('Item') is None
+    assert db.Table(app.RECIPE_STATS_TABLE).get_item(
+        Key={'recipe_id': 999, 'period': app.STATS_ALL_TIME}).get('Item') is None
+
+
+def test_rebuild_resets_counters_of_recipes_without_rows(db, client):
+    client.post('/api/user/liked/batch', json={'add': [1, 2]}, headers=headers('amy'))
+    stats = db.Table(app.RECIPE_STATS_TABLE)
+    for recipe_id, likes in ((2, 7), (4, 3)):
+        stats.put_item(Item={'recipe_id': recipe_id, 'period': app.STATS_ALL_TIME, 'like_count': likes,
+                             'save_count': 0})
+    app.rebuild_counters()
+    assert [all_time(db, rid) for rid in (1, 2, 4)] == [1, 1, 0]
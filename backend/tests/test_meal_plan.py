@@ -0,0 +1,149 @@
+"""Budgeted meal plans (meal_plan.plan_meals): exact knapsack, deadline fallback and the ingredient-overlap search"""
+import itertools
+import math
+import random
+import time
+
+import pytest
+
+import app
+from meal_plan import MealPlanIndex, plan_meals
+
+
+def recipe(recipe_id, cost, ingredients, servings=1):
+    return {'recipe_id': recipe_id, 'total_cost': cost, 'servings': servings,
+            'ingredients': [{'name': name} for name in ingredients]}
+
+
+def build_index(recipes):
+    index = MealPlanIndex()
+    index.sync(recipes)
+    return index
+
+
+def worth(likes, recipe_id):
+    return 1.0 + math.log1p(likes.get(recipe_id, 0))
+
+
+def costs(recipes):
+    return {r['recipe_id']: r['total_cost'] * 100 / r['servings'] for r in recipes}
+
+
+@pytest.fixture
+def catalog():
+    rng = random.Random(5)
+    return [recipe(rid, rng.randint(20, 400) / 100, [f'ingredient {rid}']) for rid in range(1, 15)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_knapsack_finds_the_best_plan_within_budget(catalog, seed):
+    rng = random.Random(seed)
+    likes = {rid: rng.randint(0, 50) for rid in range(1, 15)}
+    budget, meals = 600, 4
+    per_meal = costs(catalog)
+    best = max(sum(worth(likes, rid) for rid in plan)
+               for plan in itertools.combinations(per_meal, meals) if sum(per_meal[rid] for rid in plan) <= budget)
+
+    # One-cent buckets, and no shared ingredients, so the knapsack alone decides
+    result = plan_meals(build_index(catalog), budget, 1, meals, likes=likes, buckets=budget)
+    assert len(result['recipe_ids']) == meals == len(set(result['recipe_ids']))
+    assert result['cost'] <= budget
+    assert sum(worth(likes, rid) for rid in result['recipe_ids']) == pytest.approx(best)
+    assert result['complete']
+
+
+def test_knapsack_finds_plans_single_swaps_cannot_reach():
+    # From the cheapest pair (1, 2), swapping one meal at a time climbs to (5, 2) and is stuck there:
+    # reaching (3, 4) needs both meals changed at once
+    recipes = [recipe(1, 0.10, ['a']), recipe(2, 0.10, ['b']), recipe(3, 0.50, ['c']), recipe(4, 0.50, ['d']),
+               recipe(5, 0.85, ['e'])]
+    likes = {3: 6, 4: 6, 5: 10}
+    result = plan_meals(build_index(recipes), 100, 1, 2, likes=likes)
+    assert sorted(result['recipe_ids']) == [3, 4]
+    assert result['cost'] == 100
+
+
+def test_costs_round_up_to_budget_buckets():
+    # With 10-cent buckets a 34-cent meal must weigh 4 buckets, or three of them would look like they fit in 100
+    recipes = [recipe(rid, 0.34, [f'liked {rid}']) for rid in range(1, 4)] + [recipe(4, 0.10, ['plain'])]
+    result = plan_meals(build_index(recipes), 100, 1, 3, likes={1: 50, 2: 50, 3: 50}, buckets=10)
+    assert result['cost'] <= 100
+    assert 4 in result['recipe_ids'] and len(set(result['recipe_ids']) & {1, 2, 3}) == 2
+
+
+def test_plan_never_overspends_with_coarse_buckets(catalog):
+    per_meal = costs(catalog)
+    for budget in (450, 700, 1234, 2000):
+        result = plan_meals(build_index(catalog), budget, 3, 2, max_repeats=2, buckets=7)
+        assert result is not None
+        assert sum(per_meal[rid] * 3 for rid in result['recipe_ids']) <= budget
+
+
+def test_max_repeats(catalog):
+    result = plan_meals(build_index(catalog), 100000, 1, 7, likes={1: 100}, max_repeats=2)
+    assert len(result['recipe_ids']) == 7
+    assert max(result['recipe_ids'].count(rid) for rid in result['recipe_ids']) <= 2
+    assert result['recipe_ids'].count(1) == 2
+
+
+def test_no_plan_when_the_cheapest_meals_do_not_fit(catalog):
+    cheapest = sorted(costs(catalog).values())
+    assert plan_meals(build_index(catalog), sum(cheapest[:3]) - 1, 1, 3) is None
+    assert plan_meals(build_index(catalog), 100000, 1, len(catalog) + 1) is None
+
+
+def test_exclusions_and_dietary_groups():
+    recipes = [recipe(1, 1, ['Chicken breast', 'Rice']), recipe(2, 1, ['Beef mince']), recipe(3, 1, ['Lentils']),
+               recipe(4, 1, ['Cheddar cheese', 'Pasta']), recipe(5, 1, ['Tomato'])]
+    result = plan_meals(build_index(recipes), 100000, 1, 3, exclude=['vegetarian'])
+    assert sorted(result['recipe_ids']) == [3, 4, 5]
+    assert plan_meals(build_index(recipes), 100000, 1, 3, exclude=['vegetarian', 'dairy']) is None
+
+
+def test_passed_deadline_returns_the_greedy_plan(catalog):
+    per_meal = costs(catalog)
+    result = plan_meals(build_index(catalog), 100000, 1, 3, likes={14: 1000}, deadline=time.monotonic() - 1)
+    assert not result['complete']
+    assert sorted(result['recipe_ids']) == sorted(sorted(per_meal, key=per_meal.get)[:3])
+
+
+def test_overlap_search_swaps_in_recipes_that_share_ingredients():
+    shared = ['onion', 'garlic', 'tomato', 'chilli']
+    recipes = [
+        recipe(1, 1, ['mince'] + shared),
+        recipe(2, 1, ['potato']),
+        recipe(3, 1, ['beans'] + shared),
+        recipe(4, 1, ['hake'])
+    ]
+    likes = {2: 1, 3: 1}
+
+    # Without the overlap bonus the two liked recipes score best...
+    alone = plan_meals(build_index(recipes), 100000, 1, 2, likes=likes, overlap_weight=0)
+    assert sorted(alone['recipe_ids']) == [2, 3]
+    # ...but swapping recipe 2 for recipe 1 shares four ingredients with recipe 3
+    result = plan_meals(build_index(recipes), 100000, 1, 2, likes=likes)
+    assert sorted(result['recipe_ids']) == [1, 3]
+    assert result['shared_ingredients'] == sorted(shared)
+    assert result['score'] == round(1 + worth(likes, 3) + 0.5 * len(shared), 3)
+    assert result['complete']
+
+
+def test_overlap_swaps_stay_within_budget():
+    shared = ['onion', 'garlic', 'tomato']
+    recipes = [recipe(1, 9, ['mince'] + shared), recipe(2, 1, ['potato']), recipe(3, 1, ['rice'] + shared)]
+    result = plan_meals(build_index(recipes), 500, 1, 2)
+    assert sorted(result['recipe_ids']) == [2, 3]
+    assert result['cost'] <= 500
+
+
+def test_route_totals_use_exact_costs():
+    # 1.01 / 3 servings is 0.3367 a meal: three fit a 1.01 budget exactly, but their rounded costs add up to 1.02
+    recipes = app.use_local_dynamodb().Table(app.RECIPES_TABLE)
+    for recipe_id in range(1, 4):
+        recipes.put_item(Item={'recipe_id': recipe_id, 'name': f'Recipe {recipe_id}', 'total_cost': '1.01',
+                               'servings': 3, 'ingredients': [{'name': 'rice'}]})
+    app.recipe_cache.invalidate()
+    response = app.app.test_client().post('/api/meal-plan', json={'budget': '1.01', 'people': 1, 'meals': 3})
+    assert response.status_code == 200
+    assert [meal['cost'] for meal in response.json['meals']] == [0.34] * 3
+    assert (response.json['total_cost'], response.json['remaining']) == (1.01, 0.0)
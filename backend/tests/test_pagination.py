@@ -0,0 +1,127 @@
+"""Signed page cursors and DynamoDB paging (app.encode_cursor / decode_cursor / get_page_args / paginate)"""
+from decimal import Decimal
+
+import pytest
+
+import app
+from local_dynamodb import LocalDynamoDB
+
+SCOPE = '/api/recipes'
+NOW = 1_700_000_000
+
+
+def test_cursor_round_trip():
+    position = {'recipe_id': Decimal(42), 'offset': 3}
+    token = app.encode_cursor(position, SCOPE, now=NOW)
+    assert app.decode_cursor(token, SCOPE, now=NOW + 60) == position
+
+
+def test_cursor_is_bound_to_its_scope():
+    token = app.encode_cursor({'offset': 20}, SCOPE, now=NOW)
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        app.decode_cursor(token, '/api/recipes/search?q=soup', now=NOW)
+
+
+@pytest.mark.parametrize('part', [0, 1, 2])
+def test_tampered_cursor_is_rejected(part):
+    token = app.encode_cursor({'offset': 20}, SCOPE, now=NOW)
+    pieces = token.split('.')
+    if part == 0:
+        pieces[0] = app._b64encode(b'{"offset":4000}')
+    elif part == 1:
+        pieces[1] = str(NOW + 10 * 24 * 3600)
+    else:
+        pieces[2] = pieces[2][:-1] + ('A' if pieces[2][-1] != 'A' else 'B')
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        app.decode_cursor('.'.join(pieces), SCOPE, now=NOW)
+
+
+@pytest.mark.parametrize('token', ['', 'garbage', 'a.b', 'a.b.c.d', 'e30.notanumber.xyz'])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        app.decode_cursor(token, SCOPE, now=NOW)
+
+
+def test_cursor_expires_after_ttl(monkeypatch):
+    monkeypatch.setattr(app, 'CURSOR_TTL', 3600)
+    token = app.encode_cursor({'offset': 20}, SCOPE, now=NOW)
+    assert app.decode_cursor(token, SCOPE, now=NOW + 3600) == {'offset': 20}
+    with pytest.raises(ValueError, match='expired'):
+        app.decode_cursor(token, SCOPE, now=NOW + 3601)
+
+
+def test_cursor_ttl_zero_never_expires(monkeypatch):
+    monkeypatch.setattr(app, 'CURSOR_TTL', 0)
+    token = app.encode_cursor({'offset': 20}, SCOPE, now=NOW)
+    assert app.decode_cursor(token, SCOPE, now=NOW + 10 ** 9) == {'offset': 20}
+
+
+def test_cursor_generation_changes_within_ttl(monkeypatch):
+    monkeypatch.setattr(app, 'CURSOR_TTL', 3600)
+    monkeypatch.setattr(app.time, 'time', lambda: NOW)
+    first = app.cursor_generation()
+    monkeypatch.setattr(app.time, 'time', lambda: NOW + 1800)
+    assert app.cursor_generation() != first
+
+
+@pytest.mark.parametrize('query, message', [
+    ('limit=0', 'limit must be between'),
+    ('limit=101', 'limit must be between'),
+    ('limit=ten', 'limit must be an integer'),
+    ('cursor=garbage', 'Invalid cursor')
+])
+def test_page_args_are_validated(query, message):
+    with app.app.test_request_context(f'{SCOPE}?{query}'):
+        with pytest.raises(ValueError, match=message):
+            app.get_page_args(SCOPE)
+
+
+def test_page_args():
+    with app.app.test_request_context(SCOPE):
+        assert app.get_page_args(SCOPE) is None
+    with app.app.test_request_context(f'{SCOPE}?limit=5'):
+        assert app.get_page_args(SCOPE) == (5, None)
+    token = app.encode_cursor({'recipe_id': 7}, SCOPE)
+    with app.app.test_request_context(SCOPE, query_string={'cursor': token}):
+        assert app.get_page_args(SCOPE) == (app.DEFAULT_PAGE_SIZE, {'recipe_id': 7})
+
+
+@pytest.fixture
+def table():
+    resource = LocalDynamoDB()
+    resource.create_table('recipes', 'recipe_id')
+    table = resource.Table('recipes')
+    for recipe_id in range(1, 24):
+        table.put_item(Item={'recipe_id': recipe_id, 'name': f'Recipe {recipe_id}', 'even': recipe_id % 2 == 0})
+    return table
+
+
+def read_pages(table, limit, predicate=None):
+    pages, start_key = [], None
+    while True:
+        items, start_key = app.paginate(table.scan, ['recipe_id'], limit, start_key, predicate)
+        pages.append([int(item['recipe_id']) for item in items])
+        if start_key is None:
+            return pages
+
+
+@pytest.mark.parametrize('limit', [1, 5, 23, 50])
+def test_paginate_visits_every_item_once(table, limit):
+    pages = read_pages(table, limit)
+    seen = [recipe_id for page in pages for recipe_id in page]
+    assert sorted(seen) == list(range(1, 24))
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_paginate_fills_pages_through_a_predicate(table):
+    pages = read_pages(table, 4, predicate=lambda item: item['even'])
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert sorted(recipe_id for page in pages for recipe_id in page) == list(range(2, 24, 2))
+
+
+def test_paginate_resumes_from_a_decoded_cursor(table):
+    first, start_key = app.paginate(table.scan, ['recipe_id'], 10)
+    token = app.encode_cursor(start_key, SCOPE)
+    second, _ = app.paginate(table.scan, ['recipe_id'], 10, app.decode_cursor(token, SCOPE))
+    assert not {item['recipe_id'] for item in first} & {item['recipe_id'] for item in second}
+    assert len(second) == 10
@@ -1,6 +1,12 @@
 const API_URL = (window.config && window.config.apiUrl) 
     || (window.location.hostname === 'localhost' ? 'http://localhost:5000/api' : 'https://b89r22hza7.execute-api.af-south-1.amazonaws.com/dev/api');
 
+// Public recipe reads can go through CloudFront, which caches them at the edge
+const CATALOG_URL = (window.config && window.config.catalogUrl) || API_URL;
+
+// Pre-rendered catalog snapshots on the CDN (backend/snapshots.py); the API answers when they can't
+const SNAPSHOT_URL = (window.config && window.config.snapshotUrl) || null;
+
 let currentUser = null;
 
 console.log('Using API URL:', API_URL);
@@ -20,6 +26,31 @@ function checkAuth() {
     return false;
 }
 
+// One Idempotency-Key per user action (URL + body), kept until the action gets a final answer,
+// so a retry or a double-submit of the same action is only applied once
+const actionKeys = new Map();
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function postOnce(url, headers, body) {
+    const action = `${url}\n${body}`;
+    if (!actionKeys.has(action)) actionKeys.set(action, newIdempotencyKey());
+
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { ...headers, 'Idempotency-Key': actionKeys.get(action) },
+        body
+    });
+    // Network errors, 5xx, 409 (still in progress) and 429 keep the key for the retry
+    if (response.status < 500 && response.status !== 409 && response.status !== 429) {
+        actionKeys.delete(action);
+    }
+    return response;
+}
+
 // Update navigation based on auth status
 function updateNavigation() {
     const loginBtn = document.getElementById('loginBtn');
@@ -66,6 +97,90 @@ function hideError(elementId) {
     }
 }
 
+// ============= CATALOG SNAPSHOTS =============
+
+// Manifest is re-read at most once a minute; every other snapshot file is immutable
+const SNAPSHOT_MANIFEST_TTL = 60000;
+let snapshotManifest = null;
+const snapshotFiles = {};
+
+async function fetchSnapshotJSON(path) {
+    const response = await fetch(`${SNAPSHOT_URL}/${path}`);
+    if (!response.ok) throw new Error(`Snapshot ${path}: ${response.status}`);
+    return response.json();
+}
+
+async function getSnapshotManifest() {
+    if (!SNAPSHOT_URL) return null;
+    if (!snapshotManifest || Date.now() - snapshotManifest.fetchedAt > SNAPSHOT_MANIFEST_TTL) {
+        snapshotManifest = { fetchedAt: Date.now(), data: fetchSnapshotJSON('manifest.json') };
+    }
+    try {
+        return await snapshotManifest.data;
+    } catch (error) {
+        console.warn('Snapshots unavailable, using the API:', error);
+        snapshotManifest = null;
+        return null;
+    }
+}
+
+function getSnapshotFile(path) {
+    if (!snapshotFiles[path]) {
+        snapshotFiles[path] = fetchSnapshotJSON(path);
+        snapshotFiles[path].catch(() => delete snapshotFiles[path]);
+    }
+    return snapshotFiles[path];
+}
+
+// Full catalog, or null when snapshots are not available
+async function snapshotRecipes() {
+    const manifest = await getSnapshotManifest();
+    return manifest ? getSnapshotFile(manifest.catalog) : null;
+}
+
+async function snapshotRecipe(recipeId) {
+    const manifest = await getSnapshotManifest();
+    const group = manifest && manifest.groups[Math.floor(recipeId / manifest.group_size)];
+    if (!group) return null;
+    const index = await getSnapshotFile(group);
+    return index[recipeId] ? getSnapshotFile(index[recipeId]) : null;
+}
+
+// Same ranking as the API's exact and prefix matches; null (ask the API, which also
+// tolerates typos) when nothing matches
+async function snapshotSearch(query) {
+    const manifest = await getSnapshotManifest();
+    const terms = [...new Set(query.toLowerCase().match(/[a-z0-9]+/g) || [])];
+    if (!manifest || terms.length === 0) return null;
+
+    let scores = null;
+    for (const term of terms) {
+        const shard = manifest.search[term[0]];
+        const postings = shard ? await getSnapshotFile(shard) : {};
+        const termScores = new Map();
+        for (const [token, entries] of Object.entries(postings)) {
+            if (!token.startsWith(term)) continue;
+            const factor = token === term ? 1.0 : 0.6;
+            const idf = Math.log(1 + (manifest.recipes || 1) / entries.length);
+            for (const [recipeId, weight] of entries) {
+                const score = weight * factor * idf;
+                if (score > (termScores.get(recipeId) || 0)) termScores.set(recipeId, score);
+            }
+        }
+        scores = scores === null ? termScores : new Map(
+            [...scores].filter(([recipeId]) => termScores.has(recipeId))
+                .map(([recipeId, score]) => [recipeId, score + termScores.get(recipeId)])
+        );
+        if (scores.size === 0) return null;
+    }
+
+    const byId = new Map((await snapshotRecipes()).map(recipe => [recipe.recipe_id, recipe]));
+    return [...scores]
+        .sort((a, b) => b[1] - a[1] || a[0] - b[0])
+        .map(([recipeId]) => byId.get(recipeId))
+        .filter(Boolean);
+}
+
 // ============= INDEX.HTML FUNCTIONS =============
 
 // Load recipes from API
@@ -79,14 +194,18 @@ async function loadRecipes(searchQuery = '') {
     grid.innerHTML = '';
 
     try {
-        const url = searchQuery 
-            ? `${API_URL}/recipes/search?q=${encodeURIComponent(searchQuery)}`
-            : `${API_URL}/recipes`;
-        
-        const response = await fetch(url);
-        if (!response.ok) throw new Error('Network response was not ok');
+        let recipes = await (searchQuery ? snapshotSearch(searchQuery) : snapshotRecipes()).catch(() => null);
         
-        const recipes = await response.json();
+        if (!recipes) {
+            const url = searchQuery 
+                ? `${CATALOG_URL}/recipes/search?q=${encodeURIComponent(searchQuery)}`
+                : `${CATALOG_URL}/recipes`;
+            
+            const response = await fetch(url);
+            if (!response.ok) throw new Error('Network response was not ok');
+            
+            recipes = await response.json();
+        }
 
         recipes.forEach(recipe => {
             const card = createRecipeCard(recipe);
@@ -139,8 +258,11 @@ async function showRecipeModal(recipe) {
     if (!modal || !content) return;
     
     try {
-        const response = await fetch(`${API_URL}/recipes/${recipe.recipe_id}`);
-        const fullRecipe = await response.json();
+        let fullRecipe = await snapshotRecipe(recipe.recipe_id).catch(() => null);
+        if (!fullRecipe) {
+            const response = await fetch(`${CATALOG_URL}/recipes/${recipe.recipe_id}`);
+            fullRecipe = await response.json();
+        }
         
         const ingredientsList = fullRecipe.ingredients.map(ing => 
             `<li class="flex justify-between py-2 border-b border-gray-100">
@@ -215,14 +337,10 @@ async function saveRecipe(recipeId) {
     if (!checkAuth()) return;
 
     try {
-        const response = await fetch(`${API_URL}/user/saved`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${currentUser.token}`
-            },
-            body: JSON.stringify({ recipe_id: recipeId })
-        });
+        const response = await postOnce(`${API_URL}/user/saved`, {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${currentUser.token}`
+        }, JSON.stringify({ recipe_id: recipeId }));
         
         if (response.ok) {
             alert('Recipe saved successfully!');
@@ -241,14 +359,10 @@ async function likeRecipe(recipeId) {
     if (!checkAuth()) return;
 
     try {
-        const response = await fetch(`${API_URL}/user/liked`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${currentUser.token}`
-            },
-            body: JSON.stringify({ recipe_id: recipeId })
-        });
+        const response = await postOnce(`${API_URL}/user/liked`, {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${currentUser.token}`
+        }, JSON.stringify({ recipe_id: recipeId }));
         
         if (response.ok) {
             alert('Recipe liked successfully!');
@@ -288,11 +402,8 @@ async function generateRecipe() {
     btn.disabled = true;
 
     try {
-        const response = await fetch(`${API_URL}/recipes/generate`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ input: input.value })
-        });
+        const response = await postOnce(`${API_URL}/recipes/generate`,
+            { 'Content-Type': 'application/json' }, JSON.stringify({ input: input.value }));
 
         if (response.ok) {
             const recipe = await response.json();
@@ -434,17 +545,13 @@ async function handleRegister(event) {
     registerBtn.textContent = 'Creating account...';
 
     try {
-        const response = await fetch(`${API_URL}/auth/register`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                email: email,
-                username: username,
-                password: password
-            })
-        });
+        const response = await postOnce(`${API_URL}/auth/register`, {
+            'Content-Type': 'application/json'
+        }, JSON.stringify({
+            email: email,
+            username: username,
+            password: password
+        }));
 
         const data = await response.json();
 
@@ -556,65 +663,42 @@ function initAccountPage() {
         });
     });
     
-    loadSavedRecipes();
-    loadLikedRecipes();
+    loadAccountState();
 }
 
-async function loadSavedRecipes() {
-    const container = document.getElementById('savedRecipes');
-    const empty = document.getElementById('savedEmpty');
-    
+// Saved and liked lists (with their recipes) come back from a single request
+async function loadAccountState() {
     try {
-        const response = await fetch(`${API_URL}/user/saved`, {
+        const response = await fetch(`${API_URL}/user/state?include=recipes`, {
             headers: { 'Authorization': `Bearer ${currentUser.token}` }
         });
         
-        const recipes = await response.json();
-        const countEl = document.getElementById('savedCount');
-        if (countEl) countEl.textContent = recipes.length;
-        
-        if (!recipes.length) {
-            container.classList.add('hidden');
-            empty.classList.remove('hidden');
-        } else {
-            container.classList.remove('hidden');
-            empty.classList.add('hidden');
-            container.innerHTML = '';
-            recipes.forEach(recipe => {
-                container.appendChild(createAccountRecipeCard(recipe, 'saved'));
-            });
-        }
+        const state = await response.json();
+        const recipesById = new Map((state.recipes || []).map(recipe => [recipe.recipe_id, recipe]));
+        const lookup = ids => (ids || []).map(id => recipesById.get(id)).filter(Boolean);
+        renderAccountList('saved', lookup(state.saved));
+        renderAccountList('liked', lookup(state.liked));
     } catch (error) {
-        console.error('Error loading saved recipes:', error);
+        console.error('Error loading account state:', error);
     }
 }
 
-async function loadLikedRecipes() {
-    const container = document.getElementById('likedRecipes');
-    const empty = document.getElementById('likedEmpty');
+function renderAccountList(type, recipes) {
+    const container = document.getElementById(`${type}Recipes`);
+    const empty = document.getElementById(`${type}Empty`);
+    const countEl = document.getElementById(`${type}Count`);
+    if (countEl) countEl.textContent = recipes.length;
     
-    try {
-        const response = await fetch(`${API_URL}/user/liked`, {
-            headers: { 'Authorization': `Bearer ${currentUser.token}` }
+    if (!recipes.length) {
+        container.classList.add('hidden');
+        empty.classList.remove('hidden');
+    } else {
+        container.classList.remove('hidden');
+        empty.classList.add('hidden');
+        container.innerHTML = '';
+        recipes.forEach(recipe => {
+            container.appendChild(createAccountRecipeCard(recipe, type));
         });
-        
-        const recipes = await response.json();
-        const countEl = document.getElementById('likedCount');
-        if (countEl) countEl.textContent = recipes.length;
-        
-        if (!recipes.length) {
-            container.classList.add('hidden');
-            empty.classList.remove('hidden');
-        } else {
-            container.classList.remove('hidden');
-            empty.classList.add('hidden');
-            container.innerHTML = '';
-            recipes.forEach(recipe => {
-                container.appendChild(createAccountRecipeCard(recipe, 'liked'));
-            });
-        }
-    } catch (error) {
-        console.error('Error loading liked recipes:', error);
     }
 }
 
@@ -658,8 +742,7 @@ async function removeRecipe(recipeId, type) {
         });
         
         if (response.ok) {
-            if (type === 'saved') loadSavedRecipes();
-            else loadLikedRecipes();
+            loadAccountState();
         } else {
             alert('Failed to remove recipe.');
         }
@@ -12,6 +12,10 @@ terraform {
       source  = "hashicorp/archive"
       version = "~> 2.0"
     }
+    random = {
+      source  = "hashicorp/random"
+      version = "~> 3.0"
+    }
   }
 }
 
@@ -106,6 +110,52 @@ resource "aws_cloudfront_origin_access_control" "frontend" {
   signing_protocol                  = "sigv4"
 }
 
+resource "random_password" "origin_verify" {
+  length  = 32
+  special = false
+}
+
+# API responses are cached by path and query string for as long as their Cache-Control allows
+resource "aws_cloudfront_cache_policy" "api" {
+  name        = "${var.project_name}-api-${var.environment}"
+  min_ttl     = 0
+  default_ttl = 0
+  max_ttl     = 86400
+
+  parameters_in_cache_key_and_forwarded_to_origin {
+    enable_accept_encoding_gzip   = true
+    enable_accept_encoding_brotli = true
+
+    cookies_config {
+      cookie_behavior = "none"
+    }
+    headers_config {
+      header_behavior = "none"
+    }
+    query_strings_config {
+      query_string_behavior = "all"
+    }
+  }
+}
+
+# The viewer's address reaches the API without becoming part of the cache key
+resource "aws_cloudfront_origin_request_policy" "api" {
+  name = "${var.project_name}-api-${var.environment}"
+
+  cookies_config {
+    cookie_behavior = "none"
+  }
+  headers_config {
+    header_behavior = "whitelist"
+    headers {
+      items = ["CloudFront-Viewer-Address"]
+    }
+  }
+  query_strings_config {
+    query_string_behavior = "all"
+  }
+}
+
 resource "aws_cloudfront_distribution" "frontend" {
   enabled             = true
   is_ipv6_enabled     = true
@@ -119,6 +169,64 @@ resource "aws_cloudfront_distribution" "frontend" {
     origin_access_control_id = aws_cloudfront_origin_access_control.frontend.id
   }
 
+  # Public recipe reads are served through the edge from the REST API
+  origin {
+    domain_name = "${aws_api_gateway_rest_api.api.id}.execute-api.${var.aws_region}.amazonaws.com"
+    origin_id   = "API-${aws_api_gateway_rest_api.api.id}"
+    origin_path = "/${var.environment}"
+
+    # Lets the API trust CloudFront's viewer-address headers (rate limits are per viewer IP)
+    custom_header {
+      name  = "X-Origin-Verify"
+      value = random_password.origin_verify.result
+    }
+
+    custom_origin_config {
+      http_port              = 80
+      https_port             = 443
+      origin_protocol_policy = "https-only"
+      origin_ssl_protocols   = ["TLSv1.2"]
+    }
+  }
+
+  # Static catalog snapshots published by the API Lambda (backend/snapshots.py).
+  # Content-hashed files carry a one-year Cache-Control and the manifest a
+  # one-minute one; they are stored gzip-encoded, so no edge compression.
+  ordered_cache_behavior {
+    path_pattern     = "/snapshots/*"
+    allowed_methods  = ["GET", "HEAD", "OPTIONS"]
+    cached_methods   = ["GET", "HEAD"]
+    target_origin_id = "S3-${aws_s3_bucket.frontend.id}"
+
+    forwarded_values {
+      query_string = false
+      cookies {
+        forward = "none"
+      }
+    }
+
+    viewer_protocol_policy = "redirect-to-https"
+    min_ttl                = 0
+    default_ttl            = 60
+    max_ttl                = 31536000
+    compress               = false
+  }
+
+  # Cache lifetime comes from the API's Cache-Control/s-maxage and ETag
+  # headers; responses without them (random, errors) are not cached.
+  ordered_cache_behavior {
+    path_pattern     = "/api/recipes*"
+    allowed_methods  = ["GET", "HEAD", "OPTIONS"]
+    cached_methods   = ["GET", "HEAD"]
+    target_origin_id = "API-${aws_api_gateway_rest_api.api.id}"
+
+    cache_policy_id          = aws_cloudfront_cache_policy.api.id
+    origin_request_policy_id = aws_cloudfront_origin_request_policy.api.id
+
+    viewer_protocol_policy = "redirect-to-https"
+    compress               = true
+  }
+
   default_cache_behavior {
     allowed_methods  = ["GET", "HEAD", "OPTIONS"]
     cached_methods   = ["GET", "HEAD"]
@@ -205,6 +313,40 @@ resource "aws_dynamodb_table" "recipes" {
     type = "N"
   }
 
+  attribute {
+    name = "difficulty"
+    type = "S"
+  }
+
+  attribute {
+    name = "total_cost"
+    type = "N"
+  }
+
+  attribute {
+    name = "time_minutes"
+    type = "N"
+  }
+
+  # Each difficulty partition sorted by cost / cooking time, for filtered listings.
+  # They hold only the summary attributes (SUMMARY_FIELDS in backend/app.py), so a
+  # listing page reads small index items; full recipes come from the table.
+  global_secondary_index {
+    name               = "CostIndex"
+    hash_key           = "difficulty"
+    range_key          = "total_cost"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["name", "emoji", "time", "time_minutes", "servings"]
+  }
+
+  global_secondary_index {
+    name               = "TimeIndex"
+    hash_key           = "difficulty"
+    range_key          = "time_minutes"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["name", "emoji", "time", "total_cost", "servings"]
+  }
+
   tags = {
     Name        = "${var.project_name}-recipes"
     Environment = var.environment
@@ -255,6 +397,125 @@ resource "aws_dynamodb_table" "liked_recipes" {
   }
 }
 
+# Small key/value items shared by all Lambda containers (e.g. the recipe id counter)
+resource "aws_dynamodb_table" "metadata" {
+  name         = "${var.project_name}-metadata-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "meta_key"
+
+  attribute {
+    name = "meta_key"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "${var.project_name}-metadata"
+    Environment = var.environment
+  }
+}
+
+# Per-recipe like/save counters: period "all" plus "day#YYYY-MM-DD" buckets that expire via TTL.
+# PeriodLikesIndex keeps each period's recipes sorted by like_count for the trending endpoint.
+resource "aws_dynamodb_table" "recipe_stats" {
+  name         = "${var.project_name}-recipe-stats-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "recipe_id"
+  range_key    = "period"
+
+  attribute {
+    name = "recipe_id"
+    type = "N"
+  }
+
+  attribute {
+    name = "period"
+    type = "S"
+  }
+
+  attribute {
+    name = "like_count"
+    type = "N"
+  }
+
+  global_secondary_index {
+    name            = "PeriodLikesIndex"
+    hash_key        = "period"
+    range_key       = "like_count"
+    projection_type = "KEYS_ONLY"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-recipe-stats"
+    Environment = var.environment
+  }
+}
+
+# Email address (lower-cased) -> username, written with the user so each address is registered once
+resource "aws_dynamodb_table" "user_emails" {
+  name         = "${var.project_name}-user-emails-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "email"
+
+  attribute {
+    name = "email"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "${var.project_name}-user-emails"
+    Environment = var.environment
+  }
+}
+
+# Shared rate-limit counters: one item per client key and fixed window, removed by TTL
+resource "aws_dynamodb_table" "rate_limits" {
+  name         = "${var.project_name}-rate-limits-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "limit_key"
+
+  attribute {
+    name = "limit_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-rate-limits"
+    Environment = var.environment
+  }
+}
+
+# Stored responses for POSTs sent with an Idempotency-Key header; TTL removes them after a day
+resource "aws_dynamodb_table" "idempotency" {
+  name         = "${var.project_name}-idempotency-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "idempotency_key"
+
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-idempotency"
+    Environment = var.environment
+  }
+}
+
 # ============= IAM ROLE FOR LAMBDA =============
 
 resource "aws_iam_role" "lambda_role" {
@@ -300,7 +561,9 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
           "dynamodb:Query",
@@ -311,8 +574,30 @@ resource "aws_iam_role_policy" "lambda_policy" {
           aws_dynamodb_table.recipes.arn,
           aws_dynamodb_table.saved_recipes.arn,
           aws_dynamodb_table.liked_recipes.arn,
-          "${aws_dynamodb_table.users.arn}/index/*"
+          aws_dynamodb_table.metadata.arn,
+          aws_dynamodb_table.recipe_stats.arn,
+          aws_dynamodb_table.idempotency.arn,
+          aws_dynamodb_table.user_emails.arn,
+          aws_dynamodb_table.rate_limits.arn,
+          "${aws_dynamodb_table.users.arn}/index/*",
+          "${aws_dynamodb_table.recipes.arn}/index/*",
+          "${aws_dynamodb_table.recipe_stats.arn}/index/*"
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
         ]
+        Resource = "${aws_s3_bucket.frontend.arn}/snapshots/*"
+      },
+      {
+        # Lets a missing snapshot read as 404 rather than 403
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = aws_s3_bucket.frontend.arn
       }
     ]
   })
@@ -338,13 +623,22 @@ resource "aws_lambda_function" "api" {
 
   environment {
     variables = {
-      ENVIRONMENT         = var.environment
-      USERS_TABLE         = aws_dynamodb_table.users.name
-      RECIPES_TABLE       = aws_dynamodb_table.recipes.name
-      SAVED_RECIPES_TABLE = aws_dynamodb_table.saved_recipes.name
-      LIKED_RECIPES_TABLE = aws_dynamodb_table.liked_recipes.name
-      AWS_REGION_NAME     = var.aws_region
-      SECRET_KEY          = "your-secret-key-change-in-production"
+      ENVIRONMENT          = var.environment
+      USERS_TABLE          = aws_dynamodb_table.users.name
+      RECIPES_TABLE        = aws_dynamodb_table.recipes.name
+      SAVED_RECIPES_TABLE  = aws_dynamodb_table.saved_recipes.name
+      LIKED_RECIPES_TABLE  = aws_dynamodb_table.liked_recipes.name
+      METADATA_TABLE       = aws_dynamodb_table.metadata.name
+      RECIPE_STATS_TABLE   = aws_dynamodb_table.recipe_stats.name
+      IDEMPOTENCY_TABLE    = aws_dynamodb_table.idempotency.name
+      USER_EMAILS_TABLE    = aws_dynamodb_table.user_emails.name
+      RATE_LIMIT_TABLE     = aws_dynamodb_table.rate_limits.name
+      ORIGIN_VERIFY_SECRET = random_password.origin_verify.result
+      SNAPSHOT_BUCKET      = aws_s3_bucket.frontend.id
+      AWS_REGION_NAME      = var.aws_region
+      RECIPE_CACHE_TTL     = "60"
+      SEED_ON_COLD_START   = "true"
+      SECRET_KEY           = "your-secret-key-change-in-production"
     }
   }
 
@@ -365,6 +659,48 @@ resource "aws_lambda_permission" "api_gateway" {
   source_arn    = "${aws_api_gateway_rest_api.api.execution_arn}/*/*"
 }
 
+# Scheduled warm-up: keeps a container alive with AWS clients and caches primed
+resource "aws_cloudwatch_event_rule" "warmup" {
+  name                = "${var.project_name}-warmup-${var.environment}"
+  description         = "Warm-up ping for the ${var.project_name} API"
+  schedule_expression = "rate(5 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "warmup" {
+  rule  = aws_cloudwatch_event_rule.warmup.name
+  arn   = aws_lambda_function.api.arn
+  input = jsonencode({ warmup = true })
+}
+
+resource "aws_lambda_permission" "warmup" {
+  statement_id  = "AllowEventBridgeWarmup"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.api.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.warmup.arn
+}
+
+# Republishes the static catalog snapshots; a no-op while the catalog is unchanged
+resource "aws_cloudwatch_event_rule" "snapshots" {
+  name                = "${var.project_name}-snapshots-${var.environment}"
+  description         = "Publish ${var.project_name} catalog snapshots to S3"
+  schedule_expression = "rate(5 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "snapshots" {
+  rule  = aws_cloudwatch_event_rule.snapshots.name
+  arn   = aws_lambda_function.api.arn
+  input = jsonencode({ publish_snapshots = true })
+}
+
+resource "aws_lambda_permission" "snapshots" {
+  statement_id  = "AllowEventBridgeSnapshots"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.api.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.snapshots.arn
+}
+
 # ============= API GATEWAY =============
 
 resource "aws_api_gateway_rest_api" "api" {
@@ -462,7 +798,7 @@ resource "aws_api_gateway_integration_response" "proxy_options" {
   status_code = "200"
 
   response_parameters = {
-    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,Authorization'"
+    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,Authorization,Idempotency-Key'"
     "method.response.header.Access-Control-Allow-Methods" = "'GET,POST,PUT,DELETE,OPTIONS'"
     "method.response.header.Access-Control-Allow-Origin"  = "'*'"
   }
@@ -499,6 +835,55 @@ resource "aws_api_gateway_stage" "api" {
   rest_api_id   = aws_api_gateway_rest_api.api.id
   stage_name    = var.environment
 }
+# ============= HTTP API (v2) =============
+# Lower-latency, cheaper alternative to the REST API above. The Lambda
+# handler accepts both payload formats, so clients can be moved over by
+# switching the apiUrl in frontend/config.js.
+
+resource "aws_apigatewayv2_api" "http_api" {
+  name          = "${var.project_name}-http-api-${var.environment}"
+  protocol_type = "HTTP"
+  description   = "GreenPlate Recipe API (HTTP API)"
+
+  cors_configuration {
+    allow_origins = ["*"]
+    allow_methods = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+    allow_headers = ["Content-Type", "Authorization", "Idempotency-Key"]
+  }
+
+  tags = {
+    Name        = "${var.project_name}-http-api"
+    Environment = var.environment
+  }
+}
+
+resource "aws_apigatewayv2_integration" "http_api" {
+  api_id                 = aws_apigatewayv2_api.http_api.id
+  integration_type       = "AWS_PROXY"
+  integration_uri        = aws_lambda_function.api.invoke_arn
+  payload_format_version = "2.0"
+}
+
+resource "aws_apigatewayv2_route" "http_api_default" {
+  api_id    = aws_apigatewayv2_api.http_api.id
+  route_key = "$default"
+  target    = "integrations/${aws_apigatewayv2_integration.http_api.id}"
+}
+
+resource "aws_apigatewayv2_stage" "http_api" {
+  api_id      = aws_apigatewayv2_api.http_api.id
+  name        = "$default"
+  auto_deploy = true
+}
+
+resource "aws_lambda_permission" "http_api" {
+  statement_id  = "AllowHttpApiInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.api.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.http_api.execution_arn}/*/*"
+}
+
 # ============= CLOUDWATCH MONITORING =============
 #Log Group
 resource "aws_cloudwatch_log_group" "api_logs" {
@@ -556,6 +941,24 @@ resource "aws_cloudwatch_dashboard" "main" {
           region  = var.aws_region
           title   = "API Traffic vs Errors"
         }
+      },
+      {
+        type   = "metric"
+        x      = 12
+        y      = 0
+        width  = 12
+        height = 6
+        properties = {
+          metrics = [
+            ["GreenPlate/API", "Latency", "Route", "/api/recipes", { "stat": "p95" }],
+            ["GreenPlate/API", "Latency", "Route", "/api/recipes/search", { "stat": "p95" }],
+            ["GreenPlate/API", "DynamoDBLatency", "Route", "/api/recipes", { "stat": "p95" }]
+          ]
+          view    = "timeSeries"
+          stacked = false
+          region  = var.aws_region
+          title   = "Route latency (p95, from EMF logs)"
+        }
       }
     ]
   })
@@ -583,6 +986,11 @@ output "api_gateway_url" {
   value       = aws_api_gateway_stage.api.invoke_url
 }
 
+output "http_api_url" {
+  description = "HTTP API (v2) endpoint URL"
+  value       = aws_apigatewayv2_stage.http_api.invoke_url
+}
+
 output "lambda_function_name" {
   description = "Lambda function name"
   value       = aws_lambda_function.api.function_name
@@ -617,11 +1025,17 @@ output "deployment_summary" {
      • ${aws_dynamodb_table.recipes.name}
      • ${aws_dynamodb_table.saved_recipes.name}
      • ${aws_dynamodb_table.liked_recipes.name}
+     • ${aws_dynamodb_table.metadata.name}
+     • ${aws_dynamodb_table.recipe_stats.name}
+     • ${aws_dynamodb_table.idempotency.name}
+     • ${aws_dynamodb_table.user_emails.name}
+     • ${aws_dynamodb_table.rate_limits.name}
   
     Next Steps:
-     1. Upload frontend: aws s3 sync frontend/ s3://${aws_s3_bucket.frontend.id}/
-     2. Invalidate cache: aws cloudfront create-invalidation --distribution-id ${aws_cloudfront_distribution.frontend.id} --paths "/*"
-     3. Test API: curl ${aws_api_gateway_stage.api.invoke_url}/health
+     1. Upload frontend: aws s3 sync frontend/ s3://${aws_s3_bucket.frontend.id}/ --exclude "snapshots/*"
+     2. Publish snapshots: aws lambda invoke --function-name ${aws_lambda_function.api.function_name} --cli-binary-format raw-in-base64-out --payload '{"publish_snapshots": true}' /dev/stdout
+     3. Invalidate cache: aws cloudfront create-invalidation --distribution-id ${aws_cloudfront_distribution.frontend.id} --paths "/*"
+     4. Test API: curl ${aws_api_gateway_stage.api.invoke_url}/health
   
   ========================================
   EOT